@@ -0,0 +1,295 @@
+"""
+Pipeline benchmark, runs Circuikit end to end against a SyntheticInterface, no hardware or browser needed.
+
+    python -m benchmarks.pipeline
+    python -m benchmarks.pipeline --rates 1000 20000 max --formats json binary --transports queue ring_buffer
+
+For every scenario it reports the sustained samples/s which reached a service, p50/p99 end to end latency
+(generation in the serial monitor process to delivery in the service) and RSS of both stages,
+the serial monitor process (sampling, decoding, batching) and the app process (transport, fan out, services).
+A decode only micro benchmark runs first, as the ceiling of the serial monitor stage.
+"""
+
+from dataclasses import dataclass
+import argparse
+import logging
+import os
+import resource
+import sys
+import threading
+import time
+
+from circuikit import Circuikit
+from circuikit.serial_monitor_interface import SyntheticInterface
+from circuikit.serial_monitor_interface.decoders import JsonDecoder
+from circuikit.serial_monitor_interface.serial_monitor_interface import (
+    extract_valid_samples,
+)
+from circuikit.serial_monitor_interface.synthetic import binary_frame_layout
+from circuikit.serial_monitor_interface.types import (
+    RingBufferOptions,
+    SerialMonitorOptions,
+)
+from circuikit.services import Service, ServiceOptions
+
+TIMESTAMP_FIELD_NAME = "time"
+# samples of the first moments are not counted, the pipeline is still spinning up
+WARMUP_S = 1.0
+
+
+def rss_mb(pid: int | None = None) -> float | None:
+    # current resident set size, read from procfs where available
+    try:
+        with open(f"/proc/{pid or 'self'}/status") as status:
+            for line in status:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    if pid is None:
+        # peak instead of current, ru_maxrss is KiB on linux and bytes on macOS
+        max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return max_rss / (1024 * 1024 if sys.platform == "darwin" else 1024)
+    return None
+
+
+def percentile(sorted_values: list[float], fraction: float) -> float:
+    if not sorted_values:
+        return float("nan")
+    index = min(len(sorted_values) - 1, int(fraction * len(sorted_values)))
+    return sorted_values[index]
+
+
+class LatencyProbe(Service):
+    """Counts samples and records how long they took from generation to here"""
+
+    def __init__(self, service_options: ServiceOptions | None = None):
+        super().__init__(options=service_options)
+        self.lock = threading.Lock()
+        self.recording = False
+        self.received = 0
+        self.latencies_ms: list[float] = []
+
+    def on_message(self, message: dict) -> None:
+        # generation timestamps are time.monotonic() of the serial monitor process, which is system wide
+        latency_ms = time.monotonic() * 1000 - message[TIMESTAMP_FIELD_NAME]
+        with self.lock:
+            if self.recording:
+                self.received += 1
+                self.latencies_ms.append(latency_ms)
+
+    def record(self) -> None:
+        with self.lock:
+            self.recording = True
+
+    def collect(self) -> tuple[int, list[float]]:
+        with self.lock:
+            self.recording = False
+            return self.received, self.latencies_ms
+
+
+@dataclass(frozen=True)
+class Scenario:
+    rate_hz: float | None
+    sample_format: str
+    transport: str
+    field_count: int
+    line_size: tuple[int, int]
+    corrupt_fraction: float
+    execution_mode: str
+
+    @property
+    def name(self) -> str:
+        rate = "max" if self.rate_hz is None else f"{self.rate_hz:g}/s"
+        return f"{self.sample_format:<6} {self.transport:<11} {rate:>9}"
+
+
+@dataclass(frozen=True)
+class Result:
+    scenario: Scenario
+    samples_per_s: float
+    p50_ms: float
+    p99_ms: float
+    smi_rss_mb: float | None
+    app_rss_mb: float | None
+    dropped: int
+
+
+def run_scenario(scenario: Scenario, duration_s: float) -> Result:
+    frame_layout = (
+        binary_frame_layout(
+            field_count=scenario.field_count, timestamp_field_name=TIMESTAMP_FIELD_NAME
+        )
+        if scenario.sample_format == "binary"
+        else None
+    )
+    interface = SyntheticInterface(
+        rate_hz=scenario.rate_hz,
+        field_count=scenario.field_count,
+        line_size=scenario.line_size,
+        corrupt_fraction=scenario.corrupt_fraction,
+        frame_layout=frame_layout,
+        timestamp_field_name=TIMESTAMP_FIELD_NAME,
+        seed=1,
+    )
+    probe = LatencyProbe(
+        service_options=ServiceOptions(execution_mode=scenario.execution_mode)
+    )
+    kit = Circuikit(
+        serial_monitor_options=SerialMonitorOptions(
+            interface=interface,
+            sample_rate_ms=25,
+            timestamp_field_name=TIMESTAMP_FIELD_NAME,
+            ring_buffer=(
+                RingBufferOptions() if scenario.transport == "ring_buffer" else None
+            ),
+        ),
+        services=[probe],
+    )
+    kit.start()
+    try:
+        time.sleep(WARMUP_S)
+        probe.record()
+        started_at = time.monotonic()
+        time.sleep(duration_s)
+        smi_rss = rss_mb(kit.smi_processes[0].pid)
+        app_rss = rss_mb()
+        received, latencies_ms = probe.collect()
+        elapsed_s = time.monotonic() - started_at
+        dropped = kit.dropped_samples
+    finally:
+        kit.stop()
+        probe.__destroy__()
+
+    latencies_ms.sort()
+    return Result(
+        scenario=scenario,
+        samples_per_s=received / elapsed_s,
+        p50_ms=percentile(latencies_ms, 0.5),
+        p99_ms=percentile(latencies_ms, 0.99),
+        smi_rss_mb=smi_rss,
+        app_rss_mb=app_rss,
+        dropped=dropped,
+    )
+
+
+def run_decode_benchmark(
+    field_count: int, line_size: tuple[int, int], lines: int = 200_000
+) -> dict[str, float]:
+    interface = SyntheticInterface(
+        rate_hz=None,
+        field_count=field_count,
+        line_size=line_size,
+        max_lines_per_sample=lines,
+        seed=1,
+    )
+    interface.start()
+    data = interface.sample()
+    results = {}
+    for backend in ("json", "msgspec", "orjson"):
+        try:
+            decoder = JsonDecoder(backend=backend)
+        except ImportError:
+            continue
+        started_at = time.perf_counter()
+        extract_valid_samples(
+            data=data, timestamp_field_name=TIMESTAMP_FIELD_NAME, decoder=decoder
+        )
+        results[backend] = lines / (time.perf_counter() - started_at)
+    return results
+
+
+def format_mb(value: float | None) -> str:
+    return "n/a" if value is None else f"{value:.1f}"
+
+
+def print_results(results: list[Result]) -> None:
+    header = f"{'scenario':<29} {'samples/s':>10} {'p50 ms':>8} {'p99 ms':>8} {'smi MB':>7} {'app MB':>7} {'dropped':>8}"
+    print(header)
+    print("-" * len(header))
+    for result in results:
+        print(
+            f"{result.scenario.name:<29} {result.samples_per_s:>10.0f} {result.p50_ms:>8.2f} {result.p99_ms:>8.2f}"
+            f" {format_mb(result.smi_rss_mb):>7} {format_mb(result.app_rss_mb):>7} {result.dropped:>8}"
+        )
+
+
+def parse_rate(value: str) -> float | None:
+    return None if value == "max" else float(value)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Circuikit pipeline benchmark on synthetic samples"
+    )
+    parser.add_argument(
+        "--duration", type=float, default=3.0, help="seconds per scenario"
+    )
+    parser.add_argument(
+        "--rates",
+        nargs="+",
+        type=parse_rate,
+        default=[1000, 10_000, None],
+        help="target samples/s per scenario, or max",
+    )
+    parser.add_argument(
+        "--formats", nargs="+", choices=("json", "binary"), default=["json", "binary"]
+    )
+    parser.add_argument(
+        "--transports",
+        nargs="+",
+        choices=("queue", "ring_buffer"),
+        default=["queue", "ring_buffer"],
+    )
+    parser.add_argument("--fields", type=int, default=4, help="fields per sample")
+    parser.add_argument(
+        "--line-size",
+        type=int,
+        nargs=2,
+        default=(0, 0),
+        metavar=("MIN", "MAX"),
+        help="JSON lines are padded to a size drawn uniformly from [MIN, MAX]",
+    )
+    parser.add_argument(
+        "--corrupt-fraction",
+        type=float,
+        default=0.0,
+        help="fraction of partial lines or corrupted frames",
+    )
+    parser.add_argument(
+        "--execution-mode",
+        default="thread",
+        choices=("inline", "thread", "thread_pool"),
+        help="execution mode of the measuring service",
+    )
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.ERROR)
+
+    line_size = tuple(args.line_size)
+    print(f"pid={os.getpid()} cpus={os.cpu_count()} python={sys.version.split()[0]}")
+    print("\ndecode only, samples/s:")
+    for backend, samples_per_s in run_decode_benchmark(
+        field_count=args.fields, line_size=line_size
+    ).items():
+        print(f"  {backend:<8} {samples_per_s:>10.0f}")
+
+    print(f"\nend to end, {args.duration:g}s per scenario:")
+    results = []
+    for sample_format in args.formats:
+        for transport in args.transports:
+            for rate_hz in args.rates:
+                scenario = Scenario(
+                    rate_hz=rate_hz,
+                    sample_format=sample_format,
+                    transport=transport,
+                    field_count=args.fields,
+                    line_size=line_size,
+                    corrupt_fraction=args.corrupt_fraction,
+                    execution_mode=args.execution_mode,
+                )
+                results.append(run_scenario(scenario, duration_s=args.duration))
+    print_results(results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,3 @@
+from .runtime import AsyncCircuikit
+from .service import AsyncService, AsyncServiceAdapter
+from .thingsboard_gateway import AsyncThingsBoardGateway
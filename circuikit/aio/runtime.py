@@ -0,0 +1,281 @@
+import asyncio
+from contextlib import suppress
+from functools import partial
+from typing import Awaitable, Callable
+from ..main import DEFAULT_DEVICE, subscribes, warn_device_field_collision
+from ..services import Service, BatchService
+from ..services.routing import compile_routes
+from ..serial_monitor_interface.dedup import TimestampDedup
+from ..serial_monitor_interface.serial_monitor_interface import (
+    DEFAULT_DECODER,
+    decode_line,
+    extract_new_samples,
+)
+from ..serial_monitor_interface.records import SampleRecord
+from ..serial_monitor_interface.scheduler import SamplingScheduler
+from ..serial_monitor_interface.types import SerialMonitorOptions
+from .service import AsyncService
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def readable_fileno(interface) -> int | None:
+    # file descriptor the loop can wait on, None when the interface has to be polled
+    if not hasattr(interface, "read_ready"):
+        return None
+    try:
+        return interface.fileno()
+    except (AttributeError, OSError, NotImplementedError):
+        return None
+
+
+async def watch_device(
+    name: str,
+    options: SerialMonitorOptions,
+    dispatch: Callable[[list], Awaitable[None]],
+    stats: dict | None = None,
+) -> None:
+    # stats, when given, is kept up to date with the dedup and scheduler counters of the device
+    loop = asyncio.get_running_loop()
+    interface = options.interface
+    decoder = DEFAULT_DECODER if options.decoder is None else options.decoder
+    decode = partial(
+        decode_line,
+        timestamp_field_name=options.timestamp_field_name,
+        decoder=decoder,
+    )
+    delivers_deltas = getattr(interface, "delivers_deltas", False)
+    dedup = options.dedup
+    if dedup is None and not delivers_deltas:
+        dedup = TimestampDedup()
+    if dedup is not None:
+        dedup.bind(
+            decoder=decoder,
+            timestamp_field_name=options.timestamp_field_name,
+            delivers_deltas=delivers_deltas,
+        )
+
+    # starting may block for long, e.g. opening a browser
+    await loop.run_in_executor(None, interface.start)
+    try:
+        fileno = readable_fileno(interface)
+        if fileno is not None:
+            # the loop wakes this task up once the port has data, nothing is polled
+            readable = asyncio.Event()
+            loop.add_reader(fileno, readable.set)
+            try:
+                while True:
+                    await readable.wait()
+                    readable.clear()
+                    try:
+                        data = interface.read_ready()
+                    except Exception as e:
+                        logger.error(f"failed to read {name=}; e={e}")
+                        continue
+                    if data:
+                        await dispatch(extract_new_samples(data, decode, dedup))
+                        if stats is not None and dedup is not None:
+                            _update_stats(stats, dedup=dedup)
+            finally:
+                loop.remove_reader(fileno)
+        else:
+            # interfaces without a file descriptor are sampled on the default executor
+            paces_sampling = getattr(interface, "paces_sampling", False)
+            scheduler = SamplingScheduler(
+                sample_rate_ms=options.sample_rate_ms,
+                adaptive=options.adaptive_sampling,
+                window_lines=getattr(interface, "window_lines", None),
+                get_timestamp=decoder.field_getter(options.timestamp_field_name),
+            )
+            scheduler.start(loop.time())
+            overruns = 0
+            while True:
+                data = await loop.run_in_executor(None, interface.sample)
+                sampled_at = loop.time()
+                if data is None:
+                    logger.warning(f"Sampled {name=}, but received None as a response")
+                    if paces_sampling:
+                        scheduler.start(sampled_at)
+                    scheduler.on_poll(samples=[], now=sampled_at)
+                else:
+                    samples = extract_new_samples(data, decode, dedup)
+                    if not paces_sampling:
+                        overran = False
+                        if dedup is not None:
+                            # the poll didn't reach back to the last delivered sample
+                            dedup_overruns = dedup.stats().get("overruns", 0)
+                            overran = dedup_overruns > overruns
+                            overruns = dedup_overruns
+                        scheduler.on_poll(
+                            samples=samples, now=sampled_at, overran=overran
+                        )
+                    if stats is not None:
+                        _update_stats(
+                            stats,
+                            dedup=dedup,
+                            scheduler=None if paces_sampling else scheduler,
+                        )
+                    await dispatch(samples)
+                    if paces_sampling:
+                        continue
+                await asyncio.sleep(max(0.0, scheduler.deadline - loop.time()))
+    finally:
+        await loop.run_in_executor(None, interface.stop)
+
+
+def _update_stats(
+    stats: dict,
+    dedup=None,
+    scheduler: SamplingScheduler | None = None,
+) -> None:
+    # same names as the smi counters of Circuikit
+    if dedup is not None:
+        for name, value in dedup.stats().items():
+            stats[f"dedup_{name}"] = value
+    if scheduler is not None:
+        stats["poll_interval_ms"] = scheduler.interval_s * 1000
+        stats.update(scheduler.stats())
+
+
+class AsyncCircuikit:
+    """
+    Runs every device and service on a single event loop. Serial ports are read when their file descriptor
+    becomes readable, other interfaces are sampled on the default executor. Takes AsyncService instances,
+    plain Service instances keep their own threads and are fed from the loop.
+    """
+
+    __slots__ = (
+        "devices_options",
+        "device_names",
+        "services",
+        "device_field_name",
+        "device_tasks",
+        "device_stats",
+    )
+
+    def __init__(
+        self,
+        serial_monitor_options: SerialMonitorOptions | dict[str, SerialMonitorOptions],
+        services: list[AsyncService | Service],
+        device_field_name: str | None = "device",
+    ):
+        if isinstance(serial_monitor_options, SerialMonitorOptions):
+            serial_monitor_options = {DEFAULT_DEVICE: serial_monitor_options}
+            # a single device keeps its samples as they are
+            device_field_name = None
+        if not serial_monitor_options:
+            raise ValueError("serial_monitor_options must hold at least one device")
+        for service in services:
+            if isinstance(service, BatchService):
+                raise ValueError("AsyncCircuikit does not support batch services")
+            devices = service.service_options.devices
+            if devices is not None and not devices <= serial_monitor_options.keys():
+                raise ValueError(
+                    f"{type(service).__name__} subscribes to unknown devices {sorted(devices - serial_monitor_options.keys())}"
+                )
+        self.devices_options = dict(serial_monitor_options)
+        self.device_names = list(self.devices_options)
+        self.services = services
+        self.device_field_name = device_field_name
+        self.device_tasks: list[asyncio.Task] = []
+        self.device_stats: dict[str, dict] = {name: {} for name in self.device_names}
+
+    async def __aenter__(self) -> "AsyncCircuikit":
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.stop()
+
+    def _create_dispatch(self, name: str) -> Callable[[list], Awaitable[None]]:
+        device_field_name = self.device_field_name
+        options = self.devices_options[name]
+        routes = compile_routes(
+            [sub for sub in self.services if subscribes(sub, name)],
+            DEFAULT_DECODER if options.decoder is None else options.decoder,
+        )
+        warned_collision = False
+
+        async def dispatch(samples: list) -> None:
+            nonlocal warned_collision
+            for sample in samples:
+                if device_field_name is not None:
+                    if isinstance(sample, dict):
+                        if not warned_collision and device_field_name in sample:
+                            warned_collision = warn_device_field_collision(
+                                sample, device_field_name=device_field_name, name=name
+                            )
+                        sample[device_field_name] = name
+                    elif (
+                        isinstance(sample, SampleRecord) and device_field_name in sample
+                    ):
+                        sample[device_field_name] = name
+                for apply, subs in routes:
+                    routed = sample if apply is None else apply(sample)
+                    if routed is None:
+                        continue
+                    for sub in subs:
+                        if isinstance(sub, AsyncService):
+                            await sub.on_new_read(new_read=routed)
+                        else:
+                            sub.on_new_read(new_read=routed)
+
+        return dispatch
+
+    async def start(self) -> None:
+        for service in self.services:
+            if isinstance(service, AsyncService):
+                await service.start()
+        self.device_tasks = [
+            asyncio.create_task(
+                watch_device(
+                    name=name,
+                    options=options,
+                    dispatch=self._create_dispatch(name),
+                    stats=self.device_stats[name],
+                ),
+                name=f"circuikit-device-{name}",
+            )
+            for name, options in self.devices_options.items()
+        ]
+
+    async def stop(self) -> None:
+        # devices first, so no sample arrives at a stopped service
+        for task in self.device_tasks:
+            task.cancel()
+        for task in self.device_tasks:
+            with suppress(asyncio.CancelledError):
+                try:
+                    await task
+                except Exception as e:
+                    logger.error(f"{task.get_name()} failed; e={e}")
+        self.device_tasks = []
+        for service in self.services:
+            if isinstance(service, AsyncService):
+                await service.stop()
+            else:
+                service.__destroy__()
+
+    def stats(self) -> dict[str, dict]:
+        # device name -> its dedup and sampling counters
+        return {name: dict(stats) for name, stats in self.device_stats.items()}
+
+    async def run(self) -> None:
+        # runs until cancelled, e.g. asyncio.run(circuikit.run()) until Ctrl+C
+        await self.start()
+        try:
+            await asyncio.gather(*self.device_tasks)
+        finally:
+            await self.stop()
+
+    async def send_smi_input(self, message: str, device: str | None = None) -> None:
+        # None sends the message to every device
+        if device is not None and device not in self.devices_options:
+            raise ValueError(f"unknown {device=}")
+        loop = asyncio.get_running_loop()
+        for name, options in self.devices_options.items():
+            if device is None or name == device:
+                await loop.run_in_executor(
+                    None, options.interface.send_message, message
+                )
@@ -0,0 +1,115 @@
+import asyncio
+from abc import ABC, abstractmethod
+from contextlib import suppress
+from typing import Awaitable, Callable
+from ..services.service import SERVICE_DRAIN_TIMEOUT_S
+from ..services.types import ServiceOptions
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncService(ABC):
+    """
+    Service for AsyncCircuikit. on_message is a coroutine which runs on the event loop, a task per service
+    instead of a thread. max_queue_size and overflow_policy of ServiceOptions apply, execution_mode does not.
+    """
+
+    def __init__(self, options: ServiceOptions | None = None):
+        self.service_options = ServiceOptions() if options is None else options
+        # created by start(), inside the running loop
+        self.messages_queue: asyncio.Queue | None = None
+        self.worker_task: asyncio.Task | None = None
+        self.enqueued = 0
+        self.dropped = 0
+
+    @abstractmethod
+    async def on_message(self, message: dict) -> None:
+        # Do your thing, without blocking the loop
+        pass
+
+    async def on_start(self) -> None:
+        # e.g. open connections, runs before the first message
+        pass
+
+    async def on_stop(self) -> None:
+        # e.g. flush and close connections, runs after the last message
+        pass
+
+    async def start(self) -> None:
+        max_size = self.service_options.max_queue_size
+        if self.service_options.overflow_policy == "conflate":
+            max_size = 1
+        self.messages_queue = asyncio.Queue(maxsize=max_size)
+        await self.on_start()
+        self.worker_task = asyncio.create_task(self.pull_requests())
+
+    async def stop(self) -> None:
+        if self.worker_task is not None:
+            # what is still queued gets handled first, like Service.drain on Circuikit.stop
+            try:
+                await asyncio.wait_for(
+                    self.messages_queue.join(), timeout=SERVICE_DRAIN_TIMEOUT_S
+                )
+            except asyncio.TimeoutError:
+                logger.warning(
+                    f"{type(self).__name__} did not handle its queued messages in time"
+                )
+            self.worker_task.cancel()
+            with suppress(asyncio.CancelledError):
+                await self.worker_task
+            self.worker_task = None
+        await self.on_stop()
+
+    async def on_new_read(self, new_read: dict) -> None:
+        queue = self.messages_queue
+        if queue.full():
+            policy = self.service_options.overflow_policy
+            if policy == "block":
+                # backpressure reaches the device reader, other tasks keep running
+                await queue.put(new_read)
+                self.enqueued += 1
+                return
+            if policy == "drop_newest":
+                self.dropped += 1
+                return
+            # drop_oldest and conflate make room by discarding the head
+            queue.get_nowait()
+            queue.task_done()
+            self.dropped += 1
+        queue.put_nowait(new_read)
+        self.enqueued += 1
+
+    def queue_stats(self) -> dict:
+        # enqueued, dropped and current depth of the messages queue
+        return {
+            "enqueued": self.enqueued,
+            "dropped": self.dropped,
+            "depth": 0 if self.messages_queue is None else self.messages_queue.qsize(),
+        }
+
+    async def pull_requests(self) -> None:
+        queue = self.messages_queue
+        while True:
+            message = await queue.get()
+            try:
+                await self.on_message(message=message)
+            except Exception as e:
+                logger.error(f"{type(self).__name__} failed to handle message; e={e}")
+            finally:
+                queue.task_done()
+
+
+class AsyncServiceAdapter(AsyncService):
+    """Acts as a wrapper that transmit a coroutine function the sensors as it was a service"""
+
+    def __init__(
+        self,
+        on_new_message_fn: Callable[[dict], Awaitable[None]],
+        service_options: ServiceOptions | None = None,
+    ):
+        super().__init__(options=service_options)
+        self.on_new_message_fn = on_new_message_fn
+
+    async def on_message(self, message: dict) -> None:
+        await self.on_new_message_fn(message)
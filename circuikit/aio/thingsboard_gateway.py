@@ -0,0 +1,177 @@
+import asyncio
+from collections import deque
+from contextlib import suppress
+from .service import AsyncService
+from ..services.samples import sample_to_dict
+from ..services.thingsboard_gateway import (
+    MAX_REQUESTS_PER_SECOND,
+    REJECTED,
+    RETRY,
+    SENT,
+    TelemetryClock,
+)
+from ..services.types import ServiceOptions
+import logging
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncThingsBoardGateway(AsyncService):
+    """
+    ThingsBoardGateway for AsyncCircuikit, posts over a single aiohttp keep-alive connection
+    from a flusher task. Batching, retries and the bounded buffer behave the same.
+    """
+
+    def __init__(
+        self,
+        token: str,
+        service_options: ServiceOptions | None = None,
+        base_url: str = "http://thingsboard.cloud",
+        timestamp_field_name: str | None = "time",
+        timestamp_is_epoch_ms: bool = False,
+        flush_interval_ms: float = 1000 / MAX_REQUESTS_PER_SECOND,
+        max_batch_size: int = 1000,
+        max_buffered_samples: int = 100_000,
+        retry_initial_backoff_ms: float = 500,
+        retry_max_backoff_ms: float = 30_000,
+        request_timeout_s: float = 10,
+    ):
+        if aiohttp is None:
+            raise ImportError("AsyncThingsBoardGateway requires the aiohttp package")
+        if flush_interval_ms < 1000 / MAX_REQUESTS_PER_SECOND:
+            raise ValueError(
+                f"flush_interval_ms must be >= {1000 / MAX_REQUESTS_PER_SECOND}"
+            )
+        super().__init__(options=service_options)
+        self.token = token
+        self.url = f"{base_url.rstrip('/')}/api/v1/{token}/telemetry"
+        self.clock = TelemetryClock(
+            timestamp_field_name=timestamp_field_name,
+            timestamp_is_epoch_ms=timestamp_is_epoch_ms,
+        )
+        self.flush_interval_s = flush_interval_ms / 1000
+        self.max_batch_size = max_batch_size
+        self.retry_initial_backoff_s = retry_initial_backoff_ms / 1000
+        self.retry_max_backoff_s = retry_max_backoff_ms / 1000
+        self.request_timeout_s = request_timeout_s
+
+        # everything runs on the loop, no lock needed
+        self.buffer: deque = deque()
+        self.max_buffered_samples = max_buffered_samples
+        self.sent = 0
+        self.rejected = 0
+        self.failed_requests = 0
+
+        self.session = None
+        self.flusher_task: asyncio.Task | None = None
+
+    async def on_start(self) -> None:
+        # sessions must be created inside the running loop
+        self.session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=1),
+            timeout=aiohttp.ClientTimeout(total=self.request_timeout_s),
+        )
+        self.flusher_task = asyncio.create_task(self.flush_forever())
+
+    async def on_stop(self) -> None:
+        if self.flusher_task is not None:
+            self.flusher_task.cancel()
+            with suppress(asyncio.CancelledError):
+                await self.flusher_task
+            self.flusher_task = None
+        # best effort, whatever is still buffered on stop gets one last chance
+        batch = self._take_batch()
+        if batch:
+            self._settle(batch, await self.send_request(json=batch))
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+    async def on_message(self, message: dict) -> None:
+        self.enqueue(message=message)
+
+    def enqueue(self, message: dict) -> None:
+        values = sample_to_dict(message)
+        if len(self.buffer) >= self.max_buffered_samples:
+            self.buffer.popleft()
+            self.dropped += 1
+        self.buffer.append({"ts": self.clock.ts(values), "values": values})
+
+    def stats(self) -> dict:
+        return {
+            "sent": self.sent,
+            "dropped": self.dropped,
+            "rejected": self.rejected,
+            "buffered": len(self.buffer),
+            "failed_requests": self.failed_requests,
+        }
+
+    async def flush_forever(self) -> None:
+        backoff_s = 0.0
+        while True:
+            await asyncio.sleep(max(self.flush_interval_s, backoff_s))
+            while True:
+                batch = self._take_batch()
+                if not batch:
+                    break
+                result = await self.send_request(json=batch)
+                if result != RETRY:
+                    backoff_s = 0.0
+                    self._settle(batch, result)
+                    if len(batch) < self.max_batch_size:
+                        break
+                    # a full batch means more is waiting, respect the rate limit between posts
+                    await asyncio.sleep(self.flush_interval_s)
+                    continue
+                self._give_back(batch)
+                backoff_s = (
+                    self.retry_initial_backoff_s
+                    if backoff_s == 0
+                    else min(backoff_s * 2, self.retry_max_backoff_s)
+                )
+                logger.warning(f"telemetry post failed, retrying in {backoff_s}s")
+                break
+
+    def _settle(self, batch: list[dict], result: str) -> None:
+        if result == SENT:
+            self.sent += len(batch)
+            return
+        if result == REJECTED:
+            # refused by the server, they are gone like any other dropped sample
+            self.rejected += len(batch)
+        self.dropped += len(batch)
+
+    def _take_batch(self) -> list[dict]:
+        size = min(len(self.buffer), self.max_batch_size)
+        return [self.buffer.popleft() for _ in range(size)]
+
+    def _give_back(self, batch: list[dict]) -> None:
+        # failed samples go back in front, newer ones win if there is no room for both
+        room = self.max_buffered_samples - len(self.buffer)
+        if room < len(batch):
+            self.dropped += len(batch) - max(room, 0)
+            batch = batch[len(batch) - max(room, 0) :]
+        self.buffer.extendleft(reversed(batch))
+
+    async def send_request(self, json: list[dict] | dict) -> str:
+        try:
+            async with self.session.post(url=self.url, json=json) as response:
+                if response.status <= 299:
+                    logger.debug(f"message sent; status_code={response.status}")
+                    return SENT
+                self.failed_requests += 1
+                logger.error(f"failed to send; status_code={response.status}")
+                logger.debug(f"response={await response.text()}")
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            self.failed_requests += 1
+            logger.error(f"failed to send; e={e}")
+            return RETRY
+        # client errors other than rate limiting won't succeed on retry
+        if 400 <= response.status < 500 and response.status != 429:
+            return REJECTED
+        return RETRY
@@ -1,93 +1,380 @@
 from multiprocessing import Queue
 from multiprocessing import Process
+from dataclasses import dataclass
+from typing import Callable
 import time
 from functools import partial
 import threading
 import signal
+import queue
 import sys
 
-from ..services import Service
+from ..services import Service, BatchService
+from ..services.columnar import ColumnarBatchBuilder
+from ..services.routing import Route, RouteFn, compile_route, compile_routes
 from ..serial_monitor_interface import (
     SerialMonitorInterface,
 )
+from ..serial_monitor_interface.serial_monitor_interface import DEFAULT_DECODER
+from ..serial_monitor_interface.protocols import SampleDecoder
+from ..serial_monitor_interface.records import SampleRecord
 from ..serial_monitor_interface.types import SerialMonitorOptions
+from .transport import create_transport, Transport
+from .pipeline_metrics import (
+    PipelineMetrics,
+    push_smi_metrics,
+    METRICS_PUSH_INTERVAL_S,
+)
+from ..metrics import MetricsRegistry, serve_prometheus
 
 import logging
 
 logger = logging.getLogger(__name__)
 
+# how often app task checks for a stop request while no samples arrive
+APP_TASK_POLL_TIMEOUT_S = 0.5
+
+# name of the only device when Circuikit is given a single SerialMonitorOptions
+DEFAULT_DEVICE = "default"
+
+
+@dataclass(frozen=True, slots=True)
+class SmiDevice:
+    # position in the transport, name as seen by services
+    index: int
+    name: str
+    options: SerialMonitorOptions
+    input_queue: "Queue"
+
+
+def warn_device_field_collision(
+    sample: dict, device_field_name: str, name: str
+) -> bool:
+    # True once warned, the device's own field is overwritten by its name
+    if sample[device_field_name] == name:
+        return False
+    logger.warning(
+        f"samples of device {name} carry their own {device_field_name=}, it is overwritten with the device name;"
+        " pass another device_field_name, or None, to keep it"
+    )
+    return True
+
 
 def smi_task(
-    serial_monitor_options: SerialMonitorOptions,
-    smi_output_queue: Queue,
-    smi_input_queue: Queue,
+    devices: list[SmiDevice],
+    smi_output_transport: Transport,
+    device_field_name: str | None = None,
+    smi_metrics_queue: "Queue | None" = None,
+    process_index: int = 0,
 ):
-    def on_next_read(sample: dict):
-        smi_output_queue.put(sample)
-
-    smi = SerialMonitorInterface(
-        on_next_read=on_next_read,
-        messages_to_send_queue=smi_input_queue,
-        options=serial_monitor_options,
+    # one registry per device, histograms have a single writer thread
+    registries = (
+        None
+        if smi_metrics_queue is None
+        else {device.index: MetricsRegistry() for device in devices}
     )
-    # fan in - single producer
-    smi.start()
+
+    def create_batch_handler(device: SmiDevice) -> Callable[[list[dict]], None]:
+        index = device.index
+        name = device.name
+        metrics = None if registries is None else registries[index]
+        warned_collision = False
+
+        def on_next_batch(batch: list[dict]):
+            nonlocal warned_collision
+            if device_field_name is not None:
+                for sample in batch:
+                    # typed schemas can't take an extra field, their device is known by subscription only,
+                    # records take it when it is one of their fields
+                    if isinstance(sample, dict):
+                        if not warned_collision and device_field_name in sample:
+                            warned_collision = warn_device_field_collision(
+                                sample, device_field_name=device_field_name, name=name
+                            )
+                        sample[device_field_name] = name
+                    elif (
+                        isinstance(sample, SampleRecord) and device_field_name in sample
+                    ):
+                        sample[device_field_name] = name
+            # whole batch is a single message, so it is pickled and written to the pipe once
+            if metrics is None:
+                smi_output_transport.put_batch(batch, device=index)
+                return
+            smi_output_transport.put_batch(
+                batch, stamps=(metrics.batch_read_at, time.monotonic()), device=index
+            )
+
+        return on_next_batch
+
+    smis = [
+        SerialMonitorInterface(
+            on_next_read=None,
+            on_next_batch=create_batch_handler(device),
+            messages_to_send_queue=device.input_queue,
+            options=device.options,
+            metrics=None if registries is None else registries[device.index],
+        )
+        for device in devices
+    ]
+    # fan in - every device is watched by its own threads, all of them feed the same transport
+    for smi in smis:
+        smi.start()
 
     while True:
         # stay alive
-        time.sleep(60)
+        if registries is None:
+            time.sleep(60)
+            continue
+        time.sleep(METRICS_PUSH_INTERVAL_S)
+        merged = MetricsRegistry()
+        for registry in registries.values():
+            merged.merge(registry)
+        push_smi_metrics(
+            smi_queue=smi_metrics_queue, registry=merged, process_index=process_index
+        )
 
     # send a signal that no further tasks are coming
-    smi_output_queue.put(None)
+    smi_output_transport.close()
+
+
+def subscribes(service: Service, device_name: str) -> bool:
+    devices = service.service_options.devices
+    return devices is None or device_name in devices
+
+
+@dataclass(slots=True)
+class BatchRoute:
+    # batch services subscribed to the same devices, with the same route, share one builder
+    builder: ColumnarBatchBuilder
+    services: list[BatchService]
+    # by device index
+    devices: list[bool]
+    # by device index, None keeps samples untouched
+    filters: list[RouteFn | None]
 
 
 def app_task(
-    services: list[Service], smi_output_queue: Queue, stop_event: threading.Event
+    services: list[Service],
+    smi_output_transport: Transport,
+    stop_event: threading.Event,
+    device_names: list[str] | None = None,
+    create_columnar_batch_builder: Callable[[], ColumnarBatchBuilder] | None = None,
+    metrics: PipelineMetrics | None = None,
+    device_decoders: list[SampleDecoder] | None = None,
 ):
+    if device_names is None:
+        device_names = [DEFAULT_DEVICE]
+    if device_decoders is None:
+        device_decoders = [DEFAULT_DECODER] * len(device_names)
+    sample_services = [sub for sub in services if not isinstance(sub, BatchService)]
+    batch_services = [sub for sub in services if isinstance(sub, BatchService)]
+    # resolved and compiled once per device, so routing a batch is a list lookup
+    sample_routes = [
+        compile_routes(
+            [sub for sub in sample_services if subscribes(sub, name)], decoder
+        )
+        for name, decoder in zip(device_names, device_decoders)
+    ]
+    batch_routes: list[BatchRoute] = []
+    if batch_services and create_columnar_batch_builder is not None:
+        groups: dict[tuple[frozenset[str] | None, Route | None], list] = {}
+        for sub in batch_services:
+            options = sub.service_options
+            groups.setdefault((options.devices, options.route), []).append(sub)
+        for (devices, route), subs in groups.items():
+            batch_routes.append(
+                BatchRoute(
+                    builder=create_columnar_batch_builder(),
+                    services=subs,
+                    devices=[
+                        devices is None or name in devices for name in device_names
+                    ],
+                    filters=[
+                        None if route is None else compile_route(route, decoder)
+                        for decoder in device_decoders
+                    ],
+                )
+            )
+
+    def fan_out_columnar_batch(route: BatchRoute, columnar_batch) -> None:
+        # built once, shared read-only by every batch service of the route
+        for sub in route.services:
+            sub.on_new_read(new_read=columnar_batch)
+
+    if metrics is not None:
+        transport_time = metrics.app.histogram("transport_ms")
+        read_to_app_time = metrics.app.histogram("read_to_app_ms")
+        fan_out_time = metrics.app.histogram("fan_out_ms")
+
     while not stop_event.is_set():
-        # get a task from the queue
-        sample = smi_output_queue.get()
+        timeout = APP_TASK_POLL_TIMEOUT_S
+        for route in batch_routes:
+            timeout = min(timeout, route.builder.time_left())
+        # get a batch of samples from the transport
+        try:
+            batch = smi_output_transport.get_batch(timeout=timeout)
+        except queue.Empty:
+            batch = []
         # check for signal that we are done
-        if sample is None:
+        if batch is None:
             break
         # process
-        logger.debug(f"Fanning out smi {sample=}")
+        if batch:
+            logger.debug(f"Fanning out smi batch of {len(batch)} samples")
+        if metrics is not None:
+            received_at = time.monotonic()
+            stamps = smi_output_transport.last_stamps
+            if stamps is not None:
+                # both ends use time.monotonic(), which is system wide
+                read_at, sent_at = stamps
+                transport_time.observe((received_at - sent_at) * 1000)
+                read_to_app_time.observe((received_at - read_at) * 1000)
+                smi_output_transport.last_stamps = None
+
+        if batch:
+            # a batch always comes from a single device
+            device = smi_output_transport.last_device
+            routes = sample_routes[device]
+            device_batch_routes = [
+                (route, route.filters[device])
+                for route in batch_routes
+                if route.devices[device]
+            ]
+            for sample in batch:
+                for apply, subs in routes:
+                    # a route runs once per sample, whatever the number of services behind it
+                    routed = sample if apply is None else apply(sample)
+                    if routed is None:
+                        continue
+                    for sub in subs:
+                        sub.on_new_read(new_read=routed)
+                for route, apply in device_batch_routes:
+                    routed = sample if apply is None else apply(sample)
+                    if routed is None:
+                        continue
+                    columnar_batch = route.builder.add(routed)
+                    if columnar_batch is not None:
+                        fan_out_columnar_batch(route, columnar_batch)
 
-        for sub in services:
-            sub.on_new_read(new_read=sample)
+        for route in batch_routes:
+            columnar_batch = route.builder.poll()
+            if columnar_batch is not None:
+                fan_out_columnar_batch(route, columnar_batch)
+
+        if metrics is not None:
+            done_at = time.monotonic()
+            if batch:
+                fan_out_time.observe((done_at - received_at) * 1000)
+                metrics.app.increment("samples_received", len(batch))
+            if done_at - metrics.smi_polled_at >= METRICS_PUSH_INTERVAL_S:
+                metrics.poll_smi()
 
 
 class Circuikit:
     __slots__ = (
         "serial_monitor_options",
         "services",
-        "smi_output_queue",
-        "smi_input_queue",
+        "device_names",
+        "smi_output_transport",
+        "smi_input_queues",
         "stop_event",
-        "smi_process",
+        "smi_processes",
         "app_thread",
+        "pipeline_metrics",
+        "metrics_port",
+        "metrics_host",
+        "metrics_server",
+        "services_destroyed",
     )
 
     def __init__(
         self,
-        serial_monitor_options: SerialMonitorOptions,
+        serial_monitor_options: SerialMonitorOptions | dict[str, SerialMonitorOptions],
         services: list[Service],
+        columnar_batch_size: int = 1024,
+        columnar_batch_window_ms: float = 1000,
+        metrics_enabled: bool = True,
+        metrics_port: int | None = None,
+        metrics_host: str = "127.0.0.1",
+        smi_processes: int = 1,
+        device_field_name: str | None = "device",
     ):
-        self.smi_output_queue = Queue()
-        self.smi_input_queue = Queue()
+        if isinstance(serial_monitor_options, SerialMonitorOptions):
+            devices_options = {DEFAULT_DEVICE: serial_monitor_options}
+            # a single device keeps its samples as they are
+            device_field_name = None
+        else:
+            devices_options = dict(serial_monitor_options)
+        if not devices_options:
+            raise ValueError("serial_monitor_options must hold at least one device")
+        if not 1 <= smi_processes <= len(devices_options):
+            raise ValueError(
+                "smi_processes must be between 1 and the number of devices"
+            )
+        if smi_processes > 1 and any(
+            getattr(options.interface, "multi", None) is not None
+            for options in devices_options.values()
+        ):
+            # every process would get a copy of the MultiThinkercad and open a browser of its own
+            raise ValueError("MultiThinkercad devices require smi_processes=1")
+        self.device_names = list(devices_options)
+        for service in services:
+            devices = service.service_options.devices
+            if devices is not None and not devices <= devices_options.keys():
+                raise ValueError(
+                    f"{type(service).__name__} subscribes to unknown devices {sorted(devices - devices_options.keys())}"
+                )
+
+        self.smi_output_transport = create_transport(
+            devices_options=list(devices_options.values())
+        )
+        self.smi_input_queues = {name: Queue() for name in self.device_names}
+        self.pipeline_metrics = (
+            PipelineMetrics(
+                services=services,
+                transport=self.smi_output_transport,
+                smi_processes=smi_processes,
+            )
+            if metrics_enabled
+            else None
+        )
+        # optional prometheus text endpoint, started with the pipeline
+        self.metrics_port = metrics_port
+        self.metrics_host = metrics_host
+        self.metrics_server = None
 
         self.serial_monitor_options = serial_monitor_options
         self.services = services
+        self.services_destroyed = False
 
-        self.smi_process = Process(
-            target=partial(
-                smi_task,
-                serial_monitor_options=self.serial_monitor_options,
-                smi_output_queue=self.smi_output_queue,
-                smi_input_queue=self.smi_input_queue,
-            ),
-            daemon=True,
-        )
+        devices = [
+            SmiDevice(
+                index=index,
+                name=name,
+                options=options,
+                input_queue=self.smi_input_queues[name],
+            )
+            for index, (name, options) in enumerate(devices_options.items())
+        ]
+        # devices are spread round robin, each process watches its share with a thread per device
+        self.smi_processes = [
+            Process(
+                target=partial(
+                    smi_task,
+                    devices=devices[process_index::smi_processes],
+                    smi_output_transport=self.smi_output_transport,
+                    device_field_name=device_field_name,
+                    smi_metrics_queue=(
+                        None
+                        if self.pipeline_metrics is None
+                        else self.pipeline_metrics.smi_queue
+                    ),
+                    process_index=process_index,
+                ),
+                daemon=True,
+            )
+            for process_index in range(smi_processes)
+        ]
         # app task will happen in seprate thread but not in seperate process so it won't involve pickling
         # thus, user will be more verstailt with it's services
         self.stop_event = threading.Event()
@@ -95,8 +382,31 @@ class Circuikit:
             target=partial(
                 app_task,
                 services=self.services,
-                smi_output_queue=self.smi_output_queue,
+                smi_output_transport=self.smi_output_transport,
                 stop_event=self.stop_event,
+                device_names=self.device_names,
+                create_columnar_batch_builder=(
+                    partial(
+                        ColumnarBatchBuilder,
+                        # devices feeding the same batch services are expected to share it
+                        timestamp_field_name=devices[0].options.timestamp_field_name,
+                        max_size=columnar_batch_size,
+                        window_ms=columnar_batch_window_ms,
+                        # typed records are batched as rows of a structured array
+                        dtype=getattr(devices[0].options.decoder, "dtype", None),
+                    )
+                    if any(isinstance(sub, BatchService) for sub in services)
+                    else None
+                ),
+                metrics=self.pipeline_metrics,
+                device_decoders=[
+                    (
+                        DEFAULT_DECODER
+                        if device.options.decoder is None
+                        else device.options.decoder
+                    )
+                    for device in devices
+                ],
             ),
             daemon=True,
         )
@@ -123,20 +433,75 @@ class Circuikit:
     def __destroy__(self):
         self.stop()
 
-    def send_smi_input(self, message: str) -> None:
-        self.smi_input_queue.put(message)
+    @property
+    def dropped_samples(self) -> int:
+        # samples lost between the smi process and the app thread
+        return self.smi_output_transport.dropped
+
+    def metrics(self) -> dict:
+        # snapshot of every stage, empty when metrics are disabled
+        if self.pipeline_metrics is None:
+            return {}
+        return self.pipeline_metrics.summary()
+
+    def send_smi_input(self, message: str, device: str | None = None) -> None:
+        # None sends the message to every device
+        if device is None:
+            for smi_input_queue in self.smi_input_queues.values():
+                smi_input_queue.put(message)
+            return
+        smi_input_queue = self.smi_input_queues.get(device)
+        if smi_input_queue is None:
+            raise ValueError(f"unknown {device=}")
+        smi_input_queue.put(message)
 
     def start(self, block=False) -> None:
-        self.smi_process.start()
+        if self.pipeline_metrics is not None and self.metrics_port is not None:
+            self.metrics_server = serve_prometheus(
+                render=self.pipeline_metrics.prometheus,
+                port=self.metrics_port,
+                host=self.metrics_host,
+            )
+        for smi_process in self.smi_processes:
+            smi_process.start()
         self.app_thread.start()
 
         if block:
             self.app_thread.join()
 
     def stop(self) -> None:
-        if self.smi_process.is_alive():
-            self.smi_process.terminate()
+        for smi_process in self.smi_processes:
+            if smi_process.is_alive():
+                smi_process.terminate()
         if not self.stop_event.is_set():
             self.stop_event.set()
-        self.smi_output_queue.close()
-        self.smi_input_queue.close()
+        if (
+            self.app_thread.is_alive()
+            and threading.current_thread() is not self.app_thread
+        ):
+            self.app_thread.join(timeout=APP_TASK_POLL_TIMEOUT_S * 2)
+        if not self.services_destroyed:
+            # no sample is fanned out anymore, services flush and close what they hold, e.g. file footers
+            self.services_destroyed = True
+            for service in self.services:
+                if not service.drain():
+                    logger.warning(
+                        f"{type(service).__name__} did not handle its queued messages in time"
+                    )
+                try:
+                    service.__destroy__()
+                except Exception as e:
+                    logger.error(f"{type(service).__name__} failed to stop; e={e}")
+        if self.metrics_server is not None:
+            self.metrics_server.shutdown()
+            self.metrics_server.server_close()
+            self.metrics_server = None
+        if self.app_thread.is_alive():
+            # it may still be reading the transport, e.g. a shared memory ring unmapped under it would crash it
+            logger.warning(
+                "app task is still running, the output transport is released on process exit"
+            )
+        else:
+            self.smi_output_transport.release()
+        for smi_input_queue in self.smi_input_queues.values():
+            smi_input_queue.close()
@@ -0,0 +1,116 @@
+from multiprocessing import Queue
+import queue
+import time
+
+from ..metrics import Histogram, MetricsRegistry, render_prometheus
+from ..services import Service
+from .transport import Transport
+
+# how often the smi process ships its metrics to the app process
+METRICS_PUSH_INTERVAL_S = 1.0
+
+
+def _service_names(services: list[Service]) -> list[str]:
+    names = []
+    seen: dict[str, int] = {}
+    for service in services:
+        name = type(service).__name__
+        seen[name] = seen.get(name, 0) + 1
+        names.append(name if seen[name] == 1 else f"{name}#{seen[name]}")
+    return names
+
+
+def push_smi_metrics(
+    smi_queue: Queue, registry: MetricsRegistry, process_index: int = 0
+) -> None:
+    # runs in the smi process
+    try:
+        smi_queue.put_nowait((process_index, registry.state()))
+    except queue.Full:
+        pass
+
+
+class PipelineMetrics:
+    """
+    Collects metrics of every stage. Each smi process records into its own registry and ships a snapshot
+    over smi_queue every METRICS_PUSH_INTERVAL_S, the app thread and services record in this process.
+    """
+
+    __slots__ = (
+        "app",
+        "smi",
+        "smi_states",
+        "smi_queue",
+        "services",
+        "transport",
+        "smi_polled_at",
+    )
+
+    def __init__(
+        self,
+        services: list[Service],
+        transport: Transport,
+        smi_processes: int = 1,
+    ):
+        self.app = MetricsRegistry()
+        # merged from the latest snapshot of every smi process
+        self.smi = MetricsRegistry()
+        self.smi_states: dict[int, dict] = {}
+        # only the latest snapshot matters, a full queue just means nobody drained it yet
+        self.smi_queue = Queue(maxsize=4 * smi_processes)
+        self.transport = transport
+        self.services: dict[str, Service] = {}
+        for name, service in zip(_service_names(services), services):
+            service.processing_time = Histogram()
+            self.services[name] = service
+        self.smi_polled_at = 0.0
+
+    def poll_smi(self) -> None:
+        self.smi_polled_at = time.monotonic()
+        received = False
+        while True:
+            try:
+                process_index, state = self.smi_queue.get_nowait()
+            except (queue.Empty, OSError, ValueError):
+                # empty, or closed while stopping
+                break
+            self.smi_states[process_index] = state
+            received = True
+        if not received:
+            return
+        smi = MetricsRegistry()
+        for state in self.smi_states.values():
+            smi.merge(MetricsRegistry.from_state(state))
+        self.smi = smi
+
+    def _transport_stats(self) -> dict[str, int | None]:
+        return {"depth": self.transport.depth, "dropped": self.transport.dropped}
+
+    def summary(self) -> dict:
+        self.poll_smi()
+        return {
+            "smi": self.smi.summary(),
+            "app": self.app.summary(),
+            "transport": self._transport_stats(),
+            "services": {
+                name: {
+                    "processing": service.processing_time.summary(),
+                    **service.queue_stats(),
+                }
+                for name, service in self.services.items()
+            },
+        }
+
+    def prometheus(self) -> str:
+        self.poll_smi()
+        return render_prometheus(
+            stages={"smi": self.smi, "app": self.app},
+            services={
+                name: {
+                    "processing": service.processing_time,
+                    "queue": service.queue_stats(),
+                }
+                for name, service in self.services.items()
+            },
+            transport=self._transport_stats(),
+        )
@@ -0,0 +1,194 @@
+from multiprocessing import shared_memory
+import os
+import threading
+import time
+
+from ..serial_monitor_interface.types import RingBufferOptions
+
+# header words live on separate cache lines, each one has a single writer
+HEAD_INDEX = 0  # written by producer
+TAIL_INDEX = 8  # written by consumer
+PRODUCER_DROPPED_INDEX = 16  # written by producer
+CONSUMER_DROPPED_INDEX = 24  # written by consumer
+CLOSED_INDEX = 32  # written by producer
+HEADER_SIZE = 320
+
+# every slot starts with a sequence stamp word followed by the record length word
+SLOT_HEADER_SIZE = 16
+
+MAX_IDLE_SLEEP_S = 0.002
+
+
+class SharedMemoryRingBuffer:
+    """
+    Single producer / single consumer ring of length-prefixed records in shared memory.
+    Each slot is stamped with the sequence number of the record it holds, written after the payload,
+    so the reader can detect a slot overwritten under its feet when the policy is drop_oldest.
+    """
+
+    __slots__ = (
+        "options",
+        "shm",
+        "buf",
+        "words",
+        "payload_capacity",
+        "head",
+        "tail",
+        "producer_dropped",
+        "consumer_dropped",
+        "owner_pid",
+    )
+
+    def __init__(self, options: RingBufferOptions, name: str | None = None):
+        self.options = options
+        self.payload_capacity = options.slot_size - SLOT_HEADER_SIZE
+        # only the creating process unlinks the segment, forked copies of this object must not
+        self.owner_pid = os.getpid() if name is None else None
+        size = HEADER_SIZE + options.slots * options.slot_size
+        if name is None:
+            self.shm = shared_memory.SharedMemory(create=True, size=size)
+            self.shm.buf[:HEADER_SIZE] = bytes(HEADER_SIZE)
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+        self.buf = self.shm.buf[:size]
+        # native 8 bytes words view, a single item assignment is a single aligned store
+        # unlike struct.pack_into which zero fills the target before packing
+        self.words = self.buf.cast("Q")
+        # local copies of the counters each side owns
+        self.head = self.words[HEAD_INDEX]
+        self.tail = self.words[TAIL_INDEX]
+        self.producer_dropped = self.words[PRODUCER_DROPPED_INDEX]
+        self.consumer_dropped = self.words[CONSUMER_DROPPED_INDEX]
+
+    def __reduce__(self):
+        # attach by name in the child process
+        return (SharedMemoryRingBuffer, (self.options, self.shm.name))
+
+    @property
+    def name(self) -> str:
+        return self.shm.name
+
+    @property
+    def dropped(self) -> int:
+        return self.words[PRODUCER_DROPPED_INDEX] + self.words[CONSUMER_DROPPED_INDEX]
+
+    @property
+    def depth(self) -> int:
+        return min(self.words[HEAD_INDEX] - self.words[TAIL_INDEX], self.options.slots)
+
+    @property
+    def closed(self) -> bool:
+        return self.words[CLOSED_INDEX] == 1
+
+    def stats(self) -> dict:
+        return {
+            "depth": self.depth,
+            "producer_dropped": self.words[PRODUCER_DROPPED_INDEX],
+            "consumer_dropped": self.words[CONSUMER_DROPPED_INDEX],
+        }
+
+    def _slot_offset(self, sequence: int) -> int:
+        return HEADER_SIZE + (sequence % self.options.slots) * self.options.slot_size
+
+    # producer side
+
+    def write(self, record: bytes, stop_event: threading.Event | None = None) -> bool:
+        size = len(record)
+        if size > self.payload_capacity:
+            self._count_producer_drop()
+            return False
+
+        words = self.words
+        if self.options.overflow_policy == "block":
+            idle_sleep = 0.0001
+            while self.head - words[TAIL_INDEX] >= self.options.slots:
+                if stop_event is not None and stop_event.is_set():
+                    self._count_producer_drop()
+                    return False
+                time.sleep(idle_sleep)
+                idle_sleep = min(idle_sleep * 2, MAX_IDLE_SLEEP_S)
+
+        offset = self._slot_offset(self.head)
+        seq_index = offset // 8
+        # invalidate the slot while it is being written
+        words[seq_index] = 0
+        words[seq_index + 1] = size
+        payload_offset = offset + SLOT_HEADER_SIZE
+        self.buf[payload_offset : payload_offset + size] = record
+        words[seq_index] = self.head + 1
+        self.head += 1
+        words[HEAD_INDEX] = self.head
+        return True
+
+    def close(self) -> None:
+        self.words[CLOSED_INDEX] = 1
+
+    def _count_producer_drop(self) -> None:
+        self.producer_dropped += 1
+        self.words[PRODUCER_DROPPED_INDEX] = self.producer_dropped
+
+    # consumer side
+
+    def read(self) -> bytes | None:
+        words = self.words
+        slots = self.options.slots
+        while True:
+            head = words[HEAD_INDEX]
+            if head == self.tail:
+                return None
+            if head - self.tail > slots:
+                # producer lapped us, the oldest records are gone
+                self._count_consumer_drop(head - slots - self.tail)
+                self.tail = head - slots
+
+            expected_seq = self.tail + 1
+            offset = self._slot_offset(self.tail)
+            seq_index = offset // 8
+            if words[seq_index] == expected_seq:
+                size = words[seq_index + 1]
+                payload_offset = offset + SLOT_HEADER_SIZE
+                record = bytes(self.buf[payload_offset : payload_offset + size])
+                # make sure the slot was not overwritten while copying
+                if words[seq_index] == expected_seq:
+                    self.tail += 1
+                    words[TAIL_INDEX] = self.tail
+                    return record
+            self._count_consumer_drop(1)
+            self.tail += 1
+            words[TAIL_INDEX] = self.tail
+
+    def read_many(self, max_records: int) -> list[bytes]:
+        records: list[bytes] = []
+        while len(records) < max_records:
+            record = self.read()
+            if record is None:
+                break
+            records.append(record)
+        return records
+
+    def _count_consumer_drop(self, count: int) -> None:
+        self.consumer_dropped += count
+        self.words[CONSUMER_DROPPED_INDEX] = self.consumer_dropped
+
+    def __del__(self):
+        self._release_views()
+
+    def _release_views(self) -> None:
+        # views must be released before the segment can be closed
+        if self.buf is None:
+            return
+        self.words.release()
+        self.buf.release()
+        self.words = None
+        self.buf = None
+
+    def release(self) -> None:
+        if self.buf is None:
+            return
+        self._release_views()
+        self.shm.close()
+        if self.owner_pid == os.getpid():
+            try:
+                self.shm.unlink()
+            except FileNotFoundError:
+                pass
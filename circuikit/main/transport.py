@@ -0,0 +1,206 @@
+from multiprocessing import Queue
+import queue
+import struct
+import time
+
+from ..serial_monitor_interface.types import SerialMonitorOptions
+from .ring_buffer import SharedMemoryRingBuffer, MAX_IDLE_SLEEP_S
+
+# (oldest sample read time, hand over time) of a batch, both time.monotonic() of the smi process
+BatchStamps = tuple[float, float]
+
+# encoded samples never start with a zero byte, so a record which does carries stamps
+STAMPS_MARKER = b"\x00"
+STAMPS_STRUCT = struct.Struct("<dd")
+
+
+class QueueTransport:
+    """Delivers whole batches through a multiprocessing.Queue, one pickle per batch, from any number of devices"""
+
+    __slots__ = ("queue", "last_stamps", "last_device")
+
+    def __init__(self):
+        self.queue = Queue()
+        # stamps of the last batch received, when the producer sends them
+        self.last_stamps: BatchStamps | None = None
+        # index of the device the last batch came from
+        self.last_device = 0
+
+    @property
+    def dropped(self) -> int:
+        return 0
+
+    @property
+    def depth(self) -> int | None:
+        try:
+            return self.queue.qsize()
+        except NotImplementedError:
+            # macOS has no sem_getvalue
+            return None
+
+    def put_batch(
+        self, batch: list[dict], stamps: BatchStamps | None = None, device: int = 0
+    ) -> None:
+        if stamps is None and device == 0:
+            self.queue.put(batch)
+            return
+        self.queue.put((device, stamps, batch))
+
+    def get_batch(self, timeout: float | None = None) -> list[dict] | None:
+        # raises queue.Empty on timeout, returns None once the producer is done
+        payload = self.queue.get(timeout=timeout)
+        if isinstance(payload, tuple):
+            self.last_device, self.last_stamps, payload = payload
+        else:
+            self.last_device = 0
+        return payload
+
+    def close(self) -> None:
+        self.queue.put(None)
+
+    def release(self) -> None:
+        self.queue.close()
+
+
+class SharedMemoryTransport:
+    """Delivers samples as pre-encoded records through a shared memory ring buffer, without pickling"""
+
+    __slots__ = ("ring", "max_batch_size", "decoder", "last_stamps", "last_device")
+
+    def __init__(self, serial_monitor_options: SerialMonitorOptions):
+        self.ring = SharedMemoryRingBuffer(options=serial_monitor_options.ring_buffer)
+        self.max_batch_size = serial_monitor_options.batch_max_size
+        self.decoder = serial_monitor_options.decoder
+        # stamps of the last batch received, when the producer sends them
+        self.last_stamps: BatchStamps | None = None
+        # a ring carries a single device
+        self.last_device = 0
+
+    @property
+    def dropped(self) -> int:
+        return self.ring.dropped
+
+    @property
+    def depth(self) -> int | None:
+        return self.ring.depth
+
+    def put_batch(
+        self, batch: list[dict], stamps: BatchStamps | None = None, device: int = 0
+    ) -> None:
+        if stamps is not None:
+            # written ahead of the samples it describes
+            self.ring.write(STAMPS_MARKER + STAMPS_STRUCT.pack(*stamps))
+        encode = self.decoder.encode
+        for sample in batch:
+            self.ring.write(encode(sample))
+
+    def get_batch(self, timeout: float | None = None) -> list[dict] | None:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        idle_sleep = 0.0001
+        while True:
+            records = self.ring.read_many(max_records=self.max_batch_size)
+            if records:
+                decode_record = self.decoder.decode_record
+                batch = []
+                for record in records:
+                    if record[:1] == STAMPS_MARKER:
+                        self.last_stamps = STAMPS_STRUCT.unpack_from(record, 1)
+                        continue
+                    batch.append(decode_record(record))
+                return batch
+            if self.ring.closed:
+                return None
+            if deadline is not None and time.monotonic() >= deadline:
+                raise queue.Empty
+            time.sleep(idle_sleep)
+            idle_sleep = min(idle_sleep * 2, MAX_IDLE_SLEEP_S)
+
+    def close(self) -> None:
+        self.ring.close()
+
+    def release(self) -> None:
+        self.ring.release()
+
+
+class MultiRingTransport:
+    """
+    One shared memory ring per device, so every ring keeps a single writer and needs no lock.
+    The app thread reads the rings round robin.
+    """
+
+    __slots__ = ("transports", "next_device", "last_stamps", "last_device")
+
+    def __init__(self, devices_options: list[SerialMonitorOptions]):
+        self.transports = [
+            SharedMemoryTransport(serial_monitor_options=options)
+            for options in devices_options
+        ]
+        self.next_device = 0
+        self.last_stamps: BatchStamps | None = None
+        self.last_device = 0
+
+    @property
+    def dropped(self) -> int:
+        return sum(transport.dropped for transport in self.transports)
+
+    @property
+    def depth(self) -> int | None:
+        return sum(transport.depth for transport in self.transports)
+
+    def put_batch(
+        self, batch: list[dict], stamps: BatchStamps | None = None, device: int = 0
+    ) -> None:
+        self.transports[device].put_batch(batch, stamps=stamps)
+
+    def get_batch(self, timeout: float | None = None) -> list[dict] | None:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        idle_sleep = 0.0001
+        transports = self.transports
+        while True:
+            open_rings = 0
+            for _ in range(len(transports)):
+                device = self.next_device
+                # start from the next ring on every call, so a busy device can't starve the others
+                self.next_device = (device + 1) % len(transports)
+                transport = transports[device]
+                try:
+                    batch = transport.get_batch(timeout=0)
+                except queue.Empty:
+                    open_rings += 1
+                    continue
+                if batch is None:
+                    continue
+                self.last_device = device
+                self.last_stamps = transport.last_stamps
+                transport.last_stamps = None
+                return batch
+            if open_rings == 0:
+                return None
+            if deadline is not None and time.monotonic() >= deadline:
+                raise queue.Empty
+            time.sleep(idle_sleep)
+            idle_sleep = min(idle_sleep * 2, MAX_IDLE_SLEEP_S)
+
+    def close(self) -> None:
+        for transport in self.transports:
+            transport.close()
+
+    def release(self) -> None:
+        for transport in self.transports:
+            transport.release()
+
+
+Transport = QueueTransport | SharedMemoryTransport | MultiRingTransport
+
+
+def create_transport(devices_options: list[SerialMonitorOptions]) -> Transport:
+    ring_buffers = [options.ring_buffer is not None for options in devices_options]
+    if not any(ring_buffers):
+        return QueueTransport()
+    if not all(ring_buffers):
+        raise ValueError(
+            "ring_buffer must be set for either all devices or none of them"
+        )
+    if len(devices_options) == 1:
+        return SharedMemoryTransport(serial_monitor_options=devices_options[0])
+    return MultiRingTransport(devices_options=devices_options)
@@ -0,0 +1,3 @@
+from .histogram import Histogram
+from .registry import MetricsRegistry
+from .prometheus import render_prometheus, serve_prometheus
@@ -0,0 +1,69 @@
+from bisect import bisect_left
+
+# upper bounds in milliseconds, growing by sqrt(2) from 10us to about 85s
+BUCKET_BOUNDS_MS: tuple[float, ...] = tuple(0.01 * 2 ** (i / 2) for i in range(47))
+
+
+class Histogram:
+    """
+    Fixed bucket latency histogram in milliseconds. Observing is a bisect and a few increments,
+    every histogram has a single writer thread so there is no locking, readers get a slightly stale copy.
+    """
+
+    __slots__ = ("counts", "count", "total", "max")
+
+    def __init__(self):
+        # last bucket holds everything above the highest bound
+        self.counts = [0] * (len(BUCKET_BOUNDS_MS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, value_ms: float) -> None:
+        self.counts[bisect_left(BUCKET_BOUNDS_MS, value_ms)] += 1
+        self.count += 1
+        self.total += value_ms
+        if value_ms > self.max:
+            self.max = value_ms
+
+    def state(self) -> tuple[list[int], int, float, float]:
+        # plain values, so a histogram can cross the process boundary
+        return list(self.counts), self.count, self.total, self.max
+
+    @staticmethod
+    def from_state(state: tuple[list[int], int, float, float]) -> "Histogram":
+        histogram = Histogram()
+        histogram.counts, histogram.count, histogram.total, histogram.max = state
+        return histogram
+
+    def merge(self, other: "Histogram") -> None:
+        for index, bucket_count in enumerate(other.counts):
+            self.counts[index] += bucket_count
+        self.count += other.count
+        self.total += other.total
+        if other.max > self.max:
+            self.max = other.max
+
+    def quantile(self, fraction: float) -> float:
+        # upper bound of the bucket holding the quantile, capped by the max seen
+        if self.count == 0:
+            return 0.0
+        rank = fraction * self.count
+        seen = 0
+        for index, bucket_count in enumerate(self.counts):
+            seen += bucket_count
+            if seen >= rank and bucket_count:
+                if index >= len(BUCKET_BOUNDS_MS):
+                    return self.max
+                return min(BUCKET_BOUNDS_MS[index], self.max)
+        return self.max
+
+    def summary(self) -> dict:
+        return {
+            "count": self.count,
+            "mean_ms": self.total / self.count if self.count else 0.0,
+            "p50_ms": self.quantile(0.5),
+            "p90_ms": self.quantile(0.9),
+            "p99_ms": self.quantile(0.99),
+            "max_ms": self.max,
+        }
@@ -0,0 +1,130 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable
+import threading
+import logging
+
+from .histogram import BUCKET_BOUNDS_MS, Histogram
+from .registry import MetricsRegistry
+
+logger = logging.getLogger(__name__)
+
+PREFIX = "circuikit"
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(labels: dict[str, str]) -> str:
+    if not labels:
+        return ""
+    pairs = (f'{key}="{_escape(str(value))}"' for key, value in labels.items())
+    return "{" + ",".join(pairs) + "}"
+
+
+def _metric_name(name: str) -> str:
+    # stage histograms are recorded in milliseconds, exposed in seconds as prometheus expects
+    return f"{PREFIX}_{name.removesuffix('_ms')}"
+
+
+def _render_histogram(
+    lines: list[str], name: str, histogram: Histogram, labels: dict[str, str]
+) -> None:
+    cumulative = 0
+    for bound_ms, bucket_count in zip(BUCKET_BOUNDS_MS, histogram.counts):
+        cumulative += bucket_count
+        bucket_labels = _labels({**labels, "le": repr(bound_ms / 1000)})
+        lines.append(f"{name}_seconds_bucket{bucket_labels} {cumulative}")
+    lines.append(
+        f'{name}_seconds_bucket{_labels({**labels, "le": "+Inf"})} {histogram.count}'
+    )
+    lines.append(f"{name}_seconds_sum{_labels(labels)} {histogram.total / 1000}")
+    lines.append(f"{name}_seconds_count{_labels(labels)} {histogram.count}")
+
+
+def _render_registry(
+    lines: list[str], registry: MetricsRegistry, stage: str, typed: set[str]
+) -> None:
+    labels = {"stage": stage}
+    for name, histogram in sorted(registry.histograms.items()):
+        metric_name = _metric_name(name)
+        if metric_name not in typed:
+            typed.add(metric_name)
+            lines.append(f"# TYPE {metric_name}_seconds histogram")
+        _render_histogram(lines, metric_name, histogram, labels)
+    for name, value in sorted(registry.counters.items()):
+        metric_name = f"{PREFIX}_{name}_total"
+        if metric_name not in typed:
+            typed.add(metric_name)
+            lines.append(f"# TYPE {metric_name} counter")
+        lines.append(f"{metric_name}{_labels(labels)} {value}")
+
+
+def render_prometheus(
+    stages: dict[str, MetricsRegistry],
+    services: dict[str, dict],
+    transport: dict[str, int | None],
+) -> str:
+    lines: list[str] = []
+    typed: set[str] = set()
+    for stage, registry in stages.items():
+        _render_registry(lines, registry, stage=stage, typed=typed)
+
+    if services:
+        name = f"{PREFIX}_service_processing"
+        lines.append(f"# TYPE {name}_seconds histogram")
+        for service_name, service in services.items():
+            _render_histogram(
+                lines, name, service["processing"], {"service": service_name}
+            )
+        for queue_metric, kind in (
+            ("enqueued", "counter"),
+            ("dropped", "counter"),
+            ("depth", "gauge"),
+        ):
+            name = f"{PREFIX}_service_queue_{queue_metric}"
+            if kind == "counter":
+                name += "_total"
+            lines.append(f"# TYPE {name} {kind}")
+            for service_name, service in services.items():
+                lines.append(
+                    f'{name}{_labels({"service": service_name})} {service["queue"][queue_metric]}'
+                )
+
+    lines.append(f"# TYPE {PREFIX}_transport_dropped_total counter")
+    lines.append(f"{PREFIX}_transport_dropped_total {transport['dropped']}")
+    if transport["depth"] is not None:
+        lines.append(f"# TYPE {PREFIX}_transport_depth gauge")
+        lines.append(f"{PREFIX}_transport_depth {transport['depth']}")
+    return "\n".join(lines) + "\n"
+
+
+def serve_prometheus(
+    render: Callable[[], str], port: int, host: str = "127.0.0.1"
+) -> ThreadingHTTPServer:
+    # bound to localhost by default, metrics are for the local scraper only
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            try:
+                body = render().encode("utf-8")
+            except Exception as e:
+                logger.error(f"failed to render metrics; e={e}")
+                self.send_error(500)
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", CONTENT_TYPE)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            logger.debug(format % args)
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
@@ -0,0 +1,60 @@
+from .histogram import Histogram
+
+
+class MetricsRegistry:
+    """Named histograms and counters of one stage, e.g. the serial monitor process or the app thread"""
+
+    __slots__ = ("histograms", "counters", "batch_read_at")
+
+    def __init__(self):
+        self.histograms: dict[str, Histogram] = {}
+        self.counters: dict[str, int] = {}
+        # read time of the oldest sample in the batch being handed over, set by the batcher
+        self.batch_read_at = 0.0
+
+    def histogram(self, name: str) -> Histogram:
+        # hot paths keep the returned histogram instead of looking it up per observation
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            histogram = Histogram()
+            self.histograms[name] = histogram
+        return histogram
+
+    def increment(self, name: str, amount: int = 1) -> None:
+        self.counters[name] = self.counters.get(name, 0) + amount
+
+    def state(self) -> dict:
+        # plain values, so a registry can cross the process boundary
+        return {
+            "histograms": {
+                name: histogram.state()
+                for name, histogram in list(self.histograms.items())
+            },
+            "counters": dict(self.counters),
+        }
+
+    @staticmethod
+    def from_state(state: dict) -> "MetricsRegistry":
+        registry = MetricsRegistry()
+        registry.histograms = {
+            name: Histogram.from_state(histogram_state)
+            for name, histogram_state in state["histograms"].items()
+        }
+        registry.counters = dict(state["counters"])
+        return registry
+
+    def merge(self, other: "MetricsRegistry") -> None:
+        # e.g. several smi processes reported as one stage
+        for name, histogram in list(other.histograms.items()):
+            self.histogram(name).merge(histogram)
+        for name, value in list(other.counters.items()):
+            self.increment(name, value)
+
+    def summary(self) -> dict:
+        return {
+            "histograms": {
+                name: histogram.summary()
+                for name, histogram in list(self.histograms.items())
+            },
+            "counters": dict(self.counters),
+        }
@@ -1,5 +1,7 @@
 from .serial_monitor_interface import (
     SerialMonitorInterface,
 )
-from .thinkercad import ThinkercadInterface
+from .thinkercad import ThinkercadInterface, MultiThinkercad
 from .port import PortInterface
+from .replay import ReplayInterface
+from .synthetic import SyntheticInterface
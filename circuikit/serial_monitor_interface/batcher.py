@@ -0,0 +1,63 @@
+from typing import Callable
+import time
+from ..metrics import MetricsRegistry
+
+
+class SampleBatcher:
+    """Groups samples so they cross the process boundary as one message"""
+
+    __slots__ = (
+        "on_batch",
+        "max_size",
+        "linger_s",
+        "pending",
+        "pending_since",
+        "metrics",
+        "batch_wait_time",
+    )
+
+    def __init__(
+        self,
+        on_batch: Callable[[list[dict]], None],
+        max_size: int,
+        linger_ms: float,
+        metrics: MetricsRegistry | None = None,
+    ):
+        self.on_batch = on_batch
+        self.max_size = max_size
+        self.linger_s = linger_ms / 1000
+        self.pending: list[dict] = []
+        self.pending_since = 0.0
+        self.metrics = metrics
+        self.batch_wait_time = (
+            None if metrics is None else metrics.histogram("batch_wait_ms")
+        )
+
+    def add(self, samples: list[dict]) -> None:
+        # called on every poll, even an empty one, so lingering samples are not held forever
+        if samples:
+            if not self.pending:
+                self.pending_since = time.monotonic()
+            self.pending.extend(samples)
+
+        while len(self.pending) >= self.max_size:
+            batch = self.pending[: self.max_size]
+            self.pending = self.pending[self.max_size :]
+            self._hand_over(batch)
+
+        if self.pending and time.monotonic() - self.pending_since >= self.linger_s:
+            self.flush()
+
+    def flush(self) -> None:
+        if not self.pending:
+            return
+        batch = self.pending
+        self.pending = []
+        self._hand_over(batch)
+
+    def _hand_over(self, batch: list[dict]) -> None:
+        if self.metrics is not None:
+            # on_batch runs right after on this thread, so it can pick the read time up
+            self.metrics.batch_read_at = self.pending_since
+            self.batch_wait_time.observe((time.monotonic() - self.pending_since) * 1000)
+        self.on_batch(batch)
@@ -0,0 +1,244 @@
+import json
+import math
+from operator import itemgetter, attrgetter
+from typing import Any, Callable
+from .records import SampleRecord, record_type
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+def _default_backend() -> str:
+    if orjson is not None:
+        return "orjson"
+    if msgspec is not None:
+        return "msgspec"
+    return "json"
+
+
+def _looks_like_json_object(line: str) -> bool:
+    # cheap shape check so lines which can't be an object never reach the parser
+    line = line.strip()
+    return len(line) > 1 and line[0] == "{" and line[-1] == "}"
+
+
+def _json_dumps(sample: Any) -> bytes:
+    return json.dumps(sample, separators=(",", ":")).encode("utf-8")
+
+
+class JsonDecoder:
+    """Decodes JSON object lines into dicts, using orjson or msgspec when installed and stdlib json otherwise"""
+
+    __slots__ = ("backend", "loads", "dumps", "decode_errors")
+
+    def __init__(self, backend: str | None = None):
+        self.backend = _default_backend() if backend is None else backend
+        if self.backend == "orjson":
+            if orjson is None:
+                raise ImportError("orjson backend requires the orjson package")
+            self.loads = orjson.loads
+            self.dumps = orjson.dumps
+            self.decode_errors = (orjson.JSONDecodeError,)
+        elif self.backend == "msgspec":
+            if msgspec is None:
+                raise ImportError("msgspec backend requires the msgspec package")
+            self.loads = msgspec.json.decode
+            self.dumps = msgspec.json.encode
+            self.decode_errors = (msgspec.DecodeError,)
+        elif self.backend == "json":
+            self.loads = json.loads
+            self.dumps = _json_dumps
+            self.decode_errors = (ValueError,)
+        else:
+            raise ValueError(f"Unsupported JSON backend={self.backend}")
+
+    def __reduce__(self):
+        # backend functions are resolved again on the other side of the process boundary
+        return (JsonDecoder, (self.backend,))
+
+    def decode(self, line: str) -> dict | None:
+        if not _looks_like_json_object(line):
+            return None
+        try:
+            sample = self.loads(line)
+        except self.decode_errors:
+            return None
+        if not isinstance(sample, dict):
+            return None
+        return sample
+
+    def decode_record(self, record: bytes) -> dict:
+        # records are produced by encode, no need to pre-filter
+        return self.loads(record)
+
+    def encode(self, sample: dict) -> bytes:
+        if isinstance(sample, SampleRecord):
+            # written as an object, readable without the field list
+            sample = sample.to_dict()
+        return self.dumps(sample)
+
+    def field_getter(self, field_name: str) -> Callable[[dict], Any]:
+        return itemgetter(field_name)
+
+
+class SchemaDecoder:
+    """Decodes JSON object lines straight into a typed schema (e.g. msgspec.Struct) instead of a generic dict"""
+
+    __slots__ = ("schema", "decoder", "encoder", "decode_errors")
+
+    def __init__(self, schema: type):
+        if msgspec is None:
+            raise ImportError("SchemaDecoder requires the msgspec package")
+        self.schema = schema
+        self.decoder = msgspec.json.Decoder(type=schema)
+        self.encoder = msgspec.json.Encoder()
+        self.decode_errors = (msgspec.DecodeError,)
+
+    def __reduce__(self):
+        return (SchemaDecoder, (self.schema,))
+
+    def decode(self, line: str) -> Any | None:
+        if not _looks_like_json_object(line):
+            return None
+        try:
+            return self.decoder.decode(line)
+        except self.decode_errors:
+            # either not a JSON or doesn't match the schema
+            return None
+
+    def decode_record(self, record: bytes) -> Any:
+        return self.decoder.decode(record)
+
+    def encode(self, sample: Any) -> bytes:
+        return self.encoder.encode(sample)
+
+    def field_getter(self, field_name: str) -> Callable[[Any], Any]:
+        return attrgetter(field_name)
+
+
+def _to_float(value) -> float:
+    # a missing reading is NaN, like in columnar batches
+    if value is None:
+        return math.nan
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        raise TypeError
+    return float(value)
+
+
+def _to_int(value) -> int:
+    if isinstance(value, bool) or not isinstance(value, int):
+        raise TypeError
+    return value
+
+
+def _to_bool(value) -> bool:
+    if not isinstance(value, bool):
+        raise TypeError
+    return value
+
+
+def _to_str(value) -> str | None:
+    if value is not None and not isinstance(value, str):
+        raise TypeError
+    return value
+
+
+RECORD_FIELD_TYPES = {
+    float: (_to_float, "f8"),
+    int: (_to_int, "i8"),
+    bool: (_to_bool, "?"),
+    str: (_to_str, "O"),
+}
+
+
+class RecordDecoder:
+    """
+    Decodes JSON object lines into records of the declared fields (see records module) instead of dicts.
+    With field types, values are checked on decode, lines which don't fit are dropped, and `dtype` is the
+    matching NumPy structured dtype, so columnar batches are views of one array. Ring buffer records are
+    JSON arrays of the values, without the field names.
+    """
+
+    __slots__ = (
+        "fields",
+        "json",
+        "record",
+        "field_names",
+        "converters",
+        "float_indexes",
+        "dtype",
+    )
+
+    def __init__(self, fields: list[str] | dict[str, type], backend: str | None = None):
+        self.fields = fields
+        self.json = JsonDecoder(backend=backend)
+        self.field_names = tuple(fields)
+        self.record = record_type(self.field_names)
+        self.converters = None
+        self.float_indexes: list[int] = []
+        self.dtype = None
+        if isinstance(fields, dict):
+            unsupported = {
+                name: kind
+                for name, kind in fields.items()
+                if kind not in RECORD_FIELD_TYPES
+            }
+            if unsupported:
+                raise ValueError(
+                    f"unsupported field types {unsupported}, expected one of {list(RECORD_FIELD_TYPES)}"
+                )
+            self.converters = [RECORD_FIELD_TYPES[kind][0] for kind in fields.values()]
+            self.float_indexes = [
+                index for index, kind in enumerate(fields.values()) if kind is float
+            ]
+            if np is not None:
+                self.dtype = np.dtype(
+                    [
+                        (name, RECORD_FIELD_TYPES[kind][1])
+                        for name, kind in fields.items()
+                    ]
+                )
+
+    def __reduce__(self):
+        return (RecordDecoder, (self.fields, self.json.backend))
+
+    def decode(self, line: str) -> SampleRecord | None:
+        sample = self.json.decode(line)
+        if sample is None:
+            return None
+        values = [sample.get(name) for name in self.field_names]
+        if self.converters is not None:
+            try:
+                values = [
+                    convert(value) for convert, value in zip(self.converters, values)
+                ]
+            except TypeError:
+                # doesn't match the declared types
+                return None
+        return self.record(*values)
+
+    def decode_record(self, record: bytes) -> SampleRecord:
+        values = self.json.loads(record)
+        for index in self.float_indexes:
+            # NaN is encoded as null
+            if values[index] is None:
+                values[index] = math.nan
+        return self.record(*values)
+
+    def encode(self, sample: SampleRecord) -> bytes:
+        return self.json.dumps(sample.values())
+
+    def field_getter(self, field_name: str) -> Callable[[Any], Any]:
+        return attrgetter(field_name)
@@ -0,0 +1,233 @@
+from collections import deque
+from typing import Any, Callable
+
+from .protocols import SampleDecoder
+
+# strategies walk a poll from its newest line backwards and stop once they reach what was delivered before,
+# so lines already seen on previous polls are neither decoded nor compared again
+
+
+class _OrderedKeyDedup:
+    __slots__ = (
+        "field_name",
+        "get_key",
+        "last_key",
+        "last_key_count",
+        "resets",
+        "overruns",
+        "delivers_deltas",
+    )
+
+    def __init__(self, field_name: str | None):
+        self.field_name = field_name
+        self.get_key: Callable[[Any], Any] | None = None
+        self.last_key = None
+        # samples delivered with last_key, so equal keys arriving on a later poll are not lost
+        self.last_key_count = 0
+        self.resets = 0
+        # polls whose window no longer reached the last delivered sample, samples may have been missed
+        self.overruns = 0
+        self.delivers_deltas = False
+
+    def bind(
+        self,
+        decoder: SampleDecoder,
+        timestamp_field_name: str,
+        delivers_deltas: bool = False,
+    ) -> None:
+        self.get_key = decoder.field_getter(self.field_name or timestamp_field_name)
+        self.last_key = None
+        self.last_key_count = 0
+        self.delivers_deltas = delivers_deltas
+
+    def _on_step(self, previous_key, key) -> None:
+        pass
+
+    def take_new(self, items: list, decode: Callable[[Any], Any | None]) -> list:
+        get_key = self.get_key
+        last_key = self.last_key
+        if last_key is None or self.delivers_deltas:
+            # with deltas every sample is new, keys are only followed for resets and gaps
+            new_samples = [
+                sample for sample in map(decode, items) if sample is not None
+            ]
+            self._advance(new_samples)
+            return new_samples
+
+        # both lists hold samples newest first
+        collected: list = []
+        equal_keys: list = []
+        anchored = False
+        run_is_new = False
+        next_key = None
+        for index in range(len(items) - 1, -1, -1):
+            sample = decode(items[index])
+            if sample is None:
+                continue
+            key = get_key(sample)
+            if next_key is None or key > next_key:
+                # a run of non decreasing keys ends here, reading backwards
+                if equal_keys:
+                    break
+                # a run which never reaches last_key started after a device reset, all of it is new
+                run_is_new = key < last_key
+            next_key = key
+            if run_is_new or key > last_key:
+                collected.append(sample)
+            elif key == last_key:
+                equal_keys.append(sample)
+            else:
+                anchored = True
+                break
+
+        if equal_keys:
+            anchored = True
+            # the oldest last_key_count of them were delivered already
+            collected.extend(
+                equal_keys[: max(0, len(equal_keys) - self.last_key_count)]
+            )
+        elif not anchored and not run_is_new and next_key is not None:
+            self.overruns += 1
+        collected.reverse()
+        self._advance(collected)
+        return collected
+
+    def _advance(self, new_samples: list) -> None:
+        if not new_samples:
+            return
+        get_key = self.get_key
+        previous_key = self.last_key
+        continues_last_key = True
+        for sample in new_samples:
+            key = get_key(sample)
+            if previous_key is not None:
+                if key < previous_key:
+                    self.resets += 1
+                else:
+                    self._on_step(previous_key, key)
+            if key != self.last_key:
+                continues_last_key = False
+            previous_key = key
+
+        trailing = 0
+        for sample in reversed(new_samples):
+            if get_key(sample) != previous_key:
+                break
+            trailing += 1
+        if continues_last_key:
+            self.last_key_count += trailing
+        else:
+            self.last_key_count = trailing
+        self.last_key = previous_key
+
+    def stats(self) -> dict[str, int]:
+        return {"resets": self.resets, "overruns": self.overruns}
+
+
+class TimestampDedup(_OrderedKeyDedup):
+    """
+    Delivers samples newer than the last delivered one, by their timestamp field (or field_name).
+    Samples sharing the last timestamp are counted so none of them is lost, and a timestamp which goes
+    backwards is taken as a device reset rather than as old output.
+    """
+
+    __slots__ = ()
+
+    def __init__(self, field_name: str | None = None):
+        super().__init__(field_name=field_name)
+
+
+class SequenceDedup(_OrderedKeyDedup):
+    """
+    Delivers samples by an increasing integer sequence field, e.g. a counter printed by the sketch.
+    Skipped sequence numbers are counted as gaps, a sequence which goes backwards is taken as a reset.
+    """
+
+    __slots__ = ("gaps",)
+
+    def __init__(self, field_name: str = "seq"):
+        super().__init__(field_name=field_name)
+        self.gaps = 0
+
+    def _on_step(self, previous_key, key) -> None:
+        if key > previous_key + 1:
+            self.gaps += key - previous_key - 1
+
+    def stats(self) -> dict[str, int]:
+        return {**super().stats(), "gaps": self.gaps}
+
+
+class ContentHashDedup:
+    """
+    Delivers samples whose content was not seen among the last window_size delivered ones.
+    Needs no ordered field, but identical lines are taken as the same sample, so the output should
+    carry something which changes between samples.
+    """
+
+    __slots__ = ("window_size", "window", "seen", "overruns", "delivers_deltas")
+
+    def __init__(self, window_size: int = 4096):
+        if window_size < 1:
+            raise ValueError("window_size must be >= 1")
+        self.window_size = window_size
+        self.window: deque[int] = deque()
+        # hash -> occurrences in window
+        self.seen: dict[int, int] = {}
+        self.overruns = 0
+        self.delivers_deltas = False
+
+    def bind(
+        self,
+        decoder: SampleDecoder,
+        timestamp_field_name: str,
+        delivers_deltas: bool = False,
+    ) -> None:
+        self.window.clear()
+        self.seen.clear()
+        self.delivers_deltas = delivers_deltas
+
+    def _remember(self, content_hash: int) -> None:
+        self.window.append(content_hash)
+        self.seen[content_hash] = self.seen.get(content_hash, 0) + 1
+        if len(self.window) > self.window_size:
+            oldest = self.window.popleft()
+            count = self.seen[oldest] - 1
+            if count:
+                self.seen[oldest] = count
+            else:
+                del self.seen[oldest]
+
+    def take_new(self, items: list, decode: Callable[[Any], Any | None]) -> list:
+        seen = self.seen
+        collected: list = []
+        hashes: list[int] = []
+        anchored = False
+        for index in range(len(items) - 1, -1, -1):
+            item = items[index]
+            if isinstance(item, str):
+                item = item.strip()
+                if not item:
+                    continue
+                content_hash = hash(item)
+            else:
+                # already decoded samples, e.g. binary framing
+                content_hash = hash(repr(item))
+            if content_hash in seen:
+                anchored = True
+                break
+            sample = decode(item)
+            if sample is None:
+                # not remembered, a line caught mid output is complete on a later poll
+                continue
+            collected.append(sample)
+            hashes.append(content_hash)
+
+        if not anchored and seen and collected and not self.delivers_deltas:
+            self.overruns += 1
+        collected.reverse()
+        for content_hash in reversed(hashes):
+            self._remember(content_hash)
+        return collected
+
+    def stats(self) -> dict[str, int]:
+        return {"overruns": self.overruns}
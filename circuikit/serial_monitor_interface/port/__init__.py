@@ -1 +1,2 @@
 from .port import PortInterface
+from .framing import BinaryFrameLayout
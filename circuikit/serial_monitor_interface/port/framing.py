@@ -0,0 +1,203 @@
+from binascii import crc_hqx
+import struct
+import logging
+
+logger = logging.getLogger(__name__)
+
+COBS_DELIMITER = 0x00
+
+SLIP_END = 0xC0
+SLIP_ESC = 0xDB
+SLIP_ESC_END = 0xDC
+SLIP_ESC_ESC = 0xDD
+
+CRC_SIZE = 2
+
+# guard against a device which never sends a frame delimiter
+MAX_PENDING_FRAME_BYTES = 64 * 1024
+
+
+def crc16(data: bytes | memoryview) -> int:
+    # CRC-16/CCITT-FALSE, poly 0x1021 and init 0xFFFF
+    return crc_hqx(data, 0xFFFF)
+
+
+def cobs_decode(frame: memoryview) -> bytes | memoryview:
+    size = len(frame)
+    if size == 0:
+        raise ValueError("empty COBS frame")
+    code = frame[0]
+    if code == size:
+        # single block, there are no zeros to restore so the payload is a view on the read buffer
+        return frame[1:]
+
+    decoded = bytearray()
+    index = 0
+    while index < size:
+        code = frame[index]
+        end = index + code
+        if code == 0 or end > size:
+            raise ValueError("malformed COBS frame")
+        decoded += frame[index + 1 : end]
+        index = end
+        if code < 0xFF and index < size:
+            decoded.append(0)
+    return decoded
+
+
+def slip_decode(frame: memoryview) -> bytes:
+    data = bytes(frame)
+    if SLIP_ESC not in data:
+        return data
+    return data.replace(bytes((SLIP_ESC, SLIP_ESC_END)), bytes((SLIP_END,))).replace(
+        bytes((SLIP_ESC, SLIP_ESC_ESC)), bytes((SLIP_ESC,))
+    )
+
+
+def cobs_encode(payload: bytes) -> bytes:
+    encoded = bytearray()
+    block = bytearray()
+    for byte in payload:
+        if byte == 0:
+            encoded.append(len(block) + 1)
+            encoded += block
+            block.clear()
+            continue
+        block.append(byte)
+        if len(block) == 0xFE:
+            encoded.append(0xFF)
+            encoded += block
+            block.clear()
+    encoded.append(len(block) + 1)
+    encoded += block
+    return bytes(encoded)
+
+
+def slip_encode(payload: bytes) -> bytes:
+    return payload.replace(bytes((SLIP_ESC,)), bytes((SLIP_ESC, SLIP_ESC_ESC))).replace(
+        bytes((SLIP_END,)), bytes((SLIP_ESC, SLIP_ESC_END))
+    )
+
+
+class BinaryFrameLayout:
+    """
+    Describes the records sent in binary frames, as a list of (field name, struct format character) pairs.
+    e.g. [("time_ms", "I"), ("temperature", "f")] matches a packed C struct of uint32_t followed by float.
+    """
+
+    __slots__ = ("fields", "byte_order", "framing", "crc", "names", "record_struct")
+
+    def __init__(
+        self,
+        fields: list[tuple[str, str]],
+        byte_order: str = "<",
+        framing: str = "cobs",
+        crc: bool = True,
+    ):
+        if not fields:
+            raise ValueError("fields must not be empty")
+        if byte_order not in ("<", ">", "!", "="):
+            raise ValueError('byte_order must be one of "<", ">", "!", "="')
+        if framing not in ("cobs", "slip"):
+            raise ValueError('framing must be either "cobs" or "slip"')
+        self.fields = fields
+        self.byte_order = byte_order
+        self.framing = framing
+        self.crc = crc
+        self.names = tuple(name for name, _ in fields)
+        self.record_struct = struct.Struct(
+            byte_order + "".join(fmt for _, fmt in fields)
+        )
+
+    def __reduce__(self):
+        return (
+            BinaryFrameLayout,
+            (self.fields, self.byte_order, self.framing, self.crc),
+        )
+
+    @property
+    def delimiter(self) -> int:
+        return COBS_DELIMITER if self.framing == "cobs" else SLIP_END
+
+
+class FrameDecoder:
+    """Splits a byte stream into frames and unpacks their records into dicts"""
+
+    __slots__ = ("layout", "buffer", "crc_errors", "malformed_frames")
+
+    def __init__(self, layout: BinaryFrameLayout):
+        self.layout = layout
+        self.buffer = bytearray()
+        self.crc_errors = 0
+        self.malformed_frames = 0
+
+    def reset(self) -> None:
+        self.buffer.clear()
+
+    def feed(self, data: bytes) -> list[dict]:
+        buffer = self.buffer
+        buffer += data
+        delimiter = self.layout.delimiter
+        last = buffer.rfind(delimiter)
+        if last == -1:
+            if len(buffer) > MAX_PENDING_FRAME_BYTES:
+                logger.warning("dropping pending serial data with no frame delimiter")
+                buffer.clear()
+            return []
+
+        samples: list[dict] = []
+        view = memoryview(buffer)
+        try:
+            start = 0
+            while start < last:
+                end = buffer.find(delimiter, start, last + 1)
+                if end > start:
+                    self._decode_frame(view[start:end], samples)
+                start = end + 1
+        finally:
+            view.release()
+        # complete frames leave the buffer, a trailing partial frame waits for the next read
+        del buffer[: last + 1]
+        return samples
+
+    def _decode_frame(self, frame: memoryview, samples: list[dict]) -> None:
+        layout = self.layout
+        try:
+            if layout.framing == "cobs":
+                payload = cobs_decode(frame)
+            else:
+                payload = slip_decode(frame)
+        except ValueError:
+            self.malformed_frames += 1
+            return
+
+        if layout.crc:
+            if len(payload) < CRC_SIZE:
+                self.malformed_frames += 1
+                return
+            body = payload[:-CRC_SIZE]
+            expected = payload[-CRC_SIZE] | (payload[-1] << 8)
+            if crc16(body) != expected:
+                self.crc_errors += 1
+                return
+        else:
+            body = payload
+
+        record_struct = layout.record_struct
+        # a frame may carry several records back to back
+        if len(body) == 0 or len(body) % record_struct.size != 0:
+            self.malformed_frames += 1
+            return
+        names = layout.names
+        for values in record_struct.iter_unpack(body):
+            samples.append(dict(zip(names, values)))
+
+
+def encode_frame(layout: BinaryFrameLayout, records: list[tuple]) -> bytes:
+    # host side counterpart of circuikit_encode_frame, e.g. for simulated devices
+    body = b"".join(layout.record_struct.pack(*record) for record in records)
+    if layout.crc:
+        body += crc16(body).to_bytes(CRC_SIZE, "little")
+    if layout.framing == "cobs":
+        return cobs_encode(body) + bytes((COBS_DELIMITER,))
+    return slip_encode(body) + bytes((SLIP_END,))
@@ -3,9 +3,13 @@ import serial.tools.list_ports
 from serial.tools.list_ports_common import ListPortInfo
 import logging
 import os
+from .framing import BinaryFrameLayout, FrameDecoder
 
 logger = logging.getLogger(__name__)
 
+# guard against a device which never sends a newline
+MAX_PENDING_LINE_BYTES = 64 * 1024
+
 
 def select_port(arduino_ports: list[ListPortInfo]) -> ListPortInfo:
     choices = list(map(lambda p: f"{p.device} - {p.description}", arduino_ports))
@@ -74,17 +78,72 @@ def _readline(serial: serial.Serial) -> str | None:
     return bytes(line).decode(encoding="utf-8").strip(os.linesep)
 
 
+def _read_available_lines(serial: serial.Serial, buffer: bytearray) -> str:
+    # blocks until at least one byte arrives or the serial read timeout expires,
+    # then takes everything already waiting in a single read
+    chunk = serial.read(max(1, serial.in_waiting))
+    if not chunk:
+        return ""
+    buffer += chunk
+    if serial.in_waiting:
+        buffer += serial.read(serial.in_waiting)
+    return _take_complete_lines(buffer=buffer)
+
+
+def _take_complete_lines(buffer: bytearray) -> str:
+    end = buffer.rfind(b"\n")
+    if end == -1:
+        if len(buffer) > MAX_PENDING_LINE_BYTES:
+            logger.warning("dropping pending serial data with no line ending")
+            buffer.clear()
+        return ""
+    # complete lines leave the buffer, a trailing partial line waits for the next read
+    lines = bytes(buffer[:end])
+    del buffer[: end + 1]
+    return lines.decode(encoding="utf-8").replace("\r", "")
+
+
+def _read_available_bytes(serial: serial.Serial, block: bool) -> bytes:
+    # when blocking, waits for the first byte up to the serial read timeout
+    waiting = serial.in_waiting
+    if waiting == 0 and not block:
+        return b""
+    data = serial.read(max(1, waiting))
+    if data and serial.in_waiting:
+        data += serial.read(serial.in_waiting)
+    return data
+
+
 class PortInterface:
-    __slots__ = ("serial", "port", "baudrate")
+    __slots__ = (
+        "serial",
+        "port",
+        "baudrate",
+        "streaming",
+        "read_timeout_ms",
+        "read_buffer",
+        "frame_decoder",
+    )
 
     def __init__(
         self,
         baudrate: int,
         detect_port_automatically: bool = True,
         port: str | None = None,
+        streaming: bool = False,
+        read_timeout_ms: float = 100,
+        frame_layout: BinaryFrameLayout | None = None,
     ):
         self.serial = None
         self.baudrate = baudrate
+        # streaming mode wakes on data arrival instead of being polled every sample_rate_ms
+        self.streaming = streaming
+        self.read_timeout_ms = read_timeout_ms
+        self.read_buffer = bytearray()
+        # binary framing mode, sample() returns decoded records instead of text
+        self.frame_decoder = (
+            None if frame_layout is None else FrameDecoder(frame_layout)
+        )
         # findint arduino port might involve taking input from user in case of auto detection failure.
         # taking user input when multiprocessing is involved can be complex, to avoid those kind of complexities
         # it happens on __init__
@@ -95,15 +154,48 @@ class PortInterface:
     def __destroy__(self):
         self.stop()
 
+    @property
+    def delivers_deltas(self) -> bool:
+        # bytes read from the port are consumed, the same line is never read twice
+        return True
+
+    @property
+    def paces_sampling(self) -> bool:
+        # sample() blocks until data arrives, so the serial monitor should not sleep between calls
+        return self.streaming
+
+    def fileno(self) -> int:
+        # lets an event loop wait for the port to become readable, posix only
+        if not self._is_serial_open():
+            raise OSError("serial port is not open")
+        return self.serial.fileno()
+
+    def read_ready(self) -> str | list[dict]:
+        # never blocks, meant to be called once fileno() is readable
+        waiting = self.serial.in_waiting
+        data = self.serial.read(waiting) if waiting else b""
+        if self.frame_decoder is not None:
+            return self.frame_decoder.feed(data)
+        self.read_buffer += data
+        return _take_complete_lines(buffer=self.read_buffer)
+
     def send_message(self, message: str) -> None:
         if self._is_serial_open():
             self.serial.write(message.encode(encoding="utf-8"))
         else:
             ...
 
-    def sample(self) -> str | None:
+    def sample(self) -> str | list[dict] | None:
         if self._is_serial_open():
             try:
+                if self.frame_decoder is not None:
+                    return self.frame_decoder.feed(
+                        _read_available_bytes(serial=self.serial, block=self.streaming)
+                    )
+                if self.streaming:
+                    return _read_available_lines(
+                        serial=self.serial, buffer=self.read_buffer
+                    )
                 return _readline(serial=self.serial)
             except UnicodeDecodeError:
                 logger.error("cannot decode byte; check arduino output or baudrate")
@@ -118,7 +210,13 @@ class PortInterface:
         if self._is_serial_open():
             ...
         # timeout=0 means block=False
-        self.serial = serial.Serial(port=self.port, baudrate=self.baudrate, timeout=0)
+        timeout = self.read_timeout_ms / 1000 if self.streaming else 0
+        self.read_buffer.clear()
+        if self.frame_decoder is not None:
+            self.frame_decoder.reset()
+        self.serial = serial.Serial(
+            port=self.port, baudrate=self.baudrate, timeout=timeout
+        )
         # try:
         if not self.serial.is_open:
             self.serial.open()
@@ -1,11 +1,11 @@
-from typing import Protocol
+from typing import Any, Callable, Protocol
 
 
 class ConcreteSerialMonitorInterface(Protocol):
     def send_message(self, message: str) -> None:
         pass
 
-    def sample(self) -> str | None:
+    def sample(self) -> str | list | None:
         pass
 
     def start(self) -> None:
@@ -15,9 +15,49 @@ class ConcreteSerialMonitorInterface(Protocol):
         pass
 
 
+class ReadableSerialMonitorInterface(ConcreteSerialMonitorInterface, Protocol):
+    # lets an event loop wait on the file descriptor instead of polling sample()
+    def fileno(self) -> int:
+        pass
+
+    def read_ready(self) -> str | list | None:
+        pass
+
+
 class QueueProtocol(Protocol):
     def get(self):
         pass
 
     def put(self, obj, block: bool = True, timeout: float | None = None) -> None:
         pass
+
+
+class SampleDecoder(Protocol):
+    def decode(self, line: str) -> Any | None:
+        pass
+
+    def decode_record(self, record: bytes) -> Any:
+        pass
+
+    def encode(self, sample: Any) -> bytes:
+        pass
+
+    def field_getter(self, field_name: str) -> Callable[[Any], Any]:
+        pass
+
+
+class SampleDeduplicator(Protocol):
+    def bind(
+        self,
+        decoder: SampleDecoder,
+        timestamp_field_name: str,
+        delivers_deltas: bool = False,
+    ) -> None:
+        # delivers_deltas tells every polled item is new, so no poll is anchored to an earlier one
+        pass
+
+    def take_new(self, items: list, decode: Callable[[Any], Any | None]) -> list:
+        pass
+
+    def stats(self) -> dict[str, int]:
+        pass
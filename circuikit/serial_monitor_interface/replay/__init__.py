@@ -0,0 +1 @@
+from .replay import ReplayInterface
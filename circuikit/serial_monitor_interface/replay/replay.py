@@ -0,0 +1,332 @@
+from bisect import bisect_left, bisect_right
+from pathlib import Path
+import mmap
+import re
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+# distance between index entries, the index costs one line parse per stride
+DEFAULT_INDEX_STRIDE_BYTES = 64 * 1024
+# caps a single sample() so a max speed replay still hands over reasonably sized chunks
+DEFAULT_MAX_LINES_PER_SAMPLE = 4096
+# max speed replay has no pacing, rest a little once the capture is exhausted
+EXHAUSTED_IDLE_SLEEP_S = 0.05
+
+
+def _timestamp_pattern(timestamp_field_name: str) -> re.Pattern:
+    # cheaper than decoding the line, which the serial monitor does anyway
+    return re.compile(
+        rb'"'
+        + re.escape(timestamp_field_name.encode("utf-8"))
+        + rb'"\s*:\s*(-?\d+(?:\.\d+)?(?:[eE][-+]?\d+)?)'
+    )
+
+
+def _parse_number(raw: bytes) -> int | float:
+    try:
+        return int(raw)
+    except ValueError:
+        return float(raw)
+
+
+class CaptureIndex:
+    """Sparse timestamp to byte offset index of a line based capture, one entry per stride"""
+
+    __slots__ = ("timestamps", "offsets")
+
+    def __init__(self):
+        self.timestamps: list[int | float] = []
+        self.offsets: list[int] = []
+
+    @staticmethod
+    def build(
+        data: mmap.mmap, timestamp_pattern: re.Pattern, stride_bytes: int
+    ) -> "CaptureIndex":
+        index = CaptureIndex()
+        size = len(data)
+        position = 0
+        while position < size:
+            # index entries point at the first timestamped line at or after the stride boundary
+            line_start = position
+            while line_start < size:
+                line_end = data.find(b"\n", line_start)
+                if line_end == -1:
+                    line_end = size
+                match = timestamp_pattern.search(data, line_start, line_end)
+                if match is not None:
+                    index.timestamps.append(_parse_number(match.group(1)))
+                    index.offsets.append(line_start)
+                    break
+                line_start = line_end + 1
+            next_position = data.find(b"\n", position + stride_bytes)
+            if next_position == -1:
+                break
+            position = max(next_position + 1, line_start + 1)
+        return index
+
+    def offset_at_or_before(self, timestamp: int | float) -> int:
+        # assumes timestamps don't go backwards, which holds for a single device run
+        position = bisect_left(self.timestamps, timestamp) - 1
+        return 0 if position < 0 else self.offsets[position]
+
+    def offset_after(self, timestamp: int | float, size: int) -> int:
+        position = bisect_right(self.timestamps, timestamp)
+        return size if position >= len(self.timestamps) else self.offsets[position]
+
+
+class ReplayInterface:
+    """
+    Feeds a recorded capture, FileLogger output or a raw serial text capture, back through Circuikit.
+    The file is memory mapped and indexed sparsely by timestamp, so seeking into a long capture doesn't read all of it.
+    Lines are handed over as their timestamps come due, at speed times real rate, or as fast as possible.
+    """
+
+    __slots__ = (
+        "file_path",
+        "timestamp_field_name",
+        "speed",
+        "loop",
+        "start_ts",
+        "end_ts",
+        "rewrite_timestamps",
+        "index_stride_bytes",
+        "max_lines_per_sample",
+        "timestamp_pattern",
+        "file",
+        "data",
+        "index",
+        "range_start",
+        "range_end",
+        "cursor",
+        "clock_started_at",
+        "clock_origin_ts",
+        "pass_number",
+        "pass_offset",
+        "pass_span",
+        "pass_has_lines",
+        "last_line_ts",
+        "pending_line",
+    )
+
+    def __init__(
+        self,
+        file_path: str,
+        timestamp_field_name: str = "time",
+        speed: float | None = 1.0,
+        loop: bool = False,
+        start_ts: int | float | None = None,
+        end_ts: int | float | None = None,
+        rewrite_timestamps: bool = True,
+        index_stride_bytes: int = DEFAULT_INDEX_STRIDE_BYTES,
+        max_lines_per_sample: int = DEFAULT_MAX_LINES_PER_SAMPLE,
+    ):
+        if speed is not None and speed <= 0:
+            raise ValueError("speed must be > 0, or None for max speed")
+        if not Path(file_path).is_file():
+            raise FileNotFoundError(f"capture file_path={file_path} does not exist")
+        self.file_path = file_path
+        self.timestamp_field_name = timestamp_field_name
+        # None replays as fast as the pipeline takes it
+        self.speed = speed
+        self.loop = loop
+        self.start_ts = start_ts
+        self.end_ts = end_ts
+        # later loop passes shift timestamps forward so they keep increasing
+        self.rewrite_timestamps = rewrite_timestamps
+        self.index_stride_bytes = index_stride_bytes
+        self.max_lines_per_sample = max_lines_per_sample
+        self.timestamp_pattern = _timestamp_pattern(timestamp_field_name)
+        self.file = None
+        self.data = None
+        self.index = None
+        self.range_start = 0
+        self.range_end = 0
+        self.cursor = 0
+        self.clock_started_at = 0.0
+        self.clock_origin_ts = None
+        self.pass_number = 0
+        self.pass_offset = 0
+        self.pass_span = 0
+        self.pass_has_lines = False
+        self.last_line_ts = None
+        self.pending_line = None
+
+    def __destroy__(self):
+        self.stop()
+
+    @property
+    def delivers_deltas(self) -> bool:
+        # every line is handed over once, and loop passes would not pass a timestamp comparison
+        return True
+
+    @property
+    def paces_sampling(self) -> bool:
+        # at max speed there is nothing to wait for between samples
+        return self.speed is None
+
+    def send_message(self, message: str) -> None:
+        logger.debug(f"replay ignores sent message={message}")
+
+    def start(self) -> None:
+        # mapped in the serial monitor process, a mapping does not survive pickling
+        self.file = open(self.file_path, "rb")
+        if Path(self.file_path).stat().st_size == 0:
+            self.data = b""
+        else:
+            self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.index = CaptureIndex.build(
+            data=self.data,
+            timestamp_pattern=self.timestamp_pattern,
+            stride_bytes=self.index_stride_bytes,
+        )
+        self.seek(start_ts=self.start_ts, end_ts=self.end_ts)
+
+    def stop(self) -> None:
+        if isinstance(self.data, mmap.mmap):
+            self.data.close()
+        self.data = None
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    def seek(
+        self, start_ts: int | float | None = None, end_ts: int | float | None = None
+    ) -> None:
+        # restricts the replay to [start_ts, end_ts] and restarts it from start_ts
+        self.start_ts = start_ts
+        self.end_ts = end_ts
+        if self.data is None:
+            # not started yet, start() applies the range
+            return
+        size = len(self.data)
+        self.range_start = (
+            0 if start_ts is None else self.index.offset_at_or_before(start_ts)
+        )
+        self.range_end = (
+            size if end_ts is None else self.index.offset_after(end_ts, size=size)
+        )
+        self.cursor = self.range_start
+        self.pass_number = 0
+        self.pass_offset = 0
+        self.pass_span = 0
+        self.pass_has_lines = False
+        self.last_line_ts = None
+        self.pending_line = None
+        self._restart_clock()
+
+    def _restart_clock(self) -> None:
+        self.clock_started_at = time.monotonic()
+        self.clock_origin_ts = None
+
+    def _due_ts(self) -> float:
+        return (
+            self.clock_origin_ts
+            + (time.monotonic() - self.clock_started_at) * 1000 * self.speed
+        )
+
+    def _next_line(self) -> tuple[bytes, int | float | None] | None:
+        # returns the next line in range with its original timestamp, None at the end of the pass
+        data = self.data
+        while self.cursor < self.range_end:
+            line_start = self.cursor
+            line_end = data.find(b"\n", line_start, self.range_end)
+            if line_end == -1:
+                line_end = self.range_end
+            self.cursor = line_end + 1
+            match = self.timestamp_pattern.search(data, line_start, line_end)
+            timestamp = None if match is None else _parse_number(match.group(1))
+            if timestamp is not None:
+                # index entries are sparse, the range edges are settled per line
+                if self.start_ts is not None and timestamp < self.start_ts:
+                    continue
+                if self.end_ts is not None and timestamp > self.end_ts:
+                    self.cursor = self.range_end
+                    return None
+            self.pass_has_lines = True
+            return data[line_start:line_end], timestamp
+        return None
+
+    def _wrap(self) -> bool:
+        if not self.loop:
+            return False
+        if self.range_start >= self.range_end or not self.pass_has_lines:
+            # an empty range, e.g. an empty capture or start_ts past its end, would wrap forever
+            return False
+        if self.pass_span == 0 and self.last_line_ts is not None:
+            # the next pass continues one typical interval after the last line
+            self.pass_span = self.last_line_ts - self.clock_origin_ts + self._interval()
+        self.pass_number += 1
+        self.pass_offset = self.pass_span * self.pass_number
+        self.cursor = self.range_start
+        self.pass_has_lines = False
+        return True
+
+    def _interval(self) -> int | float:
+        # spacing of the first two lines of the range, so looped passes keep the capture rhythm
+        timestamps = []
+        cursor = self.range_start
+        while cursor < self.range_end and len(timestamps) < 2:
+            line_end = self.data.find(b"\n", cursor, self.range_end)
+            if line_end == -1:
+                line_end = self.range_end
+            match = self.timestamp_pattern.search(self.data, cursor, line_end)
+            if match is not None:
+                timestamp = _parse_number(match.group(1))
+                if self.start_ts is None or timestamp >= self.start_ts:
+                    timestamps.append(timestamp)
+            cursor = line_end + 1
+        if len(timestamps) == 2 and timestamps[1] > timestamps[0]:
+            return timestamps[1] - timestamps[0]
+        return 1
+
+    def _rewrite(self, line: bytes, timestamp: int | float) -> bytes:
+        if self.pass_offset == 0 or not self.rewrite_timestamps:
+            return line
+        shifted = timestamp + self.pass_offset
+        return self.timestamp_pattern.sub(
+            lambda match: match.group(0)[: match.start(1) - match.start(0)]
+            + repr(shifted).encode("utf-8"),
+            line,
+            count=1,
+        )
+
+    def sample(self) -> str | None:
+        if self.data is None:
+            return None
+        lines = []
+        due_ts = None
+        while len(lines) < self.max_lines_per_sample:
+            if self.pending_line is not None:
+                line, timestamp = self.pending_line
+                self.pending_line = None
+            else:
+                next_line = self._next_line()
+                if next_line is None:
+                    if not self._wrap():
+                        break
+                    continue
+                line, timestamp = next_line
+
+            if timestamp is not None:
+                if self.clock_origin_ts is None:
+                    # clock starts with the first line, not when the replay was set up
+                    self.clock_origin_ts = timestamp
+                    self.clock_started_at = time.monotonic()
+                timestamp_in_pass = timestamp
+                timestamp = timestamp + self.pass_offset
+                if self.speed is not None:
+                    if due_ts is None:
+                        due_ts = self._due_ts()
+                    if timestamp > due_ts:
+                        # not due yet, keep it for the next sample
+                        self.pending_line = (line, timestamp_in_pass)
+                        break
+                self.last_line_ts = timestamp_in_pass
+                line = self._rewrite(line, timestamp_in_pass)
+            lines.append(line)
+
+        if not lines and self.speed is None:
+            time.sleep(EXHAUSTED_IDLE_SLEEP_S)
+        return b"\n".join(lines).decode(encoding="utf-8", errors="replace")
@@ -0,0 +1,139 @@
+from typing import Any, Callable
+from .types import AdaptiveSamplingOptions
+
+# weight of the newest poll in the arrival rate estimate
+RATE_SMOOTHING = 0.3
+
+
+class SamplingScheduler:
+    """
+    Decides when the next poll is due. Deadlines advance by the interval from the previous deadline rather
+    than from the end of the poll, so the time spent sampling and decoding doesn't add up into drift. A poll
+    which overran its deadline resets the schedule instead of bursting to catch up.
+
+    With AdaptiveSamplingOptions the interval follows the data: idle polls back off exponentially up to
+    max_interval_ms, the first new sample brings it back to sample_rate_ms. When the interface only keeps
+    its last window_lines lines (e.g. the ~60 line Tinkercad panel) the next poll is brought forward to before
+    the window fills at the current arrival rate, and idle back off stops where a burst at the fastest rate
+    seen so far would fill it.
+
+    Samples which likely scrolled out of that window between two polls are counted as missed_samples. A poll
+    is taken as overrun when all of its window was new, or when the deduplicator says so. The count is
+    estimated from the timestamp gap between the last delivered sample and the first new one, over the
+    spacing of the new ones, or from the arrival rate when timestamps can't tell.
+    """
+
+    __slots__ = (
+        "sample_rate_s",
+        "adaptive",
+        "window_lines",
+        "get_timestamp",
+        "interval_s",
+        "deadline",
+        "polled_at",
+        "rate",
+        "last_rate",
+        "peak_rate",
+        "last_timestamp",
+        "missed_samples",
+        "late_polls",
+    )
+
+    def __init__(
+        self,
+        sample_rate_ms: float,
+        adaptive: AdaptiveSamplingOptions | None = None,
+        window_lines: int | None = None,
+        get_timestamp: Callable[[Any], Any] | None = None,
+    ):
+        self.sample_rate_s = sample_rate_ms / 1000
+        self.adaptive = adaptive
+        self.window_lines = window_lines
+        self.get_timestamp = get_timestamp
+        self.interval_s = self.sample_rate_s
+        self.deadline: float | None = None
+        self.polled_at: float | None = None
+        # new samples per second, smoothed, of the latest poll and of the fastest poll
+        self.rate = 0.0
+        self.last_rate = 0.0
+        self.peak_rate = 0.0
+        self.last_timestamp = None
+        self.missed_samples = 0.0
+        self.late_polls = 0
+
+    def start(self, now: float) -> None:
+        self.deadline = now
+        self.polled_at = None
+
+    def on_poll(self, samples: list, now: float, overran: bool = False) -> float:
+        # seconds to wait until the next poll is due, overran tells the poll is known to have missed samples
+        if self.deadline is None:
+            self.start(now)
+        if self.window_lines is not None and len(samples) >= self.window_lines:
+            # the whole window was new, what arrived before it is likely gone
+            overran = True
+        if self.polled_at is not None:
+            elapsed = now - self.polled_at
+            if elapsed > 0:
+                if overran:
+                    self.missed_samples += self._estimate_missed(samples, elapsed)
+                self.last_rate = len(samples) / elapsed
+                self.rate += RATE_SMOOTHING * (self.last_rate - self.rate)
+                self.peak_rate = max(self.peak_rate, self.last_rate)
+        self.polled_at = now
+        if samples and self.get_timestamp is not None:
+            self.last_timestamp = self._timestamp(samples[-1])
+
+        self.interval_s = self._next_interval(len(samples))
+        self.deadline += self.interval_s
+        if self.deadline < now:
+            self.late_polls += 1
+            self.deadline = now
+        return self.deadline - now
+
+    def _timestamp(self, sample):
+        try:
+            return self.get_timestamp(sample)
+        except (KeyError, AttributeError, TypeError):
+            return None
+
+    def _estimate_missed(self, samples: list, elapsed: float) -> float:
+        if len(samples) >= 2 and self.last_timestamp is not None:
+            first = self._timestamp(samples[0])
+            last = self._timestamp(samples[-1])
+            try:
+                spacing = (last - first) / (len(samples) - 1)
+                if spacing > 0 and first >= self.last_timestamp:
+                    return max(0.0, (first - self.last_timestamp) / spacing - 1)
+            except TypeError:
+                # not numeric, e.g. formatted strings
+                pass
+        # the smoothed rate from before the overrun, the window caps what this poll can show
+        return max(0.0, self.rate * elapsed - len(samples))
+
+    def _next_interval(self, new_samples: int) -> float:
+        adaptive = self.adaptive
+        if adaptive is None:
+            return self.sample_rate_s
+        if new_samples:
+            interval = self.sample_rate_s
+            rate = max(self.rate, self.last_rate)
+        elif self.window_lines is not None and self.peak_rate == 0:
+            # nothing tells yet how fast a first burst could fill the window
+            interval = self.sample_rate_s
+            rate = 0
+        else:
+            interval = min(
+                self.interval_s * adaptive.backoff, adaptive.max_interval_ms / 1000
+            )
+            rate = self.peak_rate
+        if self.window_lines is not None and rate > 0:
+            # due before the window is fill_target full
+            interval = min(interval, adaptive.fill_target * self.window_lines / rate)
+        return max(interval, adaptive.min_interval_ms / 1000)
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "missed_samples": round(self.missed_samples),
+            "late_polls": self.late_polls,
+        }
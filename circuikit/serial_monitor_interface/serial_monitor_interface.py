@@ -1,91 +1,210 @@
-import json
-from typing import Callable
+from typing import Any, Callable
 import time
 import threading
 from functools import partial
-from .protocols import QueueProtocol
-from .types import SerialMonitorOptions
+from .protocols import QueueProtocol, SampleDecoder, SampleDeduplicator
+from .decoders import JsonDecoder
+from .dedup import TimestampDedup
+from .types import AdaptiveSamplingOptions, SerialMonitorOptions
+from .batcher import SampleBatcher
+from .scheduler import SamplingScheduler
+from ..metrics import MetricsRegistry
 import logging
 
 logger = logging.getLogger(__name__)
 
 MIN_SAMPLE_RATE_MS = 25
 
+DEFAULT_DECODER = JsonDecoder()
+
 
 def sample_serial_monitor(
     on_new_read: Callable[[list[dict]], None],
     timestamp_field_name: str,
     sample_rate_ms: float,
     stop_event: threading.Event,
-    sample_fn: Callable[[], str | None],
+    sample_fn: Callable[[], str | list | None],
+    paces_sampling: bool = False,
+    decoder: SampleDecoder | None = None,
+    metrics: MetricsRegistry | None = None,
+    dedup: SampleDeduplicator | None = None,
+    adaptive_sampling: AdaptiveSamplingOptions | None = None,
+    window_lines: int | None = None,
 ):
+    if decoder is None:
+        decoder = DEFAULT_DECODER
+    scheduler = SamplingScheduler(
+        sample_rate_ms=sample_rate_ms,
+        adaptive=adaptive_sampling,
+        window_lines=window_lines,
+        get_timestamp=decoder.field_getter(timestamp_field_name),
+    )
+    decode = partial(
+        decode_line,
+        timestamp_field_name=timestamp_field_name,
+        decoder=decoder,
+        metrics=metrics,
+    )
+    if metrics is not None:
+        sample_time = metrics.histogram("sample_ms")
+        decode_time = metrics.histogram("decode_ms")
+        poll_interval = metrics.histogram("poll_interval_ms")
     # so basically serial monitor is bound to max line of 60
-    # so reading all of it all the time and take last should be fine as long as
-    # the service output in less frequent than the python read rate
+    # so reading all of it all the time and take last is fine as long as the next poll
+    # comes before the panel scrolls past the last delivered line, which the scheduler sees to
+    overruns = 0
+    scheduler.start(time.monotonic())
     while not stop_event.is_set():
+        sample_started_at = time.monotonic()
         text = sample_fn()
+        sampled_at = time.monotonic()
+        if metrics is not None:
+            sample_time.observe((sampled_at - sample_started_at) * 1000)
         if text is None:
             logger.warning(
                 "Sampled serial monitor output, but received None as a response"
             )
+            if paces_sampling:
+                # the interface stopped pacing, e.g. a closed port, the schedule starts over from here
+                scheduler.start(sampled_at)
+            # counts as an idle poll, waited for instead of spinning
+            scheduler.on_poll(samples=[], now=sampled_at)
+            stop_event.wait(max(0.0, scheduler.deadline - time.monotonic()))
             continue
-        samples = extract_valid_samples(
-            data=text, timestamp_field_name=timestamp_field_name
-        )
+        samples = extract_new_samples(data=text, decode=decode, dedup=dedup)
+        if not paces_sampling:
+            overran = False
+            if dedup is not None:
+                # the poll didn't reach back to the last delivered sample
+                dedup_overruns = dedup.stats().get("overruns", 0)
+                overran = dedup_overruns > overruns
+                overruns = dedup_overruns
+            scheduler.on_poll(samples=samples, now=sampled_at, overran=overran)
+        if metrics is not None:
+            decode_time.observe((time.monotonic() - sampled_at) * 1000)
+            metrics.increment("samples_read", len(samples))
+            if dedup is not None:
+                for name, value in dedup.stats().items():
+                    metrics.counters[f"dedup_{name}"] = value
+            if not paces_sampling:
+                poll_interval.observe(scheduler.interval_s * 1000)
+                for name, value in scheduler.stats().items():
+                    metrics.counters[name] = value
         on_new_read(samples)
-        time.sleep(sample_rate_ms / 1000)
-
-
-def extract_valid_samples(data: str, timestamp_field_name: str):
-    samples: list[dict] = []
-    lines = data.split("\n")
-    for line in lines:
-        try:
-            sample: dict = json.loads(line)
-            if not isinstance(sample, dict):
-                continue
-            if not timestamp_field_name in sample:
-                logger.warning(
-                    f"{sample=} has no {timestamp_field_name=} key, skipping..."
-                )
-                continue
-            samples.append(sample)
-        except ValueError:
+        if not paces_sampling:
+            stop_event.wait(max(0.0, scheduler.deadline - time.monotonic()))
+
+
+def _already_decoded(sample):
+    return sample
+
+
+def extract_new_samples(
+    data: str | list,
+    decode: Callable[[str], Any | None],
+    dedup: SampleDeduplicator | None = None,
+) -> list:
+    if dedup is not None:
+        # only lines past the ones delivered on previous polls are decoded
+        return dedup.take_new(
+            items=data if isinstance(data, list) else data.split("\n"),
+            decode=_already_decoded if isinstance(data, list) else decode,
+        )
+    if isinstance(data, list):
+        # interface already decoded its samples, e.g. binary framing
+        return data
+    return [sample for sample in map(decode, data.split("\n")) if sample is not None]
+
+
+def decode_line(
+    line: str,
+    timestamp_field_name: str,
+    decoder: SampleDecoder,
+    metrics: MetricsRegistry | None = None,
+):
+    sample = decoder.decode(line)
+    if sample is None:
+        # that's expected in case of not a JSON or if sample taken during output is in progress...
+        if metrics is not None and line.strip():
+            metrics.increment("parse_failures")
+        if logger.isEnabledFor(logging.DEBUG):
             logger.debug(f"failed to load incomplete JSON {line=}")
-            # that's expected in case of not a JSON or if sample taken during output is in progress...
-            pass
+        return None
+    # typed schemas enforce their own fields
+    if isinstance(sample, dict) and timestamp_field_name not in sample:
+        logger.warning(f"{sample=} has no {timestamp_field_name=} key, skipping...")
+        return None
+    return sample
+
+
+def extract_valid_samples(
+    data: str,
+    timestamp_field_name: str,
+    decoder: SampleDecoder | None = None,
+    metrics: MetricsRegistry | None = None,
+):
+    if decoder is None:
+        decoder = DEFAULT_DECODER
+    samples: list = []
+    for line in data.split("\n"):
+        sample = decode_line(
+            line=line,
+            timestamp_field_name=timestamp_field_name,
+            decoder=decoder,
+            metrics=metrics,
+        )
+        if sample is not None:
+            samples.append(sample)
     return samples
 
 
 def watch(
-    on_next_read: Callable[[dict], None],
+    on_next_batch: Callable[[list[dict]], None],
     stop_event: threading.Event,
     sample_rate_ms: float,
-    sample_fn: Callable[[], str | None],
+    sample_fn: Callable[[], str | list | None],
     timestamp_field_name: str,
+    batch_max_size: int,
+    batch_linger_ms: float,
+    paces_sampling: bool = False,
+    delivers_deltas: bool = False,
+    decoder: SampleDecoder | None = None,
+    metrics: MetricsRegistry | None = None,
+    dedup: SampleDeduplicator | None = None,
+    adaptive_sampling: AdaptiveSamplingOptions | None = None,
+    window_lines: int | None = None,
 ):
-    last_sample_time = -1
-
-    def on_new_read(new_samples: list[dict]):
-        nonlocal last_sample_time
-        delta_samples: list[dict] = []
-        if len(new_samples) == 0:
-            return
-        for sample in new_samples:
-            if sample[timestamp_field_name] > last_sample_time:
-                delta_samples.append(sample)
-
-        last_sample_time = new_samples[-1][timestamp_field_name]
-
-        for sample in delta_samples:
-            on_next_read(sample)
+    if decoder is None:
+        decoder = DEFAULT_DECODER
+    if dedup is None and not delivers_deltas:
+        # interfaces which return only unseen lines need no default dedup, one set explicitly
+        # still runs, e.g. SequenceDedup counting gaps of a serial port
+        dedup = TimestampDedup()
+    if dedup is not None:
+        dedup.bind(
+            decoder=decoder,
+            timestamp_field_name=timestamp_field_name,
+            delivers_deltas=delivers_deltas,
+        )
+    batcher = SampleBatcher(
+        on_batch=on_next_batch,
+        max_size=batch_max_size,
+        linger_ms=batch_linger_ms,
+        metrics=metrics,
+    )
 
     sample_serial_monitor(
-        on_new_read=on_new_read,
+        on_new_read=batcher.add,
         timestamp_field_name=timestamp_field_name,
         stop_event=stop_event,
         sample_fn=sample_fn,
         sample_rate_ms=sample_rate_ms,
+        paces_sampling=paces_sampling,
+        decoder=decoder,
+        metrics=metrics,
+        dedup=dedup,
+        adaptive_sampling=adaptive_sampling,
+        window_lines=window_lines,
     )
 
 
@@ -114,9 +233,19 @@ class SerialMonitorInterface:
     def __init__(
         self,
         options: SerialMonitorOptions,
-        on_next_read: Callable[[dict], None],
+        on_next_read: Callable[[dict], None] | None,
         messages_to_send_queue: QueueProtocol,
+        on_next_batch: Callable[[list[dict]], None] | None = None,
+        metrics: MetricsRegistry | None = None,
     ):
+        if on_next_batch is None:
+            if on_next_read is None:
+                raise ValueError("Either on_next_read or on_next_batch must be set")
+
+            def on_next_batch(batch: list[dict]):
+                for sample in batch:
+                    on_next_read(sample)
+
         self.messages_to_send_queue = messages_to_send_queue
 
         self.stop_event = threading.Event()
@@ -135,11 +264,24 @@ class SerialMonitorInterface:
         self.watcher_thread = threading.Thread(
             target=partial(
                 watch,
-                on_next_read=on_next_read,
+                on_next_batch=on_next_batch,
                 stop_event=self.stop_event,
                 timestamp_field_name=self.options.timestamp_field_name,
                 sample_rate_ms=self.options.sample_rate_ms,
                 sample_fn=self.options.interface.sample,
+                batch_max_size=self.options.batch_max_size,
+                batch_linger_ms=self.options.batch_linger_ms,
+                # interfaces which block in sample() until data arrives pace the loop themselves
+                paces_sampling=getattr(self.options.interface, "paces_sampling", False),
+                delivers_deltas=getattr(
+                    self.options.interface, "delivers_deltas", False
+                ),
+                decoder=self.options.decoder,
+                metrics=metrics,
+                dedup=self.options.dedup,
+                adaptive_sampling=self.options.adaptive_sampling,
+                # interfaces which only keep their last lines, e.g. a Tinkercad panel, tell how many
+                window_lines=getattr(self.options.interface, "window_lines", None),
             ),
             daemon=True,
         )
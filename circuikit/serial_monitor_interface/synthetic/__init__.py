@@ -0,0 +1 @@
+from .synthetic import SyntheticInterface, binary_frame_layout
@@ -0,0 +1,190 @@
+import json
+import random
+import time
+import logging
+from ..port.framing import BinaryFrameLayout, FrameDecoder, encode_frame
+
+logger = logging.getLogger(__name__)
+
+# caps a single sample() so a max rate run still hands over reasonably sized chunks
+DEFAULT_MAX_LINES_PER_SAMPLE = 4096
+# longest a paced sample() waits for the next line to come due
+MAX_WAIT_S = 0.005
+
+SEQUENCE_FIELD_NAME = "seq"
+
+
+class SyntheticInterface:
+    """
+    Simulated device for load tests, emits generated samples at a target rate with no hardware or browser.
+    Timestamps are time.monotonic() in milliseconds at generation, which is system wide,
+    so a service can measure end to end latency as the difference to its own monotonic clock.
+    """
+
+    __slots__ = (
+        "rate_hz",
+        "field_count",
+        "line_size",
+        "corrupt_fraction",
+        "frame_layout",
+        "timestamp_field_name",
+        "max_lines_per_sample",
+        "seed",
+        "random",
+        "frame_decoder",
+        "started_at",
+        "emitted",
+        "corrupted",
+        "received_messages",
+    )
+
+    def __init__(
+        self,
+        rate_hz: float | None = 1000,
+        field_count: int = 4,
+        line_size: int | tuple[int, int] = 0,
+        corrupt_fraction: float = 0.0,
+        frame_layout: BinaryFrameLayout | None = None,
+        timestamp_field_name: str = "time",
+        max_lines_per_sample: int = DEFAULT_MAX_LINES_PER_SAMPLE,
+        seed: int | None = None,
+    ):
+        if rate_hz is not None and rate_hz <= 0:
+            raise ValueError("rate_hz must be > 0, or None for max rate")
+        if not 0 <= corrupt_fraction <= 1:
+            raise ValueError("corrupt_fraction must be between 0 and 1")
+        # None emits as fast as the pipeline takes it
+        self.rate_hz = rate_hz
+        self.field_count = field_count
+        # JSON lines are padded up to a size drawn uniformly from (min, max), 0 means no padding
+        self.line_size = (
+            line_size if isinstance(line_size, tuple) else (line_size, line_size)
+        )
+        self.corrupt_fraction = corrupt_fraction
+        # binary mode emits frames for this layout, its first field is the timestamp and the second the sequence
+        self.frame_layout = frame_layout
+        self.timestamp_field_name = timestamp_field_name
+        self.max_lines_per_sample = max_lines_per_sample
+        self.seed = seed
+        self.random = random.Random(seed)
+        self.frame_decoder = None
+        self.started_at = 0.0
+        self.emitted = 0
+        self.corrupted = 0
+        self.received_messages = 0
+
+    def __destroy__(self):
+        self.stop()
+
+    @property
+    def delivers_deltas(self) -> bool:
+        # generated samples are never repeated, and at high rates many share a millisecond
+        return True
+
+    @property
+    def paces_sampling(self) -> bool:
+        # sample() waits for the next line to come due itself
+        return True
+
+    def send_message(self, message: str) -> None:
+        self.received_messages += 1
+
+    def start(self) -> None:
+        self.random = random.Random(self.seed)
+        self.frame_decoder = (
+            None if self.frame_layout is None else FrameDecoder(self.frame_layout)
+        )
+        self.started_at = time.monotonic()
+        self.emitted = 0
+        self.corrupted = 0
+
+    def stop(self) -> None:
+        self.frame_decoder = None
+
+    def _due_count(self) -> int:
+        if self.rate_hz is None:
+            return self.max_lines_per_sample
+        due = int((time.monotonic() - self.started_at) * self.rate_hz) - self.emitted
+        if due <= 0:
+            # sleep until the next line is due, in short steps so stop stays responsive
+            next_due_at = self.started_at + (self.emitted + 1) / self.rate_hz
+            time.sleep(min(MAX_WAIT_S, max(0.0, next_due_at - time.monotonic())))
+            due = (
+                int((time.monotonic() - self.started_at) * self.rate_hz) - self.emitted
+            )
+        return max(0, min(due, self.max_lines_per_sample))
+
+    def _is_corrupt(self) -> bool:
+        if self.corrupt_fraction and self.random.random() < self.corrupt_fraction:
+            self.corrupted += 1
+            return True
+        return False
+
+    def sample(self) -> str | list | None:
+        count = self._due_count()
+        if count == 0:
+            return ""
+        if self.frame_layout is not None:
+            return self._sample_frames(count)
+        return self._sample_lines(count)
+
+    def _sample_lines(self, count: int) -> str:
+        timestamp_field_name = self.timestamp_field_name
+        field_names = [f"f{index}" for index in range(self.field_count)]
+        min_size, max_size = self.line_size
+        rng = self.random
+        lines = []
+        for _ in range(count):
+            sample = {
+                timestamp_field_name: time.monotonic() * 1000,
+                SEQUENCE_FIELD_NAME: self.emitted,
+            }
+            for name in field_names:
+                sample[name] = rng.random()
+            line = json.dumps(sample, separators=(",", ":"))
+            target_size = rng.randint(min_size, max_size) if max_size else 0
+            if target_size > len(line):
+                sample["pad"] = ""
+                padding = target_size - len(json.dumps(sample, separators=(",", ":")))
+                sample["pad"] = "x" * max(0, padding)
+                line = json.dumps(sample, separators=(",", ":"))
+            if self._is_corrupt():
+                # a partial line, as if bytes were lost on the wire
+                line = line[: rng.randint(1, len(line) - 1)]
+            lines.append(line)
+            self.emitted += 1
+        return "\n".join(lines)
+
+    def _sample_frames(self, count: int) -> list:
+        layout = self.frame_layout
+        rng = self.random
+        extra_fields = len(layout.fields) - 2
+        frames = bytearray()
+        for _ in range(count):
+            record = (time.monotonic() * 1000, self.emitted) + tuple(
+                rng.random() for _ in range(extra_fields)
+            )
+            frame = encode_frame(layout, [record])
+            if self._is_corrupt():
+                # a flipped bit, caught by the CRC or the framing
+                position = rng.randrange(len(frame) - 1)
+                frame = (
+                    frame[:position]
+                    + bytes((frame[position] ^ 0x10,))
+                    + frame[position + 1 :]
+                )
+            frames += frame
+            self.emitted += 1
+        # decoded the same way PortInterface decodes frames read from a serial port
+        return self.frame_decoder.feed(bytes(frames))
+
+
+def binary_frame_layout(
+    field_count: int, timestamp_field_name: str = "time", framing: str = "cobs"
+) -> BinaryFrameLayout:
+    # layout SyntheticInterface expects, timestamp and sequence followed by field_count floats
+    return BinaryFrameLayout(
+        fields=[(timestamp_field_name, "d"), (SEQUENCE_FIELD_NAME, "I")]
+        + [(f"f{index}", "f") for index in range(field_count)],
+        framing=framing,
+    )
@@ -1 +1,2 @@
 from .thinkercad import ThinkercadInterface
+from .multi import MultiThinkercad, ThinkercadTabInterface
@@ -0,0 +1,202 @@
+from itertools import count
+import json
+import threading
+import requests
+import logging
+
+try:
+    import websocket
+except ImportError:
+    websocket = None
+
+logger = logging.getLogger(__name__)
+
+
+def function_expression(body: str, *args) -> str:
+    # runs a selenium style script body, which reads `arguments` and returns, as a single expression
+    return f"(function() {{{body}}}).apply(null, {json.dumps(list(args))})"
+
+
+def find_page_target(
+    debugger_port: int,
+    target_id: str | None = None,
+    url_prefix: str | None = None,
+    host: str = "localhost",
+) -> dict:
+    targets = requests.get(f"http://{host}:{debugger_port}/json/list", timeout=5).json()
+    pages = [target for target in targets if target.get("type") == "page"]
+    for page in pages:
+        if target_id is not None and page.get("id") == target_id:
+            return page
+    for page in pages:
+        if url_prefix is not None and page.get("url", "").startswith(url_prefix):
+            return page
+    if target_id is None and url_prefix is None and pages:
+        return pages[0]
+    raise RuntimeError(f"no page target found on {debugger_port=}")
+
+
+class CdpSession:
+    """
+    A single persistent DevTools websocket, to one page or to the whole browser. call waits for its own
+    response, send doesn't, so several commands can be in flight at once. Responses are matched by id,
+    whichever thread reads one hands it over to the thread waiting for it. On a browser websocket, pages
+    attached with attach_page are addressed by their session_id.
+    """
+
+    __slots__ = (
+        "websocket",
+        "ids",
+        "responses",
+        "unawaited",
+        "receive_lock",
+        "call_timeout",
+    )
+
+    def __init__(self, websocket_url: str, call_timeout: float = 5):
+        if websocket is None:
+            raise ImportError("CdpSession requires the websocket-client package")
+        # chrome rejects websockets with an unexpected Origin header
+        self.websocket = websocket.create_connection(
+            websocket_url,
+            timeout=call_timeout,
+            enable_multithread=True,
+            suppress_origin=True,
+        )
+        self.ids = count(1)
+        self.responses: dict[int, dict] = {}
+        # ids of commands sent by send, their responses are only checked for errors
+        self.unawaited: set[int] = set()
+        self.receive_lock = threading.Lock()
+        self.call_timeout = call_timeout
+
+    @classmethod
+    def connect_browser(
+        cls, debugger_port: int, call_timeout: float = 5, host: str = "localhost"
+    ) -> "CdpSession":
+        version = requests.get(
+            f"http://{host}:{debugger_port}/json/version", timeout=5
+        ).json()
+        return cls(
+            websocket_url=version["webSocketDebuggerUrl"], call_timeout=call_timeout
+        )
+
+    @classmethod
+    def connect(
+        cls,
+        debugger_port: int,
+        target_id: str | None = None,
+        url_prefix: str | None = None,
+        call_timeout: float = 5,
+    ) -> "CdpSession":
+        target = find_page_target(
+            debugger_port=debugger_port, target_id=target_id, url_prefix=url_prefix
+        )
+        return cls(
+            websocket_url=target["webSocketDebuggerUrl"], call_timeout=call_timeout
+        )
+
+    def _post(
+        self,
+        method: str,
+        params: dict | None,
+        awaited: bool,
+        session_id: str | None = None,
+    ) -> int:
+        message_id = next(self.ids)
+        if not awaited:
+            # registered before sending, the response may be read right away by another thread
+            self.unawaited.add(message_id)
+        message = {"id": message_id, "method": method, "params": params or {}}
+        if session_id is not None:
+            message["sessionId"] = session_id
+        self.websocket.send(json.dumps(message))
+        return message_id
+
+    def send(
+        self, method: str, params: dict | None = None, session_id: str | None = None
+    ) -> None:
+        # fire and forget, the response is read later by whichever call comes next
+        self._post(method, params, awaited=False, session_id=session_id)
+
+    def call(
+        self, method: str, params: dict | None = None, session_id: str | None = None
+    ) -> dict:
+        return self._wait(
+            self._post(method, params, awaited=True, session_id=session_id)
+        )
+
+    def attach_page(self, target_id: str) -> str:
+        # flat session, its commands share this websocket
+        result = self.call(
+            "Target.attachToTarget", {"targetId": target_id, "flatten": True}
+        )
+        return result["sessionId"]
+
+    def _wait(self, message_id: int) -> dict:
+        with self.receive_lock:
+            while True:
+                response = self.responses.pop(message_id, None)
+                if response is None:
+                    response = json.loads(self.websocket.recv())
+                    received_id = response.get("id")
+                    if received_id is None:
+                        # an event, nothing subscribes to them
+                        continue
+                    if received_id != message_id:
+                        self._hand_over(received_id, response)
+                        continue
+                error = response.get("error")
+                if error is not None:
+                    raise RuntimeError(f"CDP error; error={error.get('message')}")
+                return response.get("result", {})
+
+    def _hand_over(self, received_id: int, response: dict) -> None:
+        if received_id in self.unawaited:
+            self.unawaited.discard(received_id)
+            if "error" in response:
+                logger.error(f"CDP command failed; error={response['error']}")
+            return
+        self.responses[received_id] = response
+
+    @staticmethod
+    def _evaluation_value(result: dict):
+        exception = result.get("exceptionDetails")
+        if exception is not None:
+            raise RuntimeError(f"script failed; exception={exception.get('text')}")
+        return result.get("result", {}).get("value")
+
+    def evaluate(self, expression: str, session_id: str | None = None):
+        result = self.call(
+            "Runtime.evaluate",
+            {"expression": expression, "returnByValue": True},
+            session_id=session_id,
+        )
+        return self._evaluation_value(result)
+
+    def evaluate_many(self, expressions: list[tuple[str | None, str]]) -> list:
+        # (session_id, expression) pairs, all are sent before any response is awaited so they cost
+        # about one round trip together, a failed evaluation yields None
+        message_ids = [
+            self._post(
+                "Runtime.evaluate",
+                {"expression": expression, "returnByValue": True},
+                awaited=True,
+                session_id=session_id,
+            )
+            for session_id, expression in expressions
+        ]
+        values = []
+        for message_id in message_ids:
+            try:
+                values.append(self._evaluation_value(self._wait(message_id)))
+            except RuntimeError as e:
+                logger.error(f"batched evaluation failed; e={e}")
+                values.append(None)
+        return values
+
+    def close(self) -> None:
+        try:
+            self.websocket.close()
+        except Exception as e:
+            logger.debug(f"failed to close CDP websocket; e={e}")
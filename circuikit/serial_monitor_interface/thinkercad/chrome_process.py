@@ -1,9 +1,12 @@
 import subprocess
 import signal
 import sys
+import threading
 import os
 import atexit
 import platform
+import time
+import requests
 import logging
 
 logger = logging.getLogger(__name__)
@@ -34,7 +37,40 @@ def _get_user_data_dir_absolute_path(profile_data_dir: str | None) -> str:
     return os.path.abspath(user_data_dir_absolute_path)
 
 
-def open_chrome_process(debugger_port: int, profile_data_dir: str | None) -> None:
+# how long a freshly started Chrome gets to open its debugger port
+DEBUGGER_STARTUP_TIMEOUT_S = 10
+
+
+def is_debugger_listening(debugger_port: int) -> bool:
+    try:
+        return requests.get(
+            f"http://localhost:{debugger_port}/json/version", timeout=0.5
+        ).ok
+    except requests.RequestException:
+        return False
+
+
+def _wait_for_debugger(debugger_port: int, timeout_s: float) -> None:
+    # Chrome announces nothing we could wait on, the port is polled until it answers
+    deadline = time.monotonic() + timeout_s
+    while not is_debugger_listening(debugger_port=debugger_port):
+        if time.monotonic() >= deadline:
+            logger.error(f"Chrome did not open {debugger_port=} in {timeout_s}s")
+            return
+        time.sleep(0.05)
+
+
+def open_chrome_process(
+    debugger_port: int,
+    profile_data_dir: str | None,
+    headless: bool = False,
+    reuse: bool = False,
+) -> None:
+    # with reuse, a Chrome already listening on the port is used, and one started here outlives the script
+    # so the next run finds its tabs warm
+    if reuse and is_debugger_listening(debugger_port=debugger_port):
+        logger.info(f"Reusing the Chrome listening on {debugger_port=}")
+        return
     user_data_dir_absolute_path = _get_user_data_dir_absolute_path(
         profile_data_dir=profile_data_dir
     )
@@ -42,7 +78,22 @@ def open_chrome_process(debugger_port: int, profile_data_dir: str | None) -> Non
         _get_chrome_application_path(),
         f"--remote-debugging-port={debugger_port}",
         f"--user-data-dir={user_data_dir_absolute_path}",
+        # simulations in background tabs must keep running at full speed
+        "--disable-background-timer-throttling",
+        "--disable-backgrounding-occluded-windows",
+        "--disable-renderer-backgrounding",
     ]
+    if headless:
+        # the editor lays itself out by the window size, which headless would shrink
+        chrome_args += ["--headless=new", "--window-size=1920,1080"]
+
+    if reuse:
+        # its own session, so signals sent to this script don't reach it
+        subprocess.Popen(args=chrome_args, start_new_session=True)
+        _wait_for_debugger(
+            debugger_port=debugger_port, timeout_s=DEBUGGER_STARTUP_TIMEOUT_S
+        )
+        return
 
     # Start Chrome process
     chrome_process = subprocess.Popen(args=chrome_args)
@@ -62,6 +113,12 @@ def open_chrome_process(debugger_port: int, profile_data_dir: str | None) -> Non
         cleanup()
         sys.exit(0)
 
-    # Register signal handlers
-    signal.signal(signal.SIGINT, signal_handler)
-    signal.signal(signal.SIGTERM, signal_handler)
+    # Register signal handlers, only possible from the main thread, e.g. not from a device thread or an
+    # AsyncCircuikit executor, where atexit alone cleans up
+    if threading.current_thread() is threading.main_thread():
+        signal.signal(signal.SIGINT, signal_handler)
+        signal.signal(signal.SIGTERM, signal_handler)
+
+    _wait_for_debugger(
+        debugger_port=debugger_port, timeout_s=DEBUGGER_STARTUP_TIMEOUT_S
+    )
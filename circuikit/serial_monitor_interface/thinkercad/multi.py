@@ -0,0 +1,289 @@
+from collections import deque
+import threading
+from ..types import SerialMonitorOptions
+from .cdp import CdpSession, function_expression
+from .chrome_process import open_chrome_process
+from .tab_pool import SimulationTabPool
+from .thinkercad import (
+    DRAIN_SERIAL_BUFFER_SCRIPT,
+    INSTALL_SERIAL_OBSERVER_SCRIPT,
+    MAX_BUFFERED_LINES,
+    cdp_speak_with_serial_monitor,
+    connect_driver,
+    install_serial_monitor_observer,
+    open_serial_monitor,
+    start_simulation,
+    stop_simulation,
+)
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class MultiThinkercad:
+    """
+    Runs several Thinkercad simulations as tabs of a single Chrome. Each tick drains the serial panels of
+    every tab together, one evaluation per tab pipelined over a single browser websocket, so N simulations
+    cost about one round trip instead of N. Every simulation is a device of its own, see
+    serial_monitor_options. Its devices must share an smi process, i.e. smi_processes=1.
+    """
+
+    __slots__ = (
+        "simulations",
+        "chrome_profile_path",
+        "debugger_port",
+        "open_simulation_timeout",
+        "headless",
+        "reuse_browser",
+        "lock",
+        "users",
+        "driver",
+        "browser",
+        "tabs",
+        "sessions",
+        "buffers",
+        "batch_number",
+    )
+
+    def __init__(
+        self,
+        simulations: dict[str, str] | list[str],
+        chrome_profile_path: str | None = None,
+        debugger_port: int = 8989,
+        open_simulation_timeout: int = 10,
+        headless: bool = False,
+        reuse_browser: bool = False,
+    ):
+        if not isinstance(simulations, dict):
+            # the same url may repeat, e.g. to run one circuit several times
+            simulations = {
+                f"simulation-{index}": url for index, url in enumerate(simulations)
+            }
+        if not simulations:
+            raise ValueError("simulations must hold at least one simulation")
+        self.simulations = dict(simulations)
+        self.chrome_profile_path = chrome_profile_path
+        self.debugger_port = debugger_port
+        self.open_simulation_timeout = open_simulation_timeout
+        self.headless = headless
+        self.reuse_browser = reuse_browser
+        self._reset()
+
+    def _reset(self) -> None:
+        self.lock = threading.Lock()
+        # started interfaces, the browser is opened by the first and closed by the last
+        self.users = 0
+        self.driver = None
+        self.browser: CdpSession | None = None
+        # simulation name -> window handle, and DevTools session of its tab
+        self.tabs: dict[str, str] = {}
+        self.sessions: dict[str, str] = {}
+        self.buffers = {
+            name: deque(maxlen=MAX_BUFFERED_LINES) for name in self.simulations
+        }
+        self.batch_number = 0
+
+    def __getstate__(self):
+        # crosses to the smi process as configuration, the browser is opened over there
+        return (
+            self.simulations,
+            self.chrome_profile_path,
+            self.debugger_port,
+            self.open_simulation_timeout,
+            self.headless,
+            self.reuse_browser,
+        )
+
+    def __setstate__(self, state) -> None:
+        (
+            self.simulations,
+            self.chrome_profile_path,
+            self.debugger_port,
+            self.open_simulation_timeout,
+            self.headless,
+            self.reuse_browser,
+        ) = state
+        self._reset()
+
+    def interfaces(self) -> dict[str, "ThinkercadTabInterface"]:
+        return {
+            name: ThinkercadTabInterface(multi=self, name=name)
+            for name in self.simulations
+        }
+
+    def serial_monitor_options(
+        self, sample_rate_ms: float = 25, **options
+    ) -> dict[str, SerialMonitorOptions]:
+        # ready to be passed to Circuikit, e.g. Circuikit(multi.serial_monitor_options(), services)
+        return {
+            name: SerialMonitorOptions(
+                interface=interface, sample_rate_ms=sample_rate_ms, **options
+            )
+            for name, interface in self.interfaces().items()
+        }
+
+    def acquire(self) -> None:
+        with self.lock:
+            self.users += 1
+            if self.users == 1:
+                self._open()
+
+    def release(self) -> None:
+        with self.lock:
+            self.users -= 1
+            if self.users == 0:
+                self._close()
+
+    def _open(self) -> None:
+        open_chrome_process(
+            profile_data_dir=self.chrome_profile_path,
+            debugger_port=self.debugger_port,
+            headless=self.headless,
+            reuse=self.reuse_browser,
+        )
+        self.driver = connect_driver(debugger_port=self.debugger_port)
+        urls = list(self.simulations.values())
+        tab_pools = {
+            url: SimulationTabPool(
+                driver=self.driver,
+                debugger_port=self.debugger_port,
+                thinkercad_url=url,
+                open_simulation_timeout=self.open_simulation_timeout,
+            )
+            for url in set(urls)
+        }
+        # every tab loads in the background at once, the driver then sets them up one by one
+        for url, tab_pool in tab_pools.items():
+            tab_pool.warm(count=urls.count(url))
+        for name, url in self.simulations.items():
+            handle = tab_pools[url].acquire()
+            if handle is None:
+                raise RuntimeError(
+                    f"Thinkercad simulation {name=} did not load in time"
+                )
+            open_serial_monitor(driver=self.driver)
+            start_simulation(driver=self.driver)
+            install_serial_monitor_observer(driver=self.driver)
+            self.tabs[name] = handle
+        self.browser = CdpSession.connect_browser(debugger_port=self.debugger_port)
+        self.sessions = {
+            name: self.browser.attach_page(target_id=handle)
+            for name, handle in self.tabs.items()
+        }
+
+    def _close(self) -> None:
+        if self.browser is not None:
+            self.browser.close()
+        if self.driver is not None:
+            if self.reuse_browser:
+                # tabs stay loaded for the next run, only their simulations stop
+                for name, handle in self.tabs.items():
+                    try:
+                        self.driver.switch_to.window(handle)
+                        stop_simulation(driver=self.driver)
+                        SimulationTabPool(
+                            driver=self.driver,
+                            debugger_port=self.debugger_port,
+                            thinkercad_url=self.simulations[name],
+                            open_simulation_timeout=self.open_simulation_timeout,
+                        ).release(handle=handle)
+                    except Exception as e:
+                        logger.warning(
+                            f"Failed to release simulation tab {name=}; e={e}"
+                        )
+            self.driver.quit()
+        lock = self.lock
+        self._reset()
+        # released by the caller
+        self.lock = lock
+
+    def _drain_all(self) -> None:
+        names = list(self.sessions)
+        drain_expression = function_expression(DRAIN_SERIAL_BUFFER_SCRIPT)
+        results = self.browser.evaluate_many(
+            [(self.sessions[name], drain_expression) for name in names]
+        )
+        for name, lines in zip(names, results):
+            if lines is None:
+                # observer is gone, e.g. page reloaded or panel re-rendered, it is back for the next tick
+                installed = self.browser.evaluate(
+                    function_expression(
+                        INSTALL_SERIAL_OBSERVER_SCRIPT, MAX_BUFFERED_LINES
+                    ),
+                    session_id=self.sessions[name],
+                )
+                if not installed:
+                    logger.warning(f"Cannot find thinkercad serial monitor of {name=}")
+                continue
+            self.buffers[name].extend(lines)
+        self.batch_number += 1
+
+    def drain(self, name: str, consumed_batch: int) -> tuple[str | None, int]:
+        # a tick is run by the first interface which already took its lines of the latest one,
+        # the others take theirs from it
+        with self.lock:
+            if self.browser is None:
+                return None, consumed_batch
+            if consumed_batch == self.batch_number:
+                self._drain_all()
+            buffer = self.buffers[name]
+            text = "\n".join(buffer)
+            buffer.clear()
+            return text, self.batch_number
+
+    def send_message(self, name: str, message: str) -> None:
+        session_id = self.sessions.get(name)
+        if self.browser is None or session_id is None:
+            logger.warning(
+                f"Tried to send message to thinkercad {name=} while not running"
+            )
+            return
+        cdp_speak_with_serial_monitor(
+            cdp=self.browser, message=message, session_id=session_id
+        )
+
+
+class ThinkercadTabInterface:
+    """One simulation of a MultiThinkercad, sampled like an incremental ThinkercadInterface"""
+
+    __slots__ = ("multi", "name", "consumed_batch")
+
+    def __init__(self, multi: MultiThinkercad, name: str):
+        self.multi = multi
+        self.name = name
+        # None until started, so stop() without start() doesn't release the browser
+        self.consumed_batch: int | None = None
+
+    def __destroy__(self):
+        self.stop()
+
+    @property
+    def delivers_deltas(self) -> bool:
+        # lines are drained from the page, never returned twice
+        return True
+
+    @property
+    def window_lines(self) -> int:
+        return MAX_BUFFERED_LINES
+
+    def start(self) -> None:
+        self.multi.acquire()
+        # the first sample runs a tick of its own
+        self.consumed_batch = self.multi.batch_number
+
+    def stop(self) -> None:
+        if self.consumed_batch is not None:
+            self.consumed_batch = None
+            self.multi.release()
+
+    def sample(self) -> str | None:
+        if self.consumed_batch is None:
+            logger.warning(f"Tried to sample thinkercad {self.name=} while not running")
+            return None
+        text, self.consumed_batch = self.multi.drain(
+            name=self.name, consumed_batch=self.consumed_batch
+        )
+        return text
+
+    def send_message(self, message: str) -> None:
+        self.multi.send_message(name=self.name, message=message)
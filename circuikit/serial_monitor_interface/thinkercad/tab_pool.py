@@ -0,0 +1,110 @@
+from urllib.parse import quote
+from selenium.common.exceptions import NoSuchWindowException
+from selenium.webdriver.remote.webdriver import WebDriver
+import requests
+from .waits import wait_for_element
+import logging
+
+logger = logging.getLogger(__name__)
+
+# present once the simulation page finished loading
+SIMULATION_LOADED_ELEMENT_ID = "CODE_EDITOR_ID"
+
+CLAIM_TAB_SCRIPT = """
+if (window.__circuikitClaimed) {
+    return false;
+}
+window.__circuikitClaimed = true;
+return true;
+"""
+
+RELEASE_TAB_SCRIPT = """
+window.__circuikitClaimed = false;
+"""
+
+BLANK_TAB_URLS = ("about:blank", "chrome://newtab/", "chrome://new-tab-page/")
+
+
+class SimulationTabPool:
+    """
+    Simulation tabs of one browser, kept loaded between runs so a start skips the cold page load. A tab is
+    claimed through a flag on its page, so interfaces of several processes can share a reused browser.
+    Holds no state of its own, the browser is the pool.
+    """
+
+    __slots__ = ("driver", "debugger_port", "thinkercad_url", "open_simulation_timeout")
+
+    def __init__(
+        self,
+        driver: WebDriver,
+        debugger_port: int,
+        thinkercad_url: str,
+        open_simulation_timeout: float,
+    ):
+        self.driver = driver
+        self.debugger_port = debugger_port
+        self.thinkercad_url = thinkercad_url
+        self.open_simulation_timeout = open_simulation_timeout
+
+    def _debugger_url(self, path: str) -> str:
+        return f"http://localhost:{self.debugger_port}{path}"
+
+    def simulation_tabs(self) -> list[str]:
+        # DevTools target ids, which are also the window handles of the driver
+        targets = requests.get(self._debugger_url("/json/list"), timeout=5).json()
+        return [
+            target["id"]
+            for target in targets
+            if target.get("type") == "page"
+            and target.get("url", "").startswith(self.thinkercad_url)
+        ]
+
+    def warm(self, count: int) -> None:
+        # opens tabs until count are loaded or loading, they load in the background and in parallel
+        missing = count - len(self.simulation_tabs())
+        for _ in range(missing):
+            # newer Chrome versions only accept PUT
+            requests.put(
+                self._debugger_url(f"/json/new?{quote(self.thinkercad_url, safe='')}"),
+                timeout=5,
+            )
+
+    def acquire(self) -> str | None:
+        # claims a loaded tab, or loads a new one, and switches the driver to it
+        for handle in self.simulation_tabs():
+            try:
+                self.driver.switch_to.window(handle)
+            except NoSuchWindowException:
+                continue
+            if not wait_for_element(
+                driver=self.driver,
+                element_id=SIMULATION_LOADED_ELEMENT_ID,
+                timeout_s=self.open_simulation_timeout,
+            ):
+                continue
+            if self.driver.execute_script(CLAIM_TAB_SCRIPT):
+                logger.info(f"Reusing loaded simulation tab {handle=}")
+                return handle
+        return self._open_tab()
+
+    def _open_tab(self) -> str | None:
+        if self.driver.current_url not in BLANK_TAB_URLS:
+            self.driver.switch_to.new_window("tab")
+        logger.info(f"Driver opens {self.thinkercad_url=}")
+        self.driver.get(self.thinkercad_url)
+        if not wait_for_element(
+            driver=self.driver,
+            element_id=SIMULATION_LOADED_ELEMENT_ID,
+            timeout_s=self.open_simulation_timeout,
+        ):
+            return None
+        self.driver.execute_script(CLAIM_TAB_SCRIPT)
+        return self.driver.current_window_handle
+
+    def release(self, handle: str) -> None:
+        # the tab stays loaded for whoever starts next
+        try:
+            self.driver.switch_to.window(handle)
+            self.driver.execute_script(RELEASE_TAB_SCRIPT)
+        except NoSuchWindowException:
+            pass
@@ -1,26 +1,133 @@
 from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.remote.webdriver import WebDriver
-from selenium.webdriver.support.wait import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.common.keys import Keys
 from selenium import webdriver
 from selenium.webdriver.common.by import By
 from .chrome_process import open_chrome_process
+from .cdp import CdpSession, function_expression
+from .tab_pool import SimulationTabPool
+from .waits import wait_for_code_panel_open
 import logging
 
 logger = logging.getLogger(__name__)
 
+# upper bound of lines kept in the page between two drains
+MAX_BUFFERED_LINES = 10_000
+
+# lines the serial panel keeps, older ones scroll out
+PANEL_WINDOW_LINES = 60
+
+# installs a MutationObserver which buffers serial monitor lines as they are appended,
+# the panel only keeps its last ~60 lines so new lines are found by matching the tail of
+# the previously seen lines against the head of the current ones
+INSTALL_SERIAL_OBSERVER_SCRIPT = """
+const maxBufferedLines = arguments[0];
+const current = window.__circuikitSerial;
+if (current && current.target.isConnected) {
+    return true;
+}
+const target = document.querySelector(".code_panel__serial__content__text");
+if (!target) {
+    return false;
+}
+if (current) {
+    current.observer.disconnect();
+}
+const state = { target: target, lines: [], seen: [], dropped: 0 };
+state.collect = () => {
+    const complete = target.textContent.split("\\n");
+    // last element is either empty or a line still being written
+    complete.pop();
+    const seen = state.seen;
+    let overlap = Math.min(seen.length, complete.length);
+    for (; overlap > 0; overlap--) {
+        let match = true;
+        for (let i = 0; i < overlap; i++) {
+            if (seen[seen.length - overlap + i] !== complete[i]) {
+                match = false;
+                break;
+            }
+        }
+        if (match) {
+            break;
+        }
+    }
+    for (let i = overlap; i < complete.length; i++) {
+        state.lines.push(complete[i]);
+    }
+    if (state.lines.length > maxBufferedLines) {
+        const excess = state.lines.length - maxBufferedLines;
+        state.dropped += excess;
+        state.lines.splice(0, excess);
+    }
+    state.seen = complete;
+};
+state.observer = new MutationObserver(state.collect);
+state.observer.observe(target, { childList: true, characterData: true, subtree: true });
+state.collect();
+window.__circuikitSerial = state;
+return true;
+"""
+
+DRAIN_SERIAL_BUFFER_SCRIPT = """
+const state = window.__circuikitSerial;
+if (!state || !state.target.isConnected) {
+    return null;
+}
+// pick up mutations whose observer callback did not run yet
+state.collect();
+const lines = state.lines;
+state.lines = [];
+return lines;
+"""
+
+
+# reads the whole panel, the element is looked up once and kept on the page
+READ_SERIAL_PANEL_EXPRESSION = """
+(() => {
+    let target = window.__circuikitSerialContent;
+    if (!target || !target.isConnected) {
+        target = window.__circuikitSerialContent = document.querySelector(".code_panel__serial__content__text");
+    }
+    return target ? target.innerHTML : null;
+})()
+"""
+
+FOCUS_SERIAL_INPUT_EXPRESSION = """
+(() => {
+    let input = window.__circuikitSerialInput;
+    if (!input || !input.isConnected) {
+        input = window.__circuikitSerialInput = document.querySelector(".code_panel__serial__input");
+    }
+    if (!input) {
+        return false;
+    }
+    input.focus();
+    return true;
+})()
+"""
+
+ENTER_KEY_EVENT = {
+    "key": "Enter",
+    "code": "Enter",
+    "windowsVirtualKeyCode": 13,
+    "nativeVirtualKeyCode": 13,
+}
 
-def open_simulation(
-    thinkercad_url: str,
-    debugger_port: int,
-    open_simulation_timeout: int,
-    chrome_profile_path: str | None,
-) -> WebDriver:
-    open_chrome_process(
-        profile_data_dir=chrome_profile_path, debugger_port=debugger_port
-    )
 
+# the buttons toggle, a reused tab remembers what was already clicked
+IS_SERIAL_MONITOR_OPEN_SCRIPT = """
+return document.querySelector(".code_panel__serial__content__text") !== null;
+"""
+
+MARK_SIMULATION_SCRIPT = """
+const wasRunning = Boolean(window.__circuikitSimulationRunning);
+window.__circuikitSimulationRunning = arguments[0];
+return wasRunning;
+"""
+
+
+def connect_driver(debugger_port: int) -> WebDriver:
     # Specify the debugging address for the already opened Chrome browser
     debugger_address = f"localhost:{debugger_port}"
 
@@ -29,21 +136,40 @@ def open_simulation(
     chrome_options.add_experimental_option("debuggerAddress", debugger_address)
 
     # Initialize the WebDriver with the existing Chrome instance
-    driver = webdriver.Chrome(options=chrome_options)
-    # Now, you can interact with the already opened Chrome browser
-    logger.info(f"Driver opens {thinkercad_url=}")
-    driver.get(thinkercad_url)
-    try:
-        WebDriverWait(driver=driver, timeout=open_simulation_timeout).until(
-            EC.presence_of_element_located((By.ID, "CODE_EDITOR_ID"))
-        )
-    except:
+    return webdriver.Chrome(options=chrome_options)
+
+
+def open_simulation(
+    thinkercad_url: str,
+    debugger_port: int,
+    open_simulation_timeout: int,
+    chrome_profile_path: str | None,
+    headless: bool = False,
+    reuse_browser: bool = False,
+    warm_tabs: int = 0,
+) -> tuple[WebDriver, SimulationTabPool]:
+    open_chrome_process(
+        profile_data_dir=chrome_profile_path,
+        debugger_port=debugger_port,
+        headless=headless,
+        reuse=reuse_browser,
+    )
+    driver = connect_driver(debugger_port=debugger_port)
+    tab_pool = SimulationTabPool(
+        driver=driver,
+        debugger_port=debugger_port,
+        thinkercad_url=thinkercad_url,
+        open_simulation_timeout=open_simulation_timeout,
+    )
+    # warm tabs load meanwhile the driver claims one
+    tab_pool.warm(count=warm_tabs)
+    if tab_pool.acquire() is None:
         logger.error(
             "Failed to get loaded thinkercad page indicator in specified timeout"
         )
         driver.quit()
         exit(1)
-    return driver
+    return driver, tab_pool
 
 
 def is_code_panel_open(driver: WebDriver) -> bool:
@@ -52,27 +178,39 @@ def is_code_panel_open(driver: WebDriver) -> bool:
     return code_panel_right_position == "0px"
 
 
-def open_code_editor(driver: WebDriver) -> None:
-    is_open = is_code_panel_open(driver=driver)
-    if not is_open:
-        open_code_editor_button = driver.find_element(by=By.ID, value="CODE_EDITOR_ID")
-        open_code_editor_button.click()
-    while not is_open:
-        driver.implicitly_wait(0.1)
-        is_open = is_code_panel_open(driver=driver)
+def open_code_editor(driver: WebDriver, timeout_s: float = 10) -> None:
+    if is_code_panel_open(driver=driver):
+        return
+    open_code_editor_button = driver.find_element(by=By.ID, value="CODE_EDITOR_ID")
+    open_code_editor_button.click()
+    # resolves on the panel's slide-in transition instead of polling its position
+    if not wait_for_code_panel_open(driver=driver, timeout_s=timeout_s):
+        logger.error("Thinkercad code panel did not open in time")
 
 
 def open_serial_monitor(driver: WebDriver) -> None:
     open_code_editor(driver=driver)
+    if driver.execute_script(IS_SERIAL_MONITOR_OPEN_SCRIPT):
+        return
     open_serial_monitor_button = driver.find_element(
         by=By.ID, value="SERIAL_MONITOR_ID"
     )
     open_serial_monitor_button.click()
 
 
+def _toggle_simulation(driver: WebDriver, running: bool) -> None:
+    was_running = driver.execute_script(MARK_SIMULATION_SCRIPT, running)
+    if was_running != running:
+        start_simulation_button = driver.find_element(by=By.ID, value="SIMULATION_ID")
+        start_simulation_button.click()
+
+
 def start_simulation(driver: WebDriver) -> None:
-    start_simulation_button = driver.find_element(by=By.ID, value="SIMULATION_ID")
-    start_simulation_button.click()
+    _toggle_simulation(driver=driver, running=True)
+
+
+def stop_simulation(driver: WebDriver) -> None:
+    _toggle_simulation(driver=driver, running=False)
 
 
 def sample_serial_monitor(
@@ -93,6 +231,69 @@ def sample_serial_monitor(
     return text
 
 
+def install_serial_monitor_observer(driver: WebDriver) -> bool:
+    return bool(
+        driver.execute_script(INSTALL_SERIAL_OBSERVER_SCRIPT, MAX_BUFFERED_LINES)
+    )
+
+
+def drain_serial_monitor(driver: WebDriver) -> str | None:
+    # a single round trip which moves only the lines appended since the previous drain
+    lines = driver.execute_script(DRAIN_SERIAL_BUFFER_SCRIPT)
+    if lines is None:
+        # observer is gone, e.g. page reloaded or panel re-rendered
+        if not install_serial_monitor_observer(driver=driver):
+            logger.warning("Cannot find thinkercad serial monitor content")
+            return None
+        lines = driver.execute_script(DRAIN_SERIAL_BUFFER_SCRIPT)
+        if lines is None:
+            return None
+    return "\n".join(lines)
+
+
+def cdp_sample_serial_monitor(cdp: CdpSession) -> str | None:
+    text = cdp.evaluate(READ_SERIAL_PANEL_EXPRESSION)
+    if text is None:
+        logger.warning("Cannot find thinkercad serial monitor content")
+    return text
+
+
+def cdp_drain_serial_monitor(cdp: CdpSession) -> str | None:
+    lines = cdp.evaluate(function_expression(DRAIN_SERIAL_BUFFER_SCRIPT))
+    if lines is None:
+        # observer is gone, e.g. page reloaded or panel re-rendered
+        installed = cdp.evaluate(
+            function_expression(INSTALL_SERIAL_OBSERVER_SCRIPT, MAX_BUFFERED_LINES)
+        )
+        if not installed:
+            logger.warning("Cannot find thinkercad serial monitor content")
+            return None
+        lines = cdp.evaluate(function_expression(DRAIN_SERIAL_BUFFER_SCRIPT))
+        if lines is None:
+            return None
+    return "\n".join(lines)
+
+
+def cdp_speak_with_serial_monitor(
+    cdp: CdpSession, message: str, session_id: str | None = None
+) -> None:
+    if not cdp.evaluate(FOCUS_SERIAL_INPUT_EXPRESSION, session_id=session_id):
+        logger.error("Cannot find thinkercad serial monitor input")
+        return
+    # typing is pipelined, nothing waits for these responses
+    cdp.send("Input.insertText", {"text": message}, session_id=session_id)
+    cdp.send(
+        "Input.dispatchKeyEvent",
+        {"type": "keyDown", "text": "\r", **ENTER_KEY_EVENT},
+        session_id=session_id,
+    )
+    cdp.send(
+        "Input.dispatchKeyEvent",
+        {"type": "keyUp", **ENTER_KEY_EVENT},
+        session_id=session_id,
+    )
+
+
 def speak_with_serial_monitor(driver: WebDriver, message: str) -> None:
     serial_input = driver.find_element(
         by=By.CLASS_NAME, value="code_panel__serial__input"
@@ -110,7 +311,15 @@ class ThinkercadInterface:
         "thinkercad_url",
         "chrome_profile_path",
         "open_simulation_timeout",
+        "incremental",
+        "use_cdp",
+        "headless",
+        "reuse_browser",
+        "warm_tabs",
         "driver",
+        "cdp",
+        "tab_pool",
+        "tab_handle",
     )
 
     def __init__(
@@ -119,25 +328,64 @@ class ThinkercadInterface:
         chrome_profile_path: str | None = None,
         debugger_port: int = 8989,
         open_simulation_timeout: int = 10,
+        incremental: bool = False,
+        use_cdp: bool = False,
+        headless: bool = False,
+        reuse_browser: bool = False,
+        warm_tabs: int = 0,
     ):
         self.thinkercad_url = thinkercad_url
         self.debugger_port = debugger_port
         self.chrome_profile_path = chrome_profile_path
         self.open_simulation_timeout = open_simulation_timeout
+        # incremental mode drains lines buffered in the page instead of reading the whole panel
+        self.incremental = incremental
+        # once the simulation runs, reads and writes go over a single DevTools websocket instead of WebDriver
+        self.use_cdp = use_cdp
+        self.headless = headless
+        # attach to a Chrome already listening on debugger_port, its simulation tabs stay loaded after stop
+        self.reuse_browser = reuse_browser
+        # simulation tabs kept loaded in the browser, including the one in use
+        self.warm_tabs = warm_tabs
+        self.driver = None
+        self.cdp: CdpSession | None = None
+        self.tab_pool: SimulationTabPool | None = None
+        self.tab_handle: str | None = None
 
     def __destroy__(self):
         self.stop()
 
+    @property
+    def delivers_deltas(self) -> bool:
+        # incremental sampling never returns the same line twice
+        return self.incremental
+
+    @property
+    def window_lines(self) -> int:
+        # lines a poll can reach back, see SamplingScheduler
+        return MAX_BUFFERED_LINES if self.incremental else PANEL_WINDOW_LINES
+
     def _init_simulation(self) -> None:
-        self.driver = open_simulation(
+        self.driver, self.tab_pool = open_simulation(
             thinkercad_url=self.thinkercad_url,
             debugger_port=self.debugger_port,
             chrome_profile_path=self.chrome_profile_path,
             open_simulation_timeout=self.open_simulation_timeout,
+            headless=self.headless,
+            reuse_browser=self.reuse_browser,
+            warm_tabs=self.warm_tabs,
         )
+        self.tab_handle = self.driver.current_window_handle
         open_serial_monitor(driver=self.driver)
         start_simulation(driver=self.driver)
         self.driver.implicitly_wait(1)
+        if self.incremental:
+            install_serial_monitor_observer(driver=self.driver)
+        if self.use_cdp:
+            # chromedriver window handles are the DevTools target ids
+            self.cdp = CdpSession.connect(
+                debugger_port=self.debugger_port, target_id=self.tab_handle
+            )
 
     def send_message(self, message: str) -> None:
         if self.driver is None:
@@ -145,6 +393,9 @@ class ThinkercadInterface:
                 "Tried to send message to thinkercad smi while driver is not runnint"
             )
             return
+        if self.cdp is not None:
+            cdp_speak_with_serial_monitor(cdp=self.cdp, message=message)
+            return
         speak_with_serial_monitor(driver=self.driver, message=message)
 
     def sample(self) -> str | None:
@@ -153,12 +404,30 @@ class ThinkercadInterface:
                 "Tried to send message to thinkercad smi while driver is not runnint"
             )
             return
+        if self.cdp is not None:
+            if self.incremental:
+                return cdp_drain_serial_monitor(cdp=self.cdp)
+            return cdp_sample_serial_monitor(cdp=self.cdp)
+        if self.incremental:
+            return drain_serial_monitor(driver=self.driver)
         return sample_serial_monitor(driver=self.driver)
 
     def start(self) -> None:
         self._init_simulation()
 
     def stop(self) -> None:
+        if self.cdp is not None:
+            self.cdp.close()
+            self.cdp = None
         if self.driver is not None:
+            if self.reuse_browser and self.tab_handle is not None:
+                try:
+                    self.driver.switch_to.window(self.tab_handle)
+                    stop_simulation(driver=self.driver)
+                    self.tab_pool.release(handle=self.tab_handle)
+                except Exception as e:
+                    logger.warning(f"Failed to release simulation tab; e={e}")
             self.driver.quit()
             self.driver = None
+            self.tab_pool = None
+            self.tab_handle = None
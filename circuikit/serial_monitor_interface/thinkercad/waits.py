@@ -0,0 +1,73 @@
+from selenium.common.exceptions import TimeoutException
+from selenium.webdriver.remote.webdriver import WebDriver
+import logging
+
+logger = logging.getLogger(__name__)
+
+# async scripts which resolve as soon as the page changes into the awaited state, the page notifies
+# through a MutationObserver and transitionend events instead of being polled
+WAIT_UNTIL_PRELUDE = """
+const done = arguments[arguments.length - 1];
+const timeoutMs = arguments[0];
+function waitUntil(check) {
+    if (check()) {
+        done(true);
+        return;
+    }
+    let finished = false;
+    const finish = (result) => {
+        if (finished) {
+            return;
+        }
+        finished = true;
+        observer.disconnect();
+        document.removeEventListener("transitionend", onChange, true);
+        clearTimeout(timer);
+        done(result);
+    };
+    const onChange = () => {
+        if (check()) {
+            finish(true);
+        }
+    };
+    const observer = new MutationObserver(onChange);
+    observer.observe(document.documentElement, { childList: true, subtree: true, attributes: true });
+    document.addEventListener("transitionend", onChange, true);
+    const timer = setTimeout(() => finish(false), timeoutMs);
+}
+"""
+
+WAIT_FOR_ELEMENT_SCRIPT = (
+    WAIT_UNTIL_PRELUDE
+    + """
+const elementId = arguments[1];
+waitUntil(() => document.getElementById(elementId) !== null);
+"""
+)
+
+WAIT_FOR_CODE_PANEL_OPEN_SCRIPT = (
+    WAIT_UNTIL_PRELUDE
+    + """
+waitUntil(() => {
+    const panel = document.querySelector(".code_panel");
+    return panel !== null && getComputedStyle(panel).right === "0px";
+});
+"""
+)
+
+
+def wait_in_page(driver: WebDriver, script: str, timeout_s: float, *args) -> bool:
+    # the page itself enforces the timeout, the script timeout is a safety net
+    driver.set_script_timeout(timeout_s + 5)
+    try:
+        return bool(driver.execute_async_script(script, int(timeout_s * 1000), *args))
+    except TimeoutException:
+        return False
+
+
+def wait_for_element(driver: WebDriver, element_id: str, timeout_s: float) -> bool:
+    return wait_in_page(driver, WAIT_FOR_ELEMENT_SCRIPT, timeout_s, element_id)
+
+
+def wait_for_code_panel_open(driver: WebDriver, timeout_s: float) -> bool:
+    return wait_in_page(driver, WAIT_FOR_CODE_PANEL_OPEN_SCRIPT, timeout_s)
@@ -1,5 +1,50 @@
-from dataclasses import dataclass
-from .protocols import ConcreteSerialMonitorInterface
+from dataclasses import dataclass, field
+from .protocols import (
+    ConcreteSerialMonitorInterface,
+    SampleDecoder,
+    SampleDeduplicator,
+)
+from .decoders import JsonDecoder
+
+
+@dataclass(frozen=True, slots=True)
+class RingBufferOptions:
+    # number of records the ring can hold
+    slots: int = 4096
+    # bytes per record slot, including a 16 bytes header
+    slot_size: int = 512
+    # "drop_oldest" overwrites unread records once full, "block" waits for the reader
+    overflow_policy: str = "drop_oldest"
+
+    def __post_init__(self):
+        if self.slots < 2:
+            raise ValueError("slots must be >= 2")
+        if self.slot_size < 64 or self.slot_size % 8 != 0:
+            raise ValueError("slot_size must be >= 64 and a multiple of 8")
+        if self.overflow_policy not in ("drop_oldest", "block"):
+            raise ValueError('overflow_policy must be either "drop_oldest" or "block"')
+
+
+@dataclass(frozen=True, slots=True)
+class AdaptiveSamplingOptions:
+    # fastest poll, reached when the interface's window would otherwise overflow
+    min_interval_ms: float = 25
+    # slowest poll, reached after enough idle polls
+    max_interval_ms: float = 1000
+    # interval growth per idle poll
+    backoff: float = 2.0
+    # share of the interface's window which may fill up between two polls
+    fill_target: float = 0.5
+
+    def __post_init__(self):
+        if self.min_interval_ms < 1:
+            raise ValueError("min_interval_ms must be >= 1")
+        if self.max_interval_ms < self.min_interval_ms:
+            raise ValueError("max_interval_ms must be >= min_interval_ms")
+        if self.backoff < 1:
+            raise ValueError("backoff must be >= 1")
+        if not 0 < self.fill_target <= 1:
+            raise ValueError("fill_target must be in (0, 1]")
 
 
 @dataclass(frozen=True, slots=True)
@@ -9,7 +54,24 @@ class SerialMonitorOptions:
     sample_rate_ms: float
     # has defaults
     timestamp_field_name: str = "time"
+    # samples are sent to the app as batches, a batch is sent once it reaches batch_max_size
+    # or once its oldest sample waited batch_linger_ms
+    batch_max_size: int = 256
+    batch_linger_ms: float = 0
+    # when set, samples are delivered to the app through shared memory instead of a multiprocessing.Queue
+    ring_buffer: RingBufferOptions | None = None
+    # turns serial monitor lines into samples, see decoders module
+    decoder: SampleDecoder = field(default_factory=JsonDecoder)
+    # decides which samples of a poll are new, for interfaces which return overlapping output, see dedup module
+    # defaults to TimestampDedup on timestamp_field_name
+    dedup: SampleDeduplicator | None = None
+    # when set, the poll interval follows the data instead of staying at sample_rate_ms, see scheduler module
+    adaptive_sampling: AdaptiveSamplingOptions | None = None
 
     def __post_init__(self):
         if self.sample_rate_ms < 25:
             raise ValueError("sample_rate_ms must be >= 25")
+        if self.batch_max_size < 1:
+            raise ValueError("batch_max_size must be >= 1")
+        if self.batch_linger_ms < 0:
+            raise ValueError("batch_linger_ms must be >= 0")
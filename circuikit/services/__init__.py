@@ -1,4 +1,10 @@
 from .service_adapter import ServiceAdapter
 from .service import Service
+from .types import ServiceOptions
+from .routing import Route
+from .batch_service import BatchService
+from .columnar import ColumnarBatch
 from .thingsboard_gateway import ThingsBoardGateway
 from .file_logger import FileLogger
+from .columnar_file_logger import ColumnarFileLogger
+from .aggregation import AggregationService, Window, LTTB, Deadband
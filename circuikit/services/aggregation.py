@@ -0,0 +1,446 @@
+from collections import deque
+from copy import deepcopy
+from typing import Any, Protocol
+import time
+import logging
+from .service import Service
+from .samples import sample_items
+from .types import ServiceOptions
+
+logger = logging.getLogger(__name__)
+
+WINDOW_STATS = ("min", "max", "mean", "last", "count")
+
+
+class AggregationStage(Protocol):
+    def push(self, sample: Any) -> list:
+        # samples to pass on, usually none or one
+        pass
+
+    # optional, def flush(self) -> list: samples still held, called once when the service stops
+
+
+def _is_number(value) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _field_value(sample, field_name: str):
+    if isinstance(sample, dict):
+        return sample.get(field_name)
+    return getattr(sample, field_name, None)
+
+
+def _sample_time_ms(sample, timestamp_field_name: str | None, clock) -> float:
+    # the sample's own timestamp, or the arrival time when there is none
+    if timestamp_field_name is None:
+        return clock() * 1000
+    return _field_value(sample, timestamp_field_name)
+
+
+class _Pane:
+    # summary of one step of a window, [min, max, sum, count, last] per field
+    __slots__ = ("count", "fields")
+
+    def __init__(self):
+        self.count = 0
+        self.fields: dict[str, list] = {}
+
+
+class Window:
+    """
+    Emits one summary sample per window, of the numeric fields of the samples it saw. Tumbling by default,
+    sliding when step_ms is smaller than window_ms. Windows follow the sample timestamps and close once a
+    sample of a later window arrives, or the service stops. A sliding window is kept as window_ms / step_ms panes, each sample
+    updates the current one only, so memory doesn't grow with the sample rate.
+    """
+
+    __slots__ = (
+        "window_ms",
+        "step_ms",
+        "fields",
+        "stats",
+        "timestamp_field_name",
+        "panes",
+        "pane_index",
+    )
+
+    def __init__(
+        self,
+        window_ms: float,
+        step_ms: float | None = None,
+        fields: list[str] | None = None,
+        stats: tuple[str, ...] = WINDOW_STATS,
+        timestamp_field_name: str | None = None,
+    ):
+        step_ms = window_ms if step_ms is None else step_ms
+        if window_ms <= 0 or step_ms <= 0:
+            raise ValueError("window_ms and step_ms must be > 0")
+        pane_count = window_ms / step_ms
+        if pane_count != int(pane_count):
+            raise ValueError("window_ms must be a multiple of step_ms")
+        unknown = set(stats) - set(WINDOW_STATS)
+        if unknown:
+            raise ValueError(
+                f"unknown stats {sorted(unknown)}, expected {WINDOW_STATS}"
+            )
+        self.window_ms = window_ms
+        self.step_ms = step_ms
+        # None aggregates every numeric field
+        self.fields = None if fields is None else tuple(fields)
+        self.stats = tuple(stats)
+        # None uses arrival time, epoch ms
+        self.timestamp_field_name = timestamp_field_name
+        self.panes: deque[_Pane] = deque(maxlen=int(pane_count))
+        self.pane_index: int | None = None
+
+    def _reset(self, pane_index: int) -> None:
+        self.panes.extend(_Pane() for _ in range(self.panes.maxlen))
+        self.pane_index = pane_index
+
+    def _values(self, sample):
+        if self.fields is None:
+            timestamp_field_name = self.timestamp_field_name
+            return (
+                (name, value)
+                for name, value in sample_items(sample)
+                if name != timestamp_field_name and _is_number(value)
+            )
+        return (
+            (name, value)
+            for name in self.fields
+            if _is_number(value := _field_value(sample, name))
+        )
+
+    def _summary(self, end_ms: float) -> dict | None:
+        # combines the panes, O(panes) once per step rather than per sample
+        count = 0
+        fields: dict[str, list] = {}
+        for pane in self.panes:
+            count += pane.count
+            for name, (low, high, total, n, last) in pane.fields.items():
+                acc = fields.get(name)
+                if acc is None:
+                    fields[name] = [low, high, total, n, last]
+                    continue
+                if low < acc[0]:
+                    acc[0] = low
+                if high > acc[1]:
+                    acc[1] = high
+                acc[2] += total
+                acc[3] += n
+                acc[4] = last
+        if count == 0:
+            return None
+        summary = {self.timestamp_field_name or "time": end_ms}
+        stats = self.stats
+        if "count" in stats:
+            summary["count"] = count
+        for name, (low, high, total, n, last) in fields.items():
+            if "min" in stats:
+                summary[f"{name}_min"] = low
+            if "max" in stats:
+                summary[f"{name}_max"] = high
+            if "mean" in stats:
+                summary[f"{name}_mean"] = total / n
+            if "last" in stats:
+                summary[f"{name}_last"] = last
+        return summary
+
+    def push(self, sample) -> list:
+        timestamp = _sample_time_ms(sample, self.timestamp_field_name, time.time)
+        if timestamp is None:
+            return []
+        pane_index = int(timestamp // self.step_ms)
+        emitted = []
+        if self.pane_index is None:
+            self._reset(pane_index)
+        elif pane_index < self.pane_index:
+            # the device clock went back (e.g. a reset), the open window is closed early
+            summary = self._summary(end_ms=(self.pane_index + 1) * self.step_ms)
+            if summary is not None:
+                emitted.append(summary)
+            self._reset(pane_index)
+        elif pane_index > self.pane_index:
+            # past this many steps every pane is empty, nothing left to emit
+            for _ in range(min(pane_index - self.pane_index, self.panes.maxlen)):
+                self.pane_index += 1
+                summary = self._summary(end_ms=self.pane_index * self.step_ms)
+                if summary is not None:
+                    emitted.append(summary)
+                self.panes.append(_Pane())
+            self.pane_index = pane_index
+
+        pane = self.panes[-1]
+        pane.count += 1
+        pane_fields = pane.fields
+        for name, value in self._values(sample):
+            acc = pane_fields.get(name)
+            if acc is None:
+                pane_fields[name] = [value, value, value, 1, value]
+                continue
+            if value < acc[0]:
+                acc[0] = value
+            if value > acc[1]:
+                acc[1] = value
+            acc[2] += value
+            acc[3] += 1
+            acc[4] = value
+        return emitted
+
+    def flush(self) -> list:
+        # the open window, closed early since no later sample will arrive
+        if self.pane_index is None:
+            return []
+        summary = self._summary(end_ms=(self.pane_index + 1) * self.step_ms)
+        self.pane_index = None
+        self.panes.clear()
+        return [] if summary is None else [summary]
+
+
+class LTTB:
+    """
+    Streaming Largest-Triangle-Three-Buckets, passes on one sample of every bucket_size, the one which keeps
+    the shape of `field` over time best. A bucket is decided once the following one is complete, so at most
+    two buckets are held and samples pass with a delay of up to two buckets.
+    """
+
+    __slots__ = (
+        "field",
+        "bucket_size",
+        "timestamp_field_name",
+        "selected",
+        "bucket",
+        "next_bucket",
+        "next_sum_x",
+        "next_sum_y",
+    )
+
+    def __init__(
+        self,
+        field: str,
+        bucket_size: int,
+        timestamp_field_name: str | None = None,
+    ):
+        if bucket_size < 1:
+            raise ValueError("bucket_size must be >= 1")
+        self.field = field
+        self.bucket_size = bucket_size
+        # None uses arrival time
+        self.timestamp_field_name = timestamp_field_name
+        # (x, y) of the last sample passed on
+        self.selected: tuple[float, float] | None = None
+        self.bucket: list[tuple[float, float, Any]] = []
+        self.next_bucket: list[tuple[float, float, Any]] = []
+        self.next_sum_x = 0.0
+        self.next_sum_y = 0.0
+
+    def _restart(self) -> None:
+        self.selected = None
+        self.bucket = []
+        self.next_bucket = []
+        self.next_sum_x = 0.0
+        self.next_sum_y = 0.0
+
+    def push(self, sample) -> list:
+        y = _field_value(sample, self.field)
+        if not _is_number(y):
+            return []
+        x = _sample_time_ms(sample, self.timestamp_field_name, time.monotonic)
+        if self.selected is not None:
+            last_x = (self.next_bucket or self.bucket or [self.selected])[-1][0]
+            if x < last_x:
+                # the device clock went back (e.g. a reset), start over
+                self._restart()
+        if self.selected is None:
+            # the first sample always passes, it anchors the first triangle
+            self.selected = (x, y)
+            return [sample]
+        if len(self.bucket) < self.bucket_size:
+            self.bucket.append((x, y, sample))
+            return []
+        self.next_bucket.append((x, y, sample))
+        self.next_sum_x += x
+        self.next_sum_y += y
+        if len(self.next_bucket) < self.bucket_size:
+            return []
+
+        # the average of the next bucket is the third vertex
+        ax, ay = self.selected
+        cx = self.next_sum_x / self.bucket_size
+        cy = self.next_sum_y / self.bucket_size
+        best = None
+        best_area = -1.0
+        for bx, by, candidate in self.bucket:
+            area = abs((ax - cx) * (by - ay) - (ax - bx) * (cy - ay))
+            if area > best_area:
+                best_area = area
+                best = (bx, by, candidate)
+        self.selected = (best[0], best[1])
+        self.bucket = self.next_bucket
+        self.next_bucket = []
+        self.next_sum_x = 0.0
+        self.next_sum_y = 0.0
+        return [best[2]]
+
+    def flush(self) -> list:
+        # like the first sample, the last one always passes, the held buckets are not decided anymore
+        held = self.next_bucket or self.bucket
+        self._restart()
+        return [held[-1][2]] if held else []
+
+
+class Deadband:
+    """
+    Passes on a sample only once a field moved by more than its threshold since the last sample passed on,
+    or, with max_interval_ms, when nothing was passed on for that long (a heartbeat).
+    """
+
+    __slots__ = (
+        "fields",
+        "threshold",
+        "max_interval_ms",
+        "timestamp_field_name",
+        "last_values",
+        "last_sent_at",
+    )
+
+    def __init__(
+        self,
+        fields: list[str] | None = None,
+        threshold: float | dict[str, float] = 0,
+        max_interval_ms: float | None = None,
+        timestamp_field_name: str | None = None,
+    ):
+        # None watches every field but the timestamp
+        self.fields = None if fields is None else tuple(fields)
+        # a single threshold for every field, or per field, missing fields use 0, i.e. any change
+        self.threshold = threshold
+        self.max_interval_ms = max_interval_ms
+        # None uses arrival time
+        self.timestamp_field_name = timestamp_field_name
+        self.last_values: dict[str, Any] | None = None
+        self.last_sent_at = 0.0
+
+    def _values(self, sample) -> dict[str, Any]:
+        if self.fields is None:
+            timestamp_field_name = self.timestamp_field_name
+            return {
+                name: value
+                for name, value in sample_items(sample)
+                if name != timestamp_field_name
+            }
+        return {name: _field_value(sample, name) for name in self.fields}
+
+    def _moved(self, values: dict[str, Any]) -> bool:
+        last_values = self.last_values
+        threshold = self.threshold
+        for name, value in values.items():
+            last = last_values.get(name)
+            if _is_number(value) and _is_number(last):
+                limit = (
+                    threshold.get(name, 0) if isinstance(threshold, dict) else threshold
+                )
+                if abs(value - last) > limit:
+                    return True
+            elif value != last:
+                return True
+        return False
+
+    def push(self, sample) -> list:
+        values = self._values(sample)
+        now = _sample_time_ms(sample, self.timestamp_field_name, time.monotonic)
+        if (
+            self.last_values is None
+            or self._moved(values)
+            or (
+                self.max_interval_ms is not None
+                and now - self.last_sent_at >= self.max_interval_ms
+            )
+        ):
+            self.last_values = values
+            self.last_sent_at = now
+            return [sample]
+        return []
+
+
+class AggregationService(Service):
+    """
+    Sits in front of another service, runs every sample through the stages in order and hands whatever
+    comes out of the last one to downstream. Runs inline by default, stages are O(1) per sample, so only
+    the reduced stream is queued by downstream. Stopping it flushes what the stages still hold, e.g. the
+    open window, then stops downstream.
+    """
+
+    def __init__(
+        self,
+        downstream: Service,
+        stages: list[AggregationStage],
+        group_by: str | None = None,
+        service_options: ServiceOptions | None = None,
+    ):
+        super().__init__(
+            options=(
+                ServiceOptions(execution_mode="inline")
+                if service_options is None
+                else service_options
+            )
+        )
+        self.downstream = downstream
+        self.stages = stages
+        # e.g. "device", every value gets its own copy of the stages
+        self.group_by = group_by
+        self.group_stages: dict[Any, list[AggregationStage]] = {}
+
+    def queue_stats(self) -> dict:
+        # the queue that matters is downstream's
+        return self.downstream.queue_stats()
+
+    def __destroy__(self):
+        # stages are flushed after the last queued message went through them
+        self.drain()
+        super().__destroy__()
+        if self.group_by is None:
+            self._hand_down(self._flush(self.stages), group=None)
+        else:
+            for group, stages in self.group_stages.items():
+                self._hand_down(self._flush(stages), group=group)
+        self.downstream.drain()
+        self.downstream.__destroy__()
+
+    def on_message(self, message: dict) -> None:
+        group_by = self.group_by
+        group = None
+        if group_by is None:
+            stages = self.stages
+        else:
+            group = _field_value(message, group_by)
+            stages = self.group_stages.get(group)
+            if stages is None:
+                stages = self.group_stages[group] = deepcopy(self.stages)
+        samples = [message]
+        for stage in stages:
+            samples = [passed for sample in samples for passed in stage.push(sample)]
+            if not samples:
+                return
+        self._hand_down(samples, group=group)
+
+    def _flush(self, stages: list[AggregationStage]) -> list:
+        # what a stage flushes still runs through the stages after it
+        samples = []
+        for stage in stages:
+            samples = [passed for sample in samples for passed in stage.push(sample)]
+            flush = getattr(stage, "flush", None)
+            if flush is not None:
+                try:
+                    samples.extend(flush())
+                except Exception as e:
+                    logger.error(f"{type(stage).__name__} failed to flush; e={e}")
+        return samples
+
+    def _hand_down(self, samples: list, group) -> None:
+        group_by = self.group_by
+        for sample in samples:
+            if group_by is not None and isinstance(sample, dict):
+                # window summaries are new samples, they keep the group they belong to
+                sample.setdefault(group_by, group)
+            self.downstream.on_new_read(new_read=sample)
@@ -0,0 +1,15 @@
+from abc import abstractmethod
+from .service import Service
+from .columnar import ColumnarBatch
+
+
+class BatchService(Service):
+    """Receives samples as columnar batches instead of one message per sample"""
+
+    @abstractmethod
+    def on_batch(self, batch: ColumnarBatch) -> None:
+        # Do your vectorized thing, arrays are shared with other services and read-only
+        pass
+
+    def on_message(self, message: ColumnarBatch) -> None:
+        self.on_batch(batch=message)
@@ -0,0 +1,143 @@
+from dataclasses import dataclass
+from typing import Any
+import time
+from .samples import sample_items
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+@dataclass(frozen=True, slots=True)
+class ColumnarBatch:
+    # read-only arrays, shared by every batch service
+    timestamps: "np.ndarray"
+    columns: dict[str, "np.ndarray"]
+
+    def __len__(self) -> int:
+        return len(self.timestamps)
+
+
+def _to_array(values: list) -> "np.ndarray":
+    array = np.asarray(values)
+    if array.dtype == object:
+        # missing values in a numeric column become NaN
+        try:
+            array = np.asarray(values, dtype=np.float64)
+        except (TypeError, ValueError):
+            pass
+    array.flags.writeable = False
+    return array
+
+
+class ColumnarBatchBuilder:
+    """
+    Accumulates samples into per-field columns and closes a batch by count or by time. Given the structured
+    dtype of typed records (see RecordDecoder), records are written as rows of a single array instead and
+    the columns of a batch are views of it.
+    """
+
+    __slots__ = (
+        "timestamp_field_name",
+        "max_size",
+        "window_s",
+        "columns",
+        "size",
+        "window_start",
+        "dtype",
+        "rows",
+    )
+
+    def __init__(
+        self,
+        timestamp_field_name: str,
+        max_size: int,
+        window_ms: float,
+        dtype: "np.dtype | None" = None,
+    ):
+        if np is None:
+            raise ImportError("columnar batches require the numpy package")
+        self.timestamp_field_name = timestamp_field_name
+        self.max_size = max_size
+        self.window_s = window_ms / 1000
+        self.columns: dict[str, list] = {}
+        self.size = 0
+        self.window_start = 0.0
+        self.dtype = dtype
+        # a fresh array per batch, closed batches keep theirs
+        self.rows = None if dtype is None else np.empty(max_size, dtype=dtype)
+
+    def time_left(self) -> float:
+        if self.size == 0:
+            return self.window_s
+        return max(0.0, self.window_start + self.window_s - time.monotonic())
+
+    def add(self, sample: Any) -> ColumnarBatch | None:
+        if self.size == 0:
+            self.window_start = time.monotonic()
+        rows = self.rows
+        if rows is not None:
+            if getattr(sample, "__struct_fields__", None) == self.dtype.names:
+                rows[self.size] = sample.values()
+                self.size += 1
+                if self.size >= self.max_size:
+                    return self.build()
+                return None
+            # e.g. a projected dict, this batch carries on as plain columns
+            self._rows_to_columns()
+        columns = self.columns
+        size = self.size
+        for name, value in sample_items(sample):
+            column = columns.get(name)
+            if column is None:
+                # field first seen mid window, earlier rows have no value
+                column = [None] * size
+                columns[name] = column
+            column.append(value)
+        self.size = size + 1
+        for column in columns.values():
+            if len(column) < self.size:
+                column.append(None)
+
+        if self.size >= self.max_size:
+            return self.build()
+        return None
+
+    def poll(self) -> ColumnarBatch | None:
+        if self.size > 0 and self.time_left() == 0:
+            return self.build()
+        return None
+
+    def _rows_to_columns(self) -> None:
+        filled = self.rows[: self.size]
+        self.columns = {name: filled[name].tolist() for name in self.dtype.names}
+        self.rows = None
+
+    def _build_rows(self) -> ColumnarBatch:
+        filled = self.rows[: self.size]
+        filled.flags.writeable = False
+        # views into the rows, no copy per column
+        columns = {name: filled[name] for name in self.dtype.names}
+        self.rows = np.empty(self.max_size, dtype=self.dtype)
+        self.size = 0
+        timestamps = columns.get(self.timestamp_field_name)
+        if timestamps is None:
+            timestamps = _to_array([])
+        return ColumnarBatch(timestamps=timestamps, columns=columns)
+
+    def build(self) -> ColumnarBatch | None:
+        if self.size == 0:
+            return None
+        if self.rows is not None:
+            return self._build_rows()
+        columns = {name: _to_array(values) for name, values in self.columns.items()}
+        self.columns = {}
+        self.size = 0
+        if self.dtype is not None:
+            # the next batch tries rows again
+            self.rows = np.empty(self.max_size, dtype=self.dtype)
+        timestamps = columns.get(self.timestamp_field_name)
+        if timestamps is None:
+            timestamps = _to_array([])
+        return ColumnarBatch(timestamps=timestamps, columns=columns)
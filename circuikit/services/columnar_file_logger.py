@@ -0,0 +1,214 @@
+from .service import Service
+from .samples import sample_to_dict
+from .types import ServiceOptions
+from pathlib import Path
+import threading
+import time
+import logging
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+logger = logging.getLogger(__name__)
+
+FORMATS = ("parquet", "arrow")
+
+
+def _is_number(value) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _infer_column_type(values: list) -> "pa.DataType":
+    try:
+        inferred = pa.array(values).type
+    except pa.ArrowException:
+        # mixed values, numbers widen to float, anything else is kept as text
+        if all(value is None or _is_number(value) for value in values):
+            return pa.float64()
+        return pa.string()
+    # a field without a single value in the inference window can't be typed, store it as text
+    return pa.string() if pa.types.is_null(inferred) else inferred
+
+
+class ColumnarFileLogger(Service):
+    """
+    Records samples into a Parquet or Arrow IPC file. Schema is inferred from the first samples,
+    then samples are buffered per column and written as a row group once row_group_size samples
+    are buffered or flush_interval_ms has passed, so memory is capped by the row group size.
+    """
+
+    def __init__(
+        self,
+        file_path: str,
+        file_format: str = "parquet",
+        row_group_size: int = 64 * 1024,
+        flush_interval_ms: float = 60_000,
+        schema_inference_samples: int = 100,
+        schema: "pa.Schema | None" = None,
+        compression: str = "zstd",
+        service_options: ServiceOptions | None = None,
+    ):
+        if pa is None:
+            raise ImportError("ColumnarFileLogger requires the pyarrow package")
+        if file_format not in FORMATS:
+            raise ValueError(f"file_format must be one of {FORMATS}")
+        if schema_inference_samples < 1 or row_group_size < schema_inference_samples:
+            raise ValueError(
+                "schema_inference_samples must be >= 1 and <= row_group_size"
+            )
+        super().__init__(options=service_options)
+        self.file_path = file_path
+        self.file_format = file_format
+        self.row_group_size = row_group_size
+        self.flush_interval_s = flush_interval_ms / 1000
+        self.schema_inference_samples = schema_inference_samples
+        self.compression = compression
+
+        self.lock = threading.Lock()
+        self.schema = schema
+        # samples held until the schema is known
+        self.pending_samples: list[dict] = []
+        self.columns: dict[str, list] = {}
+        if schema is not None:
+            self.columns = {name: [] for name in schema.names}
+        self.size = 0
+        self.row_group_started_at = time.monotonic()
+        self.writer = None
+        self.closed = False
+        self.written_rows = 0
+        self.row_groups = 0
+        self.cast_errors = 0
+        self.unknown_fields: set[str] = set()
+
+        Path(self.file_path).parent.mkdir(exist_ok=True, parents=True)
+
+    def __destroy__(self):
+        super().__destroy__()
+        with self.lock:
+            if self.closed:
+                return
+            self.closed = True
+            if self.schema is None and self.pending_samples:
+                self._infer_schema()
+            self._write_row_group()
+            if self.writer is not None:
+                self.writer.close()
+
+    def on_message(self, message: dict) -> None:
+        sample = sample_to_dict(message)
+        with self.lock:
+            if self.closed:
+                return
+            if self.schema is None:
+                self.pending_samples.append(sample)
+                if len(self.pending_samples) >= self.schema_inference_samples:
+                    self._infer_schema()
+                return
+            self._append(sample)
+            if (
+                self.size >= self.row_group_size
+                or time.monotonic() - self.row_group_started_at >= self.flush_interval_s
+            ):
+                self._write_row_group()
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {
+                "written_rows": self.written_rows,
+                "row_groups": self.row_groups,
+                "buffered_rows": self.size + len(self.pending_samples),
+                "cast_errors": self.cast_errors,
+            }
+
+    def _infer_schema(self) -> None:
+        # every field seen in the window, not only the ones of the first sample
+        names = dict.fromkeys(
+            name for sample in self.pending_samples for name in sample
+        )
+        # typed column by column, so one mixed field doesn't stop the others from being recorded
+        self.schema = pa.schema(
+            pa.field(
+                name,
+                _infer_column_type(
+                    [sample.get(name) for sample in self.pending_samples]
+                ),
+            )
+            for name in names
+        )
+        self.columns = {name: [] for name in self.schema.names}
+        samples = self.pending_samples
+        self.pending_samples = []
+        self.row_group_started_at = time.monotonic()
+        for sample in samples:
+            self._append(sample)
+
+    def _append(self, sample: dict) -> None:
+        columns = self.columns
+        for name, column in columns.items():
+            column.append(sample.get(name))
+        if not columns.keys() >= sample.keys():
+            for name in sample.keys() - columns.keys() - self.unknown_fields:
+                # schema of a file is fixed, fields first seen after inference are not recorded
+                self.unknown_fields.add(name)
+                logger.warning(f"field={name} is not in the recorded schema, ignored")
+        self.size += 1
+
+    def _column_array(self, name: str, values: list) -> "pa.Array":
+        field_type = self.schema.field(name).type
+        try:
+            return pa.array(values, type=field_type)
+        except pa.ArrowException:
+            pass
+        if pa.types.is_string(field_type):
+            # text columns keep any value, as its string form
+            return pa.array(
+                [
+                    value if value is None or isinstance(value, str) else str(value)
+                    for value in values
+                ],
+                type=field_type,
+            )
+        # slow path, only values which don't fit the column type become null
+        fitting = []
+        for value in values:
+            try:
+                fitting.append(pa.scalar(value, type=field_type))
+            except pa.ArrowException:
+                self.cast_errors += 1
+                fitting.append(pa.scalar(None, type=field_type))
+        return pa.array(fitting, type=field_type)
+
+    def _write_row_group(self) -> None:
+        if self.size == 0:
+            return
+        batch = pa.record_batch(
+            [self._column_array(name, values) for name, values in self.columns.items()],
+            schema=self.schema,
+        )
+        self.columns = {name: [] for name in self.schema.names}
+        rows = self.size
+        self.size = 0
+        self.row_group_started_at = time.monotonic()
+
+        if self.writer is None:
+            self.writer = self._open_writer()
+        if self.file_format == "parquet":
+            self.writer.write_batch(batch, row_group_size=rows)
+        else:
+            self.writer.write_batch(batch)
+        self.written_rows += rows
+        self.row_groups += 1
+
+    def _open_writer(self):
+        if self.file_format == "parquet":
+            return pq.ParquetWriter(
+                self.file_path, schema=self.schema, compression=self.compression
+            )
+        options = pa.ipc.IpcWriteOptions(
+            compression=None if self.compression == "none" else self.compression
+        )
+        return pa.ipc.new_file(self.file_path, schema=self.schema, options=options)
@@ -0,0 +1,163 @@
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable
+import inspect
+import os
+import queue
+import threading
+import logging
+
+from .service_queue import ServiceQueue
+
+logger = logging.getLogger(__name__)
+
+EXECUTION_MODES = ("inline", "thread", "thread_pool", "process_pool")
+
+# max messages a service handles per turn on the shared pool, so one busy service can't starve the others
+SHARED_POOL_DRAIN_BATCH = 64
+
+_shared_thread_pool: ThreadPoolExecutor | None = None
+_shared_thread_pool_lock = threading.Lock()
+
+
+def get_shared_thread_pool() -> ThreadPoolExecutor:
+    global _shared_thread_pool
+    with _shared_thread_pool_lock:
+        if _shared_thread_pool is None:
+            _shared_thread_pool = ThreadPoolExecutor(
+                max_workers=min(32, (os.cpu_count() or 1) + 4),
+                thread_name_prefix="circuikit-services",
+            )
+        return _shared_thread_pool
+
+
+def resolve_process_fn(service: Any) -> Callable[[Any], Any]:
+    # must be picklable by reference, so a bound method (which drags the service along) won't do
+    process = inspect.getattr_static(type(service), "process", None)
+    if not isinstance(process, (staticmethod, classmethod)):
+        raise TypeError(
+            f"{type(service).__name__} must define process(message) as a staticmethod to run in a process pool"
+        )
+    return getattr(type(service), "process")
+
+
+class SharedThreadPoolRunner:
+    """Drains a service queue on the shared thread pool, one turn at a time so messages stay in order"""
+
+    __slots__ = ("messages_queue", "handle", "lock", "scheduled")
+
+    def __init__(self, messages_queue: ServiceQueue, handle: Callable[[Any], None]):
+        self.messages_queue = messages_queue
+        self.handle = handle
+        self.lock = threading.Lock()
+        self.scheduled = False
+
+    def notify(self) -> None:
+        with self.lock:
+            if self.scheduled:
+                return
+            self.scheduled = True
+        get_shared_thread_pool().submit(self.drain)
+
+    def drain(self) -> None:
+        for _ in range(SHARED_POOL_DRAIN_BATCH):
+            try:
+                message = self.messages_queue.get(timeout=0)
+            except TimeoutError:
+                break
+            if message is not None:
+                self.handle(message)
+            self.messages_queue.task_done()
+
+        with self.lock:
+            if self.messages_queue.qsize() == 0:
+                self.scheduled = False
+                return
+        # more work is waiting, go back to the end of the pool line
+        get_shared_thread_pool().submit(self.drain)
+
+
+class ProcessPoolRunner:
+    """
+    Runs the service process function on a pool of worker processes and hands results to on_message.
+    In ordered mode results are delivered in the order messages arrived, otherwise as soon as they complete.
+    """
+
+    __slots__ = (
+        "messages_queue",
+        "process_fn",
+        "handle",
+        "ordered",
+        "pool",
+        "inflight",
+        "results",
+        "stop_event",
+        "submitter_thread",
+        "delivery_thread",
+    )
+
+    def __init__(
+        self,
+        messages_queue: ServiceQueue,
+        process_fn: Callable[[Any], Any],
+        handle: Callable[[Any], None],
+        workers: int,
+        ordered: bool,
+        stop_event: threading.Event,
+    ):
+        self.messages_queue = messages_queue
+        self.process_fn = process_fn
+        self.handle = handle
+        self.ordered = ordered
+        self.pool = ProcessPoolExecutor(max_workers=workers)
+        # bounds the number of submitted but undelivered messages
+        self.inflight = threading.BoundedSemaphore(workers * 2)
+        self.results: queue.SimpleQueue = queue.SimpleQueue()
+        self.stop_event = stop_event
+        self.submitter_thread = threading.Thread(
+            target=self.submit_messages, daemon=True
+        )
+        self.delivery_thread = threading.Thread(
+            target=self.deliver_results, daemon=True
+        )
+        self.submitter_thread.start()
+        self.delivery_thread.start()
+
+    def submit_messages(self) -> None:
+        sequence = 0
+        while not self.stop_event.is_set():
+            message = self.messages_queue.get()
+            self.messages_queue.task_done()
+            if message is None:
+                continue
+            self.inflight.acquire()
+            future = self.pool.submit(self.process_fn, message)
+            future.add_done_callback(
+                lambda done, sequence=sequence: self.results.put((sequence, done))
+            )
+            sequence += 1
+
+    def deliver_results(self) -> None:
+        next_sequence = 0
+        pending: dict[int, Future] = {}
+        while not self.stop_event.is_set():
+            sequence, future = self.results.get()
+            if not self.ordered:
+                self.inflight.release()
+                self._deliver(future)
+                continue
+            pending[sequence] = future
+            while next_sequence in pending:
+                self.inflight.release()
+                self._deliver(pending.pop(next_sequence))
+                next_sequence += 1
+
+    def _deliver(self, future: Future) -> None:
+        try:
+            result = future.result()
+        except Exception as e:
+            logger.error(f"process pool service failed to process message; e={e}")
+            return
+        self.handle(result)
+
+    def stop(self) -> None:
+        self.pool.shutdown(wait=False, cancel_futures=True)
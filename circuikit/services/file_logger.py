@@ -1,28 +1,277 @@
+from ..serial_monitor_interface.decoders import JsonDecoder
+from ..serial_monitor_interface.protocols import SampleDecoder
 from .service import Service
+from .types import ServiceOptions
 from pathlib import Path
-import json
+from datetime import datetime
+import gzip
+import shutil
+import threading
+import time
 import os
+import logging
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+FSYNC_POLICIES = ("never", "interval", "batch")
+COMPRESSIONS = (None, "gzip", "zstd")
+COMPRESSED_SUFFIXES = {"gzip": ".gz", "zstd": ".zst"}
+
+# service thread waits for the writer once this many buffers worth of data are pending
+MAX_PENDING_BUFFERS = 4
+
+
+def _compress_segment(path: Path, compression: str) -> None:
+    target = path.with_name(path.name + COMPRESSED_SUFFIXES[compression])
+    with open(path, "rb") as source:
+        if compression == "gzip":
+            with gzip.open(target, "wb") as destination:
+                shutil.copyfileobj(source, destination)
+        else:
+            with open(target, "wb") as destination:
+                zstandard.ZstdCompressor().copy_stream(source, destination)
+    path.unlink()
 
 
 class FileLogger(Service):
-    def __init__(self, file_path: str, flush_treshold: int = 100, mode="w+"):
-        super().__init__()
+    """
+    Writes one encoded sample per line. Samples are serialized into an in-memory buffer on the service thread,
+    a dedicated writer thread swaps it out and writes it once it is big enough, old enough or flush_treshold
+    samples have been collected, so slow disks don't stall sample consumption.
+    """
+
+    def __init__(
+        self,
+        file_path: str,
+        flush_treshold: int = 100,
+        mode="w+",
+        service_options: ServiceOptions | None = None,
+        buffer_size_bytes: int = 64 * 1024,
+        flush_interval_ms: float = 1000,
+        fsync_policy: str = "interval",
+        fsync_interval_ms: float = 1000,
+        rotate_max_bytes: int | None = None,
+        rotate_interval_s: float | None = None,
+        compression: str | None = None,
+        keep_segments: int | None = None,
+        decoder: SampleDecoder | None = None,
+    ):
+        if fsync_policy not in FSYNC_POLICIES:
+            raise ValueError(f"fsync_policy must be one of {FSYNC_POLICIES}")
+        if compression not in COMPRESSIONS:
+            raise ValueError(f"compression must be one of {COMPRESSIONS}")
+        if compression == "zstd" and zstandard is None:
+            raise ImportError("zstd compression requires the zstandard package")
+        super().__init__(options=service_options)
         self.flush_counter = 0
         self.flush_treshold = flush_treshold
         self.file_path = file_path
+        self.buffer_size_bytes = buffer_size_bytes
+        self.flush_interval_s = flush_interval_ms / 1000
+        self.fsync_policy = fsync_policy
+        self.fsync_interval_s = fsync_interval_ms / 1000
+        self.rotate_max_bytes = rotate_max_bytes
+        self.rotate_interval_s = rotate_interval_s
+        self.compression = compression
+        self.keep_segments = keep_segments
+        self.encode = (JsonDecoder() if decoder is None else decoder).encode
+
+        # active buffer is filled by the service thread, spare one is written by the writer thread
+        self.active_buffer = bytearray()
+        self.spare_buffer = bytearray()
+        self.buffer_lock = threading.Lock()
+        self.flush_requested = threading.Condition(self.buffer_lock)
+        self.buffer_drained = threading.Condition(self.buffer_lock)
+        self.closed = False
+        self.written_bytes = 0
+        self.rotations = 0
+        self.compression_threads: list[threading.Thread] = []
+        # names of segments still being compressed, pruning leaves them alone
+        self.compressing: set[str] = set()
+        self.compressing_lock = threading.Lock()
 
         output_file = Path(self.file_path)
         output_file.parent.mkdir(exist_ok=True, parents=True)
-        self.file_descriptor = open(file=self.file_path, mode=mode)
+        # buffer holds encoded bytes, the file is always opened in binary mode
+        self.file_descriptor = open(
+            file=self.file_path, mode=mode if "b" in mode else f"{mode}b"
+        )
+        self.segment_size = self.file_descriptor.tell()
+        self.segment_started_at = time.monotonic()
+        self.last_fsync_at = time.monotonic()
+
+        self.writer_thread = threading.Thread(target=self.write_forever, daemon=True)
+        self.writer_thread.start()
 
     def __destroy__(self):
-        self.file_descriptor.close()
+        super().__destroy__()
+        with self.buffer_lock:
+            if self.closed:
+                return
+            self.closed = True
+            self.flush_requested.notify()
+        self.writer_thread.join()
+        for compression_thread in self.compression_threads:
+            compression_thread.join()
 
     def on_message(self, message: dict) -> None:
-        if self.file_descriptor is None:
+        line = self.encode(message)
+        with self.buffer_lock:
+            if self.closed:
+                return
+            # writer fell behind, wait for it rather than growing without bound
+            while (
+                len(self.active_buffer) >= self.buffer_size_bytes * MAX_PENDING_BUFFERS
+                and not self.closed
+            ):
+                self.buffer_drained.wait()
+            self.active_buffer += line
+            self.active_buffer += b"\n"
+            self.flush_counter += 1
+            if (
+                self.flush_counter >= self.flush_treshold
+                or len(self.active_buffer) >= self.buffer_size_bytes
+            ):
+                self.flush_requested.notify()
+
+    def stats(self) -> dict:
+        with self.buffer_lock:
+            return {
+                "written_bytes": self.written_bytes,
+                "pending_bytes": len(self.active_buffer),
+                "rotations": self.rotations,
+            }
+
+    def write_forever(self) -> None:
+        while True:
+            with self.buffer_lock:
+                if not self.closed and not self._should_flush():
+                    self.flush_requested.wait(self.flush_interval_s)
+                closed = self.closed
+                # swap, the service thread keeps filling the other buffer while this one is written
+                buffer = self.active_buffer
+                self.active_buffer = self.spare_buffer
+                self.spare_buffer = buffer
+                self.flush_counter = 0
+                self.buffer_drained.notify_all()
+
+            if buffer:
+                try:
+                    self._write(buffer)
+                except OSError as e:
+                    logger.error(f"failed to write log file; e={e}")
+                buffer.clear()
+            if closed:
+                self._close_file()
+                return
+
+    def _should_flush(self) -> bool:
+        return (
+            self.flush_counter >= self.flush_treshold
+            or len(self.active_buffer) >= self.buffer_size_bytes
+        )
+
+    def _write(self, buffer: bytearray) -> None:
+        if self._should_rotate():
+            self._rotate()
+        self.file_descriptor.write(buffer)
+        self.file_descriptor.flush()
+        self.segment_size += len(buffer)
+        self.written_bytes += len(buffer)
+
+        now = time.monotonic()
+        if self.fsync_policy == "batch" or (
+            self.fsync_policy == "interval"
+            and now - self.last_fsync_at >= self.fsync_interval_s
+        ):
+            os.fsync(self.file_descriptor.fileno())
+            self.last_fsync_at = now
+
+    def _should_rotate(self) -> bool:
+        if self.segment_size == 0:
+            return False
+        if (
+            self.rotate_max_bytes is not None
+            and self.segment_size >= self.rotate_max_bytes
+        ):
+            return True
+        return (
+            self.rotate_interval_s is not None
+            and time.monotonic() - self.segment_started_at >= self.rotate_interval_s
+        )
+
+    def _rotate(self) -> None:
+        self._close_file()
+        path = Path(self.file_path)
+        stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+        segment = path.with_name(
+            f"{path.stem}.{stamp}.{self.rotations:06d}{path.suffix}"
+        )
+        os.replace(path, segment)
+        self.rotations += 1
+
+        self.file_descriptor = open(file=self.file_path, mode="wb")
+        self.segment_size = 0
+        self.segment_started_at = time.monotonic()
+
+        if self.compression is not None:
+            with self.compressing_lock:
+                self.compressing.add(segment.name)
+        self._prune_segments()
+        if self.compression is None:
             return
-        self.file_descriptor.write(f"{json.dumps(message)}\n")
-        if self.flush_counter == 0:
-            self.file_descriptor.flush()
-            os.fsync(self.file_descriptor)
-        self.flush_counter = (self.flush_counter + 1) % self.flush_treshold
+        # compressing a big segment takes a while, don't hold up the writer
+        compression_thread = threading.Thread(
+            target=self._compress, args=(segment,), daemon=True
+        )
+        self.compression_threads = [
+            thread for thread in self.compression_threads if thread.is_alive()
+        ]
+        self.compression_threads.append(compression_thread)
+        compression_thread.start()
+
+    def _compress(self, segment: Path) -> None:
+        try:
+            _compress_segment(path=segment, compression=self.compression)
+        except OSError as e:
+            logger.error(f"failed to compress log segment={segment}; e={e}")
+        finally:
+            with self.compressing_lock:
+                self.compressing.discard(segment.name)
+        # a segment skipped while it was compressed may be over the limit by now
+        self._prune_segments()
+
+    def _prune_segments(self) -> None:
+        if self.keep_segments is None:
+            return
+        path = Path(self.file_path)
+        # a segment may exist both plain and compressed while it is being compressed
+        segments: dict[str, list[Path]] = {}
+        for file in path.parent.glob(f"{path.stem}.*-*.*{path.suffix}*"):
+            name = file.name
+            for suffix in COMPRESSED_SUFFIXES.values():
+                name = name.removesuffix(suffix)
+            segments.setdefault(name, []).append(file)
+        # segment names start with the rotation time, so name order is age order
+        names = sorted(segments)
+        with self.compressing_lock:
+            compressing = set(self.compressing)
+        for name in names[: max(0, len(names) - self.keep_segments)]:
+            if name in compressing:
+                # the source and a partial archive are still in use, pruned once compressed
+                continue
+            for file in segments[name]:
+                file.unlink(missing_ok=True)
+
+    def _close_file(self) -> None:
+        if self.file_descriptor.closed:
+            return
+        self.file_descriptor.flush()
+        if self.fsync_policy != "never":
+            os.fsync(self.file_descriptor.fileno())
+        self.file_descriptor.close()
@@ -0,0 +1,143 @@
+from dataclasses import dataclass
+from typing import Any, Callable
+import time
+import logging
+from ..serial_monitor_interface.protocols import SampleDecoder
+
+logger = logging.getLogger(__name__)
+
+RouteFn = Callable[[Any], Any | None]
+
+
+@dataclass(frozen=True, slots=True, eq=False)
+class Route:
+    """
+    Which samples, and which of their fields, reach a service. Circuikit evaluates a route once per sample,
+    services registered with the same Route instance share the result.
+    """
+
+    # field -> accepted value, or a set / list / tuple of accepted values
+    match: dict[str, Any] | None = None
+    # arbitrary condition, runs after match
+    where: Callable[[Any], bool] | None = None
+    # keeps one out of every `every` samples which passed the filters, per device
+    every: int = 1
+    # keeps at most one sample per min_interval_ms, per device
+    min_interval_ms: float = 0
+    # only these fields are delivered, as a dict
+    fields: tuple[str, ...] | None = None
+
+    def __post_init__(self):
+        if self.every < 1:
+            raise ValueError("every must be >= 1")
+        if self.min_interval_ms < 0:
+            raise ValueError("min_interval_ms must be >= 0")
+        if isinstance(self.fields, str):
+            object.__setattr__(self, "fields", (self.fields,))
+        elif self.fields is not None:
+            object.__setattr__(self, "fields", tuple(self.fields))
+
+
+def _compile_match(
+    match: dict[str, Any], decoder: SampleDecoder
+) -> Callable[[Any], bool]:
+    checks = []
+    for field_name, accepted in match.items():
+        if isinstance(accepted, (set, frozenset, list, tuple)):
+            checks.append((decoder.field_getter(field_name), frozenset(accepted), True))
+        else:
+            checks.append((decoder.field_getter(field_name), accepted, False))
+
+    def matches(sample) -> bool:
+        try:
+            for get, accepted, is_set in checks:
+                value = get(sample)
+                if (value not in accepted) if is_set else (value != accepted):
+                    return False
+        except (KeyError, AttributeError, TypeError):
+            # a sample without the field doesn't match
+            return False
+        return True
+
+    return matches
+
+
+def _compile_projection(
+    fields: tuple[str, ...], decoder: SampleDecoder
+) -> Callable[[Any], dict]:
+    getters = [(name, decoder.field_getter(name)) for name in fields]
+
+    def project(sample) -> dict:
+        try:
+            return {name: get(sample) for name, get in getters}
+        except (KeyError, AttributeError):
+            # fields missing from this sample are left out
+            projected = {}
+            for name, get in getters:
+                try:
+                    projected[name] = get(sample)
+                except (KeyError, AttributeError):
+                    pass
+            return projected
+
+    return project
+
+
+def compile_route(route: Route, decoder: SampleDecoder) -> RouteFn:
+    # field lookups are resolved once, per device decoder, returns None for samples the route drops
+    matches = None if route.match is None else _compile_match(route.match, decoder)
+    where = route.where
+    every = route.every
+    min_interval_s = route.min_interval_ms / 1000
+    project = (
+        None if route.fields is None else _compile_projection(route.fields, decoder)
+    )
+    skipped = every - 1
+    last_passed_at = float("-inf")
+    warned_where = False
+
+    def passes_where(sample) -> bool:
+        nonlocal warned_where
+        try:
+            return where(sample)
+        except Exception as e:
+            # user code must not take down the runtime, a failing sample doesn't match like a missing field
+            if not warned_where:
+                warned_where = True
+                logger.error(
+                    f"Route where failed, samples it fails on are not delivered; e={e!r}"
+                )
+            return False
+
+    def apply(sample):
+        nonlocal skipped, last_passed_at
+        if matches is not None and not matches(sample):
+            return None
+        if where is not None and not passes_where(sample):
+            return None
+        if every > 1:
+            skipped += 1
+            if skipped < every:
+                return None
+            skipped = 0
+        if min_interval_s:
+            now = time.monotonic()
+            if now - last_passed_at < min_interval_s:
+                return None
+            last_passed_at = now
+        return sample if project is None else project(sample)
+
+    return apply
+
+
+def compile_routes(
+    services: list, decoder: SampleDecoder
+) -> list[tuple[RouteFn | None, list]]:
+    # services sharing a Route instance are fed from a single evaluation, None keeps samples untouched
+    groups: dict[Route | None, list] = {}
+    for sub in services:
+        groups.setdefault(sub.service_options.route, []).append(sub)
+    return [
+        (None if route is None else compile_route(route, decoder), subs)
+        for route, subs in groups.items()
+    ]
@@ -0,0 +1,14 @@
+from typing import Any
+
+
+def sample_items(sample: Any):
+    if isinstance(sample, dict):
+        return sample.items()
+    # typed samples, e.g. msgspec.Struct
+    return ((name, getattr(sample, name)) for name in sample.__struct_fields__)
+
+
+def sample_to_dict(sample: Any) -> dict:
+    if isinstance(sample, dict):
+        return sample
+    return dict(sample_items(sample))
@@ -1,24 +1,64 @@
 import threading
-import queue
+import time
 from abc import ABC, abstractmethod
+from ..metrics import Histogram
+from .service_queue import ServiceQueue
+from .execution import SharedThreadPoolRunner, ProcessPoolRunner, resolve_process_fn
+from .types import ServiceOptions
 import logging
 
 logger = logging.getLogger(__name__)
 
+# how long a stopping service waits for its worker thread to handle what is still queued
+SERVICE_DRAIN_TIMEOUT_S = 5
+
 
 class Service(ABC):
-    def __init__(self):
-        self.messages_queue = queue.Queue()
-        self.stop_event = threading.Event()
-        self.worker_thread = threading.Thread(
-            target=self.pull_requests,
-            daemon=True,
+    def __init__(self, options: ServiceOptions | None = None):
+        self.service_options = ServiceOptions() if options is None else options
+        self.messages_queue = ServiceQueue(
+            max_size=self.service_options.max_queue_size,
+            overflow_policy=self.service_options.overflow_policy,
         )
-        self.worker_thread.start()
+        self.stop_event = threading.Event()
+        self.worker_thread = None
+        self.runner = None
+        # on_message durations, set by Circuikit while metrics are enabled
+        self.processing_time: Histogram | None = None
+
+        execution_mode = self.service_options.execution_mode
+        if execution_mode == "thread":
+            self.worker_thread = threading.Thread(
+                target=self.pull_requests,
+                daemon=True,
+            )
+            self.worker_thread.start()
+        elif execution_mode == "thread_pool":
+            self.runner = SharedThreadPoolRunner(
+                messages_queue=self.messages_queue, handle=self._handle_message
+            )
+        elif execution_mode == "process_pool":
+            # process runs in worker processes, its result is handed to on_message in this process
+            self.runner = ProcessPoolRunner(
+                messages_queue=self.messages_queue,
+                process_fn=resolve_process_fn(self),
+                handle=self._handle_message,
+                workers=self.service_options.workers,
+                ordered=self.service_options.ordered,
+                stop_event=self.stop_event,
+            )
+
+    def drain(self, timeout: float | None = SERVICE_DRAIN_TIMEOUT_S) -> bool:
+        # waits for the worker thread to handle every queued message, False when it timed out
+        if self.worker_thread is None or not self.worker_thread.is_alive():
+            return True
+        return self.messages_queue.join(timeout=timeout)
 
     def __destroy__(self):
         if self.stop_event is not None:
             self.stop_event.set()
+        if isinstance(self.runner, ProcessPoolRunner):
+            self.runner.stop()
 
     @abstractmethod
     def on_message(self, message: dict) -> None:
@@ -26,11 +66,37 @@ class Service(ABC):
         pass
 
     def on_new_read(self, new_read: dict) -> None:
+        if self.service_options.execution_mode == "inline":
+            # runs on the caller thread, keep it cheap
+            self._handle_message(new_read)
+            return
+        # never blocks the caller unless the service chose the block policy with a bounded queue
         self.messages_queue.put(new_read)
+        if isinstance(self.runner, SharedThreadPoolRunner):
+            self.runner.notify()
+
+    def queue_stats(self) -> dict:
+        # enqueued, dropped and current depth of the messages queue
+        return self.messages_queue.stats()
+
+    def _handle_message(self, message) -> None:
+        try:
+            self._timed_on_message(message)
+        except Exception as e:
+            logger.error(f"{type(self).__name__} failed to handle message; e={e}")
+
+    def _timed_on_message(self, message) -> None:
+        processing_time = self.processing_time
+        if processing_time is None:
+            self.on_message(message=message)
+            return
+        started_at = time.monotonic()
+        self.on_message(message=message)
+        processing_time.observe((time.monotonic() - started_at) * 1000)
 
     def pull_requests(self):
         while not self.stop_event.is_set():
             message = self.messages_queue.get()
             if message is not None:
-                self.on_message(message=message)
+                self._timed_on_message(message)
                 self.messages_queue.task_done()
@@ -1,4 +1,5 @@
 from .service import Service
+from .types import ServiceOptions
 from typing import Callable
 
 
@@ -8,8 +9,9 @@ class ServiceAdapter(Service):
     def __init__(
         self,
         on_new_message_fn: Callable[[dict], None],
+        service_options: ServiceOptions | None = None,
     ):
-        super().__init__()
+        super().__init__(options=service_options)
         self.on_new_message_fn = on_new_message_fn
 
     def on_message(self, message: dict) -> None:
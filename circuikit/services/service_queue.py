@@ -0,0 +1,118 @@
+from collections import deque
+import threading
+import time
+from typing import Any
+
+OVERFLOW_POLICIES = ("block", "drop_oldest", "drop_newest", "conflate")
+
+
+class ServiceQueue:
+    """
+    Per-service message queue with an optional bound and an overflow policy:
+    - block: producer waits for free space (unbounded when max_size is 0)
+    - drop_oldest: oldest queued message is discarded to make room
+    - drop_newest: incoming message is discarded
+    - conflate: only the latest message is kept
+    """
+
+    __slots__ = (
+        "max_size",
+        "overflow_policy",
+        "items",
+        "mutex",
+        "not_empty",
+        "not_full",
+        "all_tasks_done",
+        "unfinished_tasks",
+        "enqueued",
+        "dropped",
+    )
+
+    def __init__(self, max_size: int = 0, overflow_policy: str = "block"):
+        if overflow_policy not in OVERFLOW_POLICIES:
+            raise ValueError(f"overflow_policy must be one of {OVERFLOW_POLICIES}")
+        if max_size < 0:
+            raise ValueError("max_size must be >= 0")
+        if overflow_policy == "conflate":
+            max_size = 1
+        self.max_size = max_size
+        self.overflow_policy = overflow_policy
+        self.items: deque = deque()
+        self.mutex = threading.Lock()
+        self.not_empty = threading.Condition(self.mutex)
+        self.not_full = threading.Condition(self.mutex)
+        self.all_tasks_done = threading.Condition(self.mutex)
+        self.unfinished_tasks = 0
+        self.enqueued = 0
+        self.dropped = 0
+
+    def put(self, item: Any) -> bool:
+        # returns False when the item was dropped
+        with self.not_full:
+            if self.max_size > 0 and len(self.items) >= self.max_size:
+                if self.overflow_policy == "block":
+                    while len(self.items) >= self.max_size:
+                        self.not_full.wait()
+                elif self.overflow_policy == "drop_newest":
+                    self.dropped += 1
+                    return False
+                else:
+                    # drop_oldest and conflate make room by discarding the head
+                    self.items.popleft()
+                    self.unfinished_tasks -= 1
+                    self.dropped += 1
+            self.items.append(item)
+            self.unfinished_tasks += 1
+            self.enqueued += 1
+            self.not_empty.notify()
+            return True
+
+    def get(self, timeout: float | None = None) -> Any:
+        # raises TimeoutError when nothing arrived in time
+        with self.not_empty:
+            if timeout is None:
+                while not self.items:
+                    self.not_empty.wait()
+            else:
+                deadline = time.monotonic() + timeout
+                while not self.items:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise TimeoutError
+                    self.not_empty.wait(remaining)
+            item = self.items.popleft()
+            self.not_full.notify()
+            return item
+
+    def task_done(self) -> None:
+        with self.all_tasks_done:
+            self.unfinished_tasks -= 1
+            if self.unfinished_tasks <= 0:
+                self.unfinished_tasks = 0
+                self.all_tasks_done.notify_all()
+
+    def join(self, timeout: float | None = None) -> bool:
+        # returns False when tasks were still unfinished once timeout passed
+        with self.all_tasks_done:
+            if timeout is None:
+                while self.unfinished_tasks:
+                    self.all_tasks_done.wait()
+                return True
+            deadline = time.monotonic() + timeout
+            while self.unfinished_tasks:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self.all_tasks_done.wait(remaining)
+            return True
+
+    def qsize(self) -> int:
+        return len(self.items)
+
+    def stats(self) -> dict:
+        with self.mutex:
+            return {
+                "enqueued": self.enqueued,
+                "dropped": self.dropped,
+                "depth": len(self.items),
+            }
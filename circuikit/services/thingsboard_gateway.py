@@ -1,6 +1,11 @@
+from collections import deque
 import requests
+from requests.adapters import HTTPAdapter
+import threading
 import time
 from .service import Service
+from .samples import sample_to_dict
+from .types import ServiceOptions
 import logging
 
 logger = logging.getLogger(__name__)
@@ -12,32 +17,222 @@ def current_milli_time():
 
 MAX_REQUESTS_PER_SECOND = 5
 
+# outcomes of a telemetry post, a rejected batch won't succeed on retry
+SENT = "sent"
+RETRY = "retry"
+REJECTED = "rejected"
+
+
+class TelemetryClock:
+    """
+    Gives every sample its ThingsBoard ts, epoch milliseconds. Samples without a numeric timestamp
+    field get the time they were received.
+    """
+
+    __slots__ = (
+        "timestamp_field_name",
+        "timestamp_is_epoch_ms",
+        "anchor_wall_ms",
+        "anchor_sample_ts",
+        "last_sample_ts",
+        "warned_missing",
+    )
+
+    def __init__(
+        self, timestamp_field_name: str | None, timestamp_is_epoch_ms: bool = False
+    ):
+        self.timestamp_field_name = timestamp_field_name
+        self.timestamp_is_epoch_ms = timestamp_is_epoch_ms
+        self.anchor_wall_ms = -1
+        self.anchor_sample_ts = -1
+        self.last_sample_ts = -1
+        self.warned_missing = False
+
+    def ts(self, message: dict) -> int:
+        if self.timestamp_field_name is None:
+            return current_milli_time()
+        sample_ts = message.get(self.timestamp_field_name)
+        if isinstance(sample_ts, bool) or not isinstance(sample_ts, (int, float)):
+            if not self.warned_missing:
+                self.warned_missing = True
+                logger.warning(
+                    f"sample has no numeric {self.timestamp_field_name=}, sending the receive time instead"
+                )
+            return current_milli_time()
+        if self.timestamp_is_epoch_ms:
+            return int(sample_ts)
+        # device clock (e.g. millis()) is mapped onto wall clock, re-anchored when the device resets
+        if self.anchor_wall_ms < 0 or sample_ts < self.last_sample_ts:
+            self.anchor_wall_ms = current_milli_time()
+            self.anchor_sample_ts = sample_ts
+        self.last_sample_ts = sample_ts
+        return int(self.anchor_wall_ms + (sample_ts - self.anchor_sample_ts))
+
 
 class ThingsBoardGateway(Service):
-    def __init__(self, token: str):
-        super().__init__()
+    """
+    Buffers samples and posts them as a single ThingsBoard telemetry array per flush interval,
+    over a persistent keep-alive connection. Failed posts are retried with exponential backoff,
+    samples wait in a bounded buffer meanwhile and the oldest are dropped once it is full.
+    """
 
+    def __init__(
+        self,
+        token: str,
+        service_options: ServiceOptions | None = None,
+        base_url: str = "http://thingsboard.cloud",
+        timestamp_field_name: str | None = "time",
+        timestamp_is_epoch_ms: bool = False,
+        flush_interval_ms: float = 1000 / MAX_REQUESTS_PER_SECOND,
+        max_batch_size: int = 1000,
+        max_buffered_samples: int = 100_000,
+        retry_initial_backoff_ms: float = 500,
+        retry_max_backoff_ms: float = 30_000,
+        request_timeout_s: float = 10,
+    ):
+        if flush_interval_ms < 1000 / MAX_REQUESTS_PER_SECOND:
+            raise ValueError(
+                f"flush_interval_ms must be >= {1000 / MAX_REQUESTS_PER_SECOND}"
+            )
         self.token = token
-        self.last_request_ts_ms = -1
+        self.url = f"{base_url.rstrip('/')}/api/v1/{token}/telemetry"
+        self.clock = TelemetryClock(
+            timestamp_field_name=timestamp_field_name,
+            timestamp_is_epoch_ms=timestamp_is_epoch_ms,
+        )
+        self.flush_interval_s = flush_interval_ms / 1000
+        self.max_batch_size = max_batch_size
+        self.retry_initial_backoff_s = retry_initial_backoff_ms / 1000
+        self.retry_max_backoff_s = retry_max_backoff_ms / 1000
+        self.request_timeout_s = request_timeout_s
+
+        self.buffer: deque = deque()
+        self.max_buffered_samples = max_buffered_samples
+        self.buffer_lock = threading.Lock()
+        self.sent = 0
+        self.dropped = 0
+        self.rejected = 0
+        self.failed_requests = 0
+
+        self.session = requests.Session()
+        # a single flusher thread, one keep-alive connection is enough
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=1, max_retries=0)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        super().__init__(options=service_options)
+
+        self.flusher_thread = threading.Thread(target=self.flush_forever, daemon=True)
+        self.flusher_thread.start()
+
+    def __destroy__(self):
+        super().__destroy__()
+        # lets the last flush go out before the connection is closed
+        self.flusher_thread.join(timeout=self.request_timeout_s)
+        self.session.close()
 
     def on_message(self, message: dict) -> None:
-        self.send_request(json=message)
-
-    def send_request(self, json: dict):
-        now_ms = current_milli_time()
-        if (now_ms - self.last_request_ts_ms) < (1000 / MAX_REQUESTS_PER_SECOND):
-            logger.warning("Too many requests per second, skipping post event")
-            return
-        self.last_request_ts_ms = now_ms
-        response = requests.post(
-            url=f"http://thingsboard.cloud/api/v1/{self.token}/telemetry",
-            json=json,
-        )
+        self.enqueue(message=message)
+
+    def telemetry_ts(self, message: dict) -> int:
+        return self.clock.ts(message)
+
+    def enqueue(self, message: dict) -> None:
+        values = sample_to_dict(message)
+        entry = {"ts": self.telemetry_ts(values), "values": values}
+        with self.buffer_lock:
+            if len(self.buffer) >= self.max_buffered_samples:
+                self.buffer.popleft()
+                self.dropped += 1
+            self.buffer.append(entry)
+
+    def stats(self) -> dict:
+        with self.buffer_lock:
+            return {
+                "sent": self.sent,
+                "dropped": self.dropped,
+                "rejected": self.rejected,
+                "buffered": len(self.buffer),
+                "failed_requests": self.failed_requests,
+            }
+
+    def flush_forever(self) -> None:
+        backoff_s = 0.0
+        while not self.stop_event.wait(max(self.flush_interval_s, backoff_s)):
+            while True:
+                batch = self._take_batch()
+                if not batch:
+                    break
+                result = self.send_request(json=batch)
+                if result != RETRY:
+                    backoff_s = 0.0
+                    self._settle(batch, result)
+                    if len(batch) < self.max_batch_size:
+                        break
+                    # a full batch means more is waiting, respect the rate limit between posts
+                    if self.stop_event.wait(self.flush_interval_s):
+                        return
+                    continue
+                self._give_back(batch)
+                backoff_s = (
+                    self.retry_initial_backoff_s
+                    if backoff_s == 0
+                    else min(backoff_s * 2, self.retry_max_backoff_s)
+                )
+                logger.warning(f"telemetry post failed, retrying in {backoff_s}s")
+                break
+        # best effort, whatever is still buffered on stop gets one last chance
+        batch = self._take_batch()
+        if batch:
+            self._settle(batch, self.send_request(json=batch))
+
+    def _settle(self, batch: list[dict], result: str) -> None:
+        with self.buffer_lock:
+            if result == SENT:
+                self.sent += len(batch)
+                return
+            if result == REJECTED:
+                # refused by the server, they are gone like any other dropped sample
+                self.rejected += len(batch)
+            self.dropped += len(batch)
+
+    def _take_batch(self) -> list[dict]:
+        with self.buffer_lock:
+            size = min(len(self.buffer), self.max_batch_size)
+            return [self.buffer.popleft() for _ in range(size)]
+
+    def _give_back(self, batch: list[dict]) -> None:
+        with self.buffer_lock:
+            # failed samples go back in front, newer ones win if there is no room for both
+            room = self.max_buffered_samples - len(self.buffer)
+            if room < len(batch):
+                self.dropped += len(batch) - max(room, 0)
+                batch = batch[len(batch) - max(room, 0) :]
+            self.buffer.extendleft(reversed(batch))
+
+    def send_request(self, json: list[dict] | dict) -> str:
+        try:
+            response = self.session.post(
+                url=self.url, json=json, timeout=self.request_timeout_s
+            )
+        except requests.exceptions.RequestException as e:
+            self._count_failed_request()
+            logger.error(f"failed to send; e={e}")
+            return RETRY
         if response.status_code > 299:
+            self._count_failed_request()
             logger.error(f"failed to send; status_code={response.status_code}")
             try:
                 logger.debug(f"response={response.json()}")
             except requests.exceptions.JSONDecodeError:
                 logger.error(f"response={response.text}")
-        else:
-            logger.debug(f"message sent; status_code={response.status_code}")
+            # client errors other than rate limiting won't succeed on retry
+            if 400 <= response.status_code < 500 and response.status_code != 429:
+                return REJECTED
+            return RETRY
+        logger.debug(f"message sent; status_code={response.status_code}")
+        return SENT
+
+    def _count_failed_request(self) -> None:
+        with self.buffer_lock:
+            self.failed_requests += 1
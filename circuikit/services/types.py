@@ -0,0 +1,36 @@
+from dataclasses import dataclass
+from .service_queue import OVERFLOW_POLICIES
+from .execution import EXECUTION_MODES
+from .routing import Route
+
+
+@dataclass(frozen=True, slots=True)
+class ServiceOptions:
+    # 0 means unbounded
+    max_queue_size: int = 0
+    # what happens once the queue is full, one of "block", "drop_oldest", "drop_newest", "conflate"
+    overflow_policy: str = "block"
+    # where on_message runs, one of "inline", "thread", "thread_pool", "process_pool"
+    execution_mode: str = "thread"
+    # process_pool only
+    workers: int = 1
+    ordered: bool = True
+    # names of the devices whose samples reach this service, None means every device
+    devices: frozenset[str] | None = None
+    # which samples and fields reach this service, None means all of them
+    route: Route | None = None
+
+    def __post_init__(self):
+        if isinstance(self.devices, str):
+            object.__setattr__(self, "devices", frozenset((self.devices,)))
+        elif self.devices is not None and not isinstance(self.devices, frozenset):
+            # accept any iterable of names, e.g. a list
+            object.__setattr__(self, "devices", frozenset(self.devices))
+        if self.max_queue_size < 0:
+            raise ValueError("max_queue_size must be >= 0")
+        if self.overflow_policy not in OVERFLOW_POLICIES:
+            raise ValueError(f"overflow_policy must be one of {OVERFLOW_POLICIES}")
+        if self.execution_mode not in EXECUTION_MODES:
+            raise ValueError(f"execution_mode must be one of {EXECUTION_MODES}")
+        if self.workers < 1:
+            raise ValueError("workers must be >= 1")
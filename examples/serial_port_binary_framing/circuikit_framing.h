@@ -0,0 +1,90 @@
+// Circuikit binary framing encoder.
+// Each frame is a packed record followed by its CRC-16/CCITT-FALSE (little endian),
+// COBS encoded and terminated by a 0x00 delimiter.
+// Matches BinaryFrameLayout(fields=..., byte_order="<", framing="cobs", crc=True) on the python side.
+#ifndef CIRCUIKIT_FRAMING_H
+#define CIRCUIKIT_FRAMING_H
+
+#include <stdint.h>
+#include <stddef.h>
+
+#define CIRCUIKIT_MAX_RECORD_SIZE 64
+#define CIRCUIKIT_CRC_SIZE 2
+// COBS adds one overhead byte per 254 bytes, plus the leading code byte
+#define CIRCUIKIT_MAX_FRAME_SIZE (CIRCUIKIT_MAX_RECORD_SIZE + CIRCUIKIT_CRC_SIZE + 2)
+
+static uint16_t circuikit_crc16(const uint8_t* data, size_t length) {
+  uint16_t crc = 0xFFFF;
+  for (size_t i = 0; i < length; i++) {
+    crc ^= (uint16_t)data[i] << 8;
+    for (uint8_t bit = 0; bit < 8; bit++) {
+      if (crc & 0x8000) {
+        crc = (crc << 1) ^ 0x1021;
+      } else {
+        crc = crc << 1;
+      }
+    }
+  }
+  return crc;
+}
+
+// encodes length bytes of input into output, returns the encoded length (without delimiter)
+static size_t circuikit_cobs_encode(const uint8_t* input, size_t length, uint8_t* output) {
+  size_t read_index = 0;
+  size_t write_index = 1;
+  size_t code_index = 0;
+  uint8_t code = 1;
+
+  while (read_index < length) {
+    if (input[read_index] == 0) {
+      output[code_index] = code;
+      code = 1;
+      code_index = write_index++;
+      read_index++;
+    } else {
+      output[write_index++] = input[read_index++];
+      code++;
+      if (code == 0xFF) {
+        output[code_index] = code;
+        code = 1;
+        code_index = write_index++;
+      }
+    }
+  }
+  output[code_index] = code;
+  return write_index;
+}
+
+// fills frame with the encoded record and its delimiter, returns the number of bytes to send
+static size_t circuikit_encode_frame(const void* record, size_t size, uint8_t* frame) {
+  uint8_t payload[CIRCUIKIT_MAX_RECORD_SIZE + CIRCUIKIT_CRC_SIZE];
+  if (size > CIRCUIKIT_MAX_RECORD_SIZE) {
+    return 0;
+  }
+  const uint8_t* bytes = (const uint8_t*)record;
+  for (size_t i = 0; i < size; i++) {
+    payload[i] = bytes[i];
+  }
+  uint16_t crc = circuikit_crc16(payload, size);
+  payload[size] = crc & 0xFF;
+  payload[size + 1] = crc >> 8;
+
+  size_t encoded = circuikit_cobs_encode(payload, size + CIRCUIKIT_CRC_SIZE, frame);
+  frame[encoded] = 0x00;
+  return encoded + 1;
+}
+
+#ifdef ARDUINO
+#include <Arduino.h>
+
+// e.g. circuikit_send_frame(&reading, sizeof(reading));
+static void circuikit_send_frame(const void* record, size_t size) {
+  uint8_t frame[CIRCUIKIT_MAX_FRAME_SIZE];
+  size_t length = circuikit_encode_frame(record, size, frame);
+  if (length > 0) {
+    Serial.write(frame, length);
+  }
+}
+#endif
+
+#endif
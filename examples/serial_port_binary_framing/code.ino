@@ -0,0 +1,31 @@
+#include "circuikit_framing.h"
+
+unsigned long latest_emit_ms = 0;
+
+// field order and types must match the BinaryFrameLayout on the python side
+typedef struct __attribute__((packed)) {
+    uint32_t time_ms;
+    float temperature;
+    int16_t light;
+} Reading;
+
+void setup() {
+    Serial.begin(115200);
+}
+
+void loop() {
+  emit_data();
+}
+
+void emit_data() {
+  unsigned long now_ms = millis();
+  if (now_ms - latest_emit_ms > 10) {
+    latest_emit_ms = now_ms;
+    Reading reading = {
+      now_ms,
+      analogRead(A0) * 0.48828125f,
+      (int16_t)analogRead(A1),
+    };
+    circuikit_send_frame(&reading, sizeof(reading));
+  }
+}
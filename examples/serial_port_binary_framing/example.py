@@ -0,0 +1,33 @@
+from circuikit import Circuikit
+from circuikit.serial_monitor_interface import (
+    PortInterface,
+)
+from circuikit.serial_monitor_interface.port import BinaryFrameLayout
+from circuikit.serial_monitor_interface.types import SerialMonitorOptions
+from circuikit.services import Service, ServiceAdapter
+
+
+def run_example() -> None:
+    # must match the Reading struct of code.ino, AVR is little endian
+    frame_layout = BinaryFrameLayout(
+        fields=[("time_ms", "I"), ("temperature", "f"), ("light", "h")],
+        byte_order="<",
+        framing="cobs",
+    )
+
+    serial_monitor_options = SerialMonitorOptions(
+        timestamp_field_name="time_ms",
+        interface=PortInterface(
+            baudrate=115200, streaming=True, frame_layout=frame_layout
+        ),
+        sample_rate_ms=25,
+    )
+
+    services: list[Service] = [ServiceAdapter(on_new_message_fn=print)]
+
+    kit = Circuikit(
+        serial_monitor_options=serial_monitor_options,
+        services=services,
+    )
+    # If there is nothing that keep the process from exit so pass block=True to the start command
+    kit.start(block=True)